@@ -0,0 +1,381 @@
+import asyncio
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+
+from .event_store import EventStore
+from .timeseries import TimeSeriesStore
+from .snapshot_cache import SnapshotCache
+
+MAX_LOGS = 500
+MAX_HISTORY = 300
+
+DEFAULT_SENSOR = "default"
+
+MAX_PENDING = 100_000   # queued ingest messages before ingest is refused
+DRAIN_BATCH = 512       # messages applied per writer wakeup
+
+# Durable event log behind /logs range queries
+event_store = EventStore()
+
+# 1 s / 1 min / 1 h rollups behind the *-trend endpoints
+trends = TimeSeriesStore(("risk", "threshold", "drift", "ssi", "governance_threshold"))
+
+# Pre-serialised bodies + ETags for the polled read endpoints
+cache = SnapshotCache()
+
+state = {
+    "total_flows": 0,
+    "total_blocks": 0,
+    "drift": 0.0,
+    "risk_sum": 0.0,
+    "logs": deque(maxlen=MAX_LOGS),
+    "attack_counts": defaultdict(int),
+    "blocked_ips": {},
+
+    "risk_history": deque(maxlen=MAX_HISTORY),
+    "drift_history": deque(maxlen=MAX_HISTORY),
+    "ssi_history": deque(maxlen=MAX_HISTORY),
+    "threshold_history": deque(maxlen=MAX_HISTORY),
+    "trust_scores": defaultdict(lambda: 0.7),
+    "trust_sum": 0.0,
+    "profile_history": deque(maxlen=MAX_HISTORY),
+    "top_talkers": {},
+
+    # Running sums over each sensor's latest value, for global means
+    "drift_sum": 0.0,
+    "ssi_sum": 0.0,
+
+    # Governance merged over the sensors that have reported it
+    "governed_sensors": 0,
+    "threshold_sum": 0.0,
+    "profile_counts": Counter(),
+}
+
+# sensor_id -> partition; global totals in `state` are kept in step
+# on ingest, so merged views never have to walk the partitions
+sensors = {}
+
+
+def sensor_partition(sensor_id):
+    partition = sensors.get(sensor_id)
+    if partition is None:
+        partition = sensors[sensor_id] = {
+            "sensor_id": sensor_id,
+            "first_seen": time.time(),
+            "last_seen": 0.0,
+            "total_flows": 0,
+            "total_blocks": 0,
+            "risk_sum": 0.0,
+            "drift": 0.0,
+            "ssi": 0.0,
+            "threshold": 150.0,
+            "profile": "precision",
+            "governed": False,
+            "attack_counts": defaultdict(int),
+            "blocked_ips": {},
+            "top_talkers": {},
+        }
+    return partition
+
+
+# =========================================================
+# MUTATIONS (writer task only)
+# =========================================================
+
+def payload_time(payload):
+    """The sensor's "ts" (epoch seconds), or None for ingest time."""
+
+    try:
+        return float(payload["ts"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def apply_event(event):
+
+    sensor_id = event.setdefault("sensor_id", DEFAULT_SENSOR)
+    partition = sensor_partition(sensor_id)
+
+    # Sensors may ship one summary for `count` identical events
+    count = int(event.get("count", 1))
+
+    state["total_flows"] += count
+    partition["total_flows"] += count
+    partition["last_seen"] = time.time()
+
+    risk = float(event.get("risk", 0))
+    drift = float(event.get("drift", 0))
+    threshold = float(event.get("threshold", 150))
+    action = event.get("action", "MONITOR")
+    src_ip = event.get("src_ip")
+
+    state["risk_sum"] += risk * count
+    partition["risk_sum"] += risk * count
+
+    state["drift_sum"] += drift - partition["drift"]
+    partition["drift"] = drift
+    # Mean of every sensor's latest drift, not whichever sent last
+    state["drift"] = state["drift_sum"] / len(sensors)
+
+    if action == "BLOCKED":
+        state["total_blocks"] += count
+        partition["total_blocks"] += count
+        if src_ip:
+            blocked_at = event.get(
+                "timestamp", datetime.now().strftime("%H:%M:%S")
+            )
+            state["blocked_ips"][src_ip] = blocked_at
+            partition["blocked_ips"][src_ip] = blocked_at
+            cache.bump("blocked")
+
+    level = event.get("level", "LOW")
+    state["attack_counts"][level] += count
+    partition["attack_counts"][level] += count
+
+    # Ensure protocol exists
+    if "protocol" not in event:
+        event["protocol"] = "N/A"
+
+    state["logs"].append(event)
+    event_store.append(event)
+
+    state["risk_history"].append({
+        "time": event.get("timestamp"),
+        "risk": risk,
+        "threshold": threshold
+    })
+
+    state["drift_history"].append({
+        "time": event.get("timestamp"),
+        "drift": state["drift"]
+    })
+
+    # Bucketed by the event's own time, so replayed backlogs land
+    # where they happened rather than at ingest time
+    ts = payload_time(event)
+    trends.add("risk", risk, ts)
+    trends.add("threshold", threshold, ts)
+    trends.add("drift", state["drift"], ts)
+
+    cache.bump(
+        "stats", "attacks", "logs", "risk-trend", "drift-trend",
+        "sensors", f"stats:{sensor_id}"
+    )
+
+
+def apply_governance(data):
+
+    ssi = float(data.get("ssi", 0))
+    threshold = float(data.get("threshold", 150))
+    trust = float(data.get("trust", 0.7))
+    profile = data.get("profile", "precision")
+
+    sensor_id = data.get("sensor_id", DEFAULT_SENSOR)
+    partition = sensor_partition(sensor_id)
+    partition["last_seen"] = time.time()
+
+    if partition["governed"]:
+        state["threshold_sum"] -= partition["threshold"]
+        state["profile_counts"][partition["profile"]] -= 1
+    else:
+        partition["governed"] = True
+        state["governed_sensors"] += 1
+    state["threshold_sum"] += threshold
+    state["profile_counts"][profile] += 1
+
+    state["ssi_sum"] += ssi - partition["ssi"]
+    partition["ssi"] = ssi
+    partition["threshold"] = threshold
+    partition["profile"] = profile
+
+    # Histories and trends follow the fleet, not the last sensor to report
+    governance = fleet_governance()
+    state["ssi_history"].append(governance["ssi"])
+    state["threshold_history"].append(governance["threshold"])
+    state["profile_history"].append(governance["profile"])
+
+    ts = payload_time(data)
+    trends.add("ssi", governance["ssi"], ts)
+    trends.add("governance_threshold", governance["threshold"], ts)
+
+    ip = data.get("ip")
+    if ip:
+        trust_scores = state["trust_scores"]
+        previous = trust_scores[ip] if ip in trust_scores else 0.0
+        state["trust_sum"] += trust - previous
+        trust_scores[ip] = trust
+
+    cache.bump("governance", "sensors", f"stats:{sensor_id}")
+
+
+def fleet_governance():
+    """Mean SSI / threshold and the most common profile over governed sensors."""
+
+    count = state["governed_sensors"]
+    if not count:
+        return {"ssi": 0.0, "threshold": 150.0, "profile": "precision"}
+
+    profile, _ = state["profile_counts"].most_common(1)[0]
+    return {
+        "ssi": state["ssi_sum"] / count,
+        "threshold": state["threshold_sum"] / count,
+        "profile": profile,
+    }
+
+
+def apply_governance_batch(items):
+    for data in items:
+        apply_governance(data)
+
+
+def merge_top_talkers(snapshots):
+    """
+    Merge per-sensor Space-Saving top-k lists into one ranking.
+
+    Counts for a key are summed over the sensors that report it. A
+    full list that omits the key could still hide up to its smallest
+    count, so that is added to the key's error bound.
+    """
+
+    merged = {}
+    for snapshot in snapshots:
+        for dim, units in snapshot.items():
+            for unit, rows in units.items():
+                merged.setdefault(dim, {}).setdefault(unit, []).append(rows)
+
+    result = {}
+    for dim, units in merged.items():
+        for unit, lists in units.items():
+            k = max(len(rows) for rows in lists)
+            totals = {}
+            for rows in lists:
+                for row in rows:
+                    entry = totals.setdefault(row["key"], [0, 0])
+                    entry[0] += row["count"]
+                    entry[1] += row.get("error", 0)
+
+            # A full list that omits a key could hide up to its minimum
+            full = [
+                (rows[-1]["count"], {row["key"] for row in rows})
+                for rows in lists if rows and len(rows) == k
+            ]
+            for key, entry in totals.items():
+                entry[1] += sum(floor for floor, keys in full if key not in keys)
+
+            ranked = sorted(totals.items(), key=lambda item: -item[1][0])[:k]
+            result.setdefault(dim, {})[unit] = [
+                {"key": key, "count": count, "error": error}
+                for key, (count, error) in ranked
+            ]
+
+    return result
+
+
+def apply_top_talkers(data):
+    sensor_id = data.pop("sensor_id", DEFAULT_SENSOR)
+    sensor_partition(sensor_id)["top_talkers"] = data
+    state["top_talkers"] = merge_top_talkers(
+        partition["top_talkers"] for partition in sensors.values()
+    )
+    cache.bump("top-talkers", f"top-talkers:{sensor_id}")
+
+
+def apply_unblock(ip):
+    if ip in state["blocked_ips"]:
+        del state["blocked_ips"][ip]
+        for partition in sensors.values():
+            partition["blocked_ips"].pop(ip, None)
+        cache.bump("blocked")
+
+
+def apply_events(events):
+    for event in events:
+        apply_event(event)
+
+
+HANDLERS = {
+    "event": apply_event,
+    "events": apply_events,
+    "governance": apply_governance,
+    "governance_batch": apply_governance_batch,
+    "top_talkers": apply_top_talkers,
+    "unblock": apply_unblock,
+}
+
+
+# =========================================================
+# SINGLE-WRITER ACTOR
+# =========================================================
+
+class IngestActor:
+    """
+    The only code path that mutates `state`.
+
+    Handlers submit messages and return at once; one asyncio task
+    applies them in order. Readers run on the same event loop and
+    only ever see state between two messages, and they are served
+    the immutable pre-serialised bodies in `cache`.
+    """
+
+    def __init__(self):
+        self.queue = None
+        self.task = None
+        self.applied = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def start(self):
+        if self.task is None:
+            self.queue = asyncio.Queue(maxsize=MAX_PENDING)
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, kind, payload):
+        try:
+            self.queue.put_nowait((kind, payload))
+            return True
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+
+    async def _run(self):
+        queue = self.queue
+        while True:
+            message = await queue.get()
+            if message is None:
+                return
+
+            batch = [message]
+            while len(batch) < DRAIN_BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            for message in batch:
+                if message is None:
+                    return
+                kind, payload = message
+                try:
+                    HANDLERS[kind](payload)
+                    self.applied += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Ingest error ({kind}):", e)
+
+            # Let readers in between batches
+            await asyncio.sleep(0)
+
+    async def flush(self):
+        """Wait until everything submitted so far has been applied."""
+
+        while not self.queue.empty():
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0)
+
+    async def stop(self):
+        if self.task is None:
+            return
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+
+actor = IngestActor()
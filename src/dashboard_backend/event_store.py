@@ -0,0 +1,252 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DB_PATH = os.environ.get(
+    "IDS_EVENT_DB",
+    os.path.join(PROJECT_ROOT, "data", "events.db")
+)
+
+RETENTION_DAYS = 30
+COMPACT_INTERVAL = 3600     # seconds between retention passes
+COMPACT_CHUNK = 50_000      # rows deleted per transaction
+
+BATCH_SIZE = 1000           # max events per insert transaction
+BATCH_WAIT = 0.2            # seconds to wait for a batch to fill
+MAX_PENDING = 200_000       # events queued before ingest starts dropping
+
+MAX_PAGE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id      INTEGER PRIMARY KEY,
+    ts      REAL NOT NULL,
+    src_ip  TEXT,
+    dst_ip  TEXT,
+    level   TEXT,
+    action  TEXT,
+    risk    REAL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_ip ON events (src_ip, id);
+CREATE INDEX IF NOT EXISTS idx_events_level ON events (level, id);
+"""
+
+
+def parse_time(value):
+    """Accept epoch seconds or an ISO-8601 string."""
+
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+class EventStore:
+    """
+    Append-optimised SQLite event log (WAL mode).
+
+    - append() only enqueues, so ingest never waits on disk
+    - one writer thread inserts in batched transactions and runs
+      retention compaction
+    - rows are timed by the event's own "ts" (ingest time when it has
+      none), so spooled events replayed late still land in the right
+      range; time bounds scan idx_events_ts
+    """
+
+    def __init__(self, path=DB_PATH, retention_days=RETENTION_DAYS):
+        self.path = path
+        self.retention = retention_days * 86400
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        # auto_vacuum only takes effect on a fresh database
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self.pending = queue.Queue()
+        self.dropped = 0
+        self.written = 0
+
+        self.local = threading.local()
+        self.stop_event = threading.Event()
+        self.writer = threading.Thread(target=self._run, daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------------- WRITE PATH ----------------
+
+    def append(self, event, ts=None):
+        if self.pending.qsize() >= MAX_PENDING:
+            self.dropped += 1
+            return False
+
+        if ts is None:
+            ts = event.get("ts")
+        try:
+            ts = float(ts)
+        except (TypeError, ValueError):
+            ts = time.time()
+
+        self.pending.put((ts, event))
+        return True
+
+    def _run(self):
+        conn = self._connect()
+        last_compact = 0.0
+
+        while not self.stop_event.is_set() or not self.pending.empty():
+            batch = self._next_batch()
+            if batch:
+                self._insert(conn, batch)
+
+            now = time.time()
+            if now - last_compact >= COMPACT_INTERVAL:
+                self._compact(conn, now)
+                last_compact = now
+
+        conn.close()
+
+    def _next_batch(self):
+        try:
+            batch = [self.pending.get(timeout=BATCH_WAIT)]
+        except queue.Empty:
+            return []
+
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, conn, batch):
+        rows = [
+            (
+                ts,
+                event.get("src_ip"),
+                event.get("dst_ip"),
+                event.get("level"),
+                event.get("action"),
+                float(event.get("risk", 0) or 0),
+                json.dumps(event, separators=(",", ":")),
+            )
+            for ts, event in batch
+        ]
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO events (ts, src_ip, dst_ip, level, action, risk, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            self.written += len(rows)
+        except sqlite3.Error as e:
+            self.dropped += len(rows)
+            print("Event store insert error:", e)
+
+    def _compact(self, conn, now):
+        cutoff = now - self.retention
+        try:
+            while True:
+                with conn:
+                    deleted = conn.execute(
+                        "DELETE FROM events WHERE id IN "
+                        "(SELECT id FROM events WHERE ts < ? ORDER BY id LIMIT ?)",
+                        (cutoff, COMPACT_CHUNK)
+                    ).rowcount
+                if deleted < COMPACT_CHUNK:
+                    break
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            print("Event store compaction error:", e)
+
+    def close(self, timeout=5):
+        self.stop_event.set()
+        self.writer.join(timeout)
+
+    # ---------------- READ PATH ----------------
+
+    def _reader(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn
+
+    def query(self, since=None, until=None, ip=None, level=None,
+              action=None, limit=100, before_id=None):
+        """
+        Newest-first page of events.
+        Returns (events, next_cursor); pass next_cursor back as before_id.
+        """
+
+        conn = self._reader()
+        limit = max(1, min(int(limit), MAX_PAGE))
+
+        clauses = []
+        params = []
+
+        # Event time is not monotonic in id (late spool replays), so
+        # bound ts itself rather than translating it to an id range
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+
+        if until is not None:
+            clauses.append("ts <= ?")
+            params.append(until)
+
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(int(before_id))
+
+        for column, value in (("src_ip", ip), ("level", level), ("action", action)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        rows = conn.execute(
+            f"SELECT id, ts, payload FROM events {where} "
+            f"ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][0]
+
+        events = []
+        for row_id, ts, payload in rows:
+            event = json.loads(payload)
+            event["id"] = row_id
+            event.setdefault("ts", ts)
+            events.append(event)
+
+        return events, next_cursor
+
+    def stats(self):
+        return {
+            "pending": self.pending.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
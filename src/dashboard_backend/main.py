@@ -1,7 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from collections import defaultdict, deque
-from datetime import datetime
+import asyncio
+import json
+
+from .event_store import parse_time
+from ..realtime import wire_format
+from .backend_state import (
+    state, sensors, trends, cache, event_store, actor, fleet_governance
+)
 
 app = FastAPI()
 
@@ -13,100 +19,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-MAX_LOGS = 500
-MAX_HISTORY = 300
 
-state = {
-    "total_flows": 0,
-    "total_blocks": 0,
-    "drift": 0.0,
-    "risk_sum": 0.0,
-    "logs": [],
-    "attack_counts": defaultdict(int),
-    "blocked_ips": {},
+@app.on_event("startup")
+async def startup():
+    actor.start()
 
-    "risk_history": deque(maxlen=MAX_HISTORY),
-    "drift_history": deque(maxlen=MAX_HISTORY),
-    "ssi_history": deque(maxlen=MAX_HISTORY),
-    "threshold_history": deque(maxlen=MAX_HISTORY),
-    "trust_scores": defaultdict(lambda: 0.7),
-    "profile_history": deque(maxlen=MAX_HISTORY),
-}
 
+@app.on_event("shutdown")
+async def shutdown():
+    await actor.stop()
+    event_store.close()
 
-# ---------------- IDS EVENT INGEST ----------------
 
-@app.post("/ingest")
-def ingest(event: dict):
-
-    state["total_flows"] += 1
-
-    risk = float(event.get("risk", 0))
-    drift = float(event.get("drift", 0))
-    threshold = float(event.get("threshold", 150))
-    action = event.get("action", "MONITOR")
-    src_ip = event.get("src_ip")
+def submit(kind, payload):
+    # All state changes go through the single writer task
+    if not actor.submit(kind, payload):
+        raise HTTPException(status_code=503, detail="ingest queue full")
+    return {"status": "ok"}
 
-    state["risk_sum"] += risk
-    state["drift"] = drift
 
-    if action == "BLOCKED":
-        state["total_blocks"] += 1
-        if src_ip:
-            state["blocked_ips"][src_ip] = event.get(
-                "timestamp", datetime.now().strftime("%H:%M:%S")
-            )
+# ---------------- IDS EVENT INGEST ----------------
 
-    level = event.get("level", "LOW")
-    state["attack_counts"][level] += 1
+@app.post("/ingest")
+async def ingest(event: dict):
+    return submit("event", event)
 
-    # Ensure protocol exists
-    if "protocol" not in event:
-        event["protocol"] = "N/A"
 
-    state["logs"].append(event)
-    if len(state["logs"]) > MAX_LOGS:
-        state["logs"].pop(0)
+# ---------------- BATCHED EVENT INGEST ----------------
 
-    state["risk_history"].append({
-        "time": event.get("timestamp"),
-        "risk": risk,
-        "threshold": threshold
-    })
+@app.post("/ingest_batch")
+async def ingest_batch(request: Request):
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
 
-    state["drift_history"].append({
-        "time": event.get("timestamp"),
-        "drift": drift
-    })
+    # Compact binary batches from sensors; JSON lists still accepted
+    try:
+        if content_type.startswith(wire_format.CONTENT_TYPE):
+            events = wire_format.decode_batch(body)
+        else:
+            events = json.loads(body)
+            if not isinstance(events, list):
+                raise ValueError("expected a list of events")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return {"status": "ok"}
+    submit("events", events)
+    return {"status": "ok", "events": len(events)}
 
 
 # ---------------- GOVERNANCE INGEST ----------------
 
 @app.post("/ingest_governance")
-def ingest_governance(data: dict):
+async def ingest_governance(data: dict):
+    return submit("governance", data)
 
-    ssi = float(data.get("ssi", 0))
-    threshold = float(data.get("threshold", 150))
-    trust = float(data.get("trust", 0.7))
-    profile = data.get("profile", "precision")
 
-    state["ssi_history"].append(ssi)
-    state["threshold_history"].append(threshold)
-    state["profile_history"].append(profile)
+@app.post("/ingest_governance_batch")
+async def ingest_governance_batch(items: list):
+    return submit("governance_batch", items)
 
-    ip = data.get("ip")
-    if ip:
-        state["trust_scores"][ip] = trust
 
-    return {"status": "ok"}
+# ---------------- TOP TALKERS INGEST ----------------
+
+@app.post("/ingest_top_talkers")
+async def ingest_top_talkers(data: dict):
+    return submit("top_talkers", data)
 
 
 # ---------------- DASHBOARD DATA ----------------
+# Read endpoints serve cached bodies via `cache`; the build_* functions
+# only run again after an ingest bumps their topic.
 
-@app.get("/stats")
-def stats():
+def build_stats():
     avg_risk = (
         state["risk_sum"] / state["total_flows"]
         if state["total_flows"] > 0 else 0
@@ -116,78 +100,228 @@ def stats():
         "total_flows": state["total_flows"],
         "total_blocks": state["total_blocks"],
         "drift": round(state["drift"], 4),
-        "avg_risk": round(avg_risk, 2)
+        "avg_risk": round(avg_risk, 2),
+        "sensors": len(sensors)
+    }
+
+
+def build_sensor_stats(sensor_id):
+    partition = sensors[sensor_id]
+    flows = partition["total_flows"]
+
+    return {
+        "sensor_id": sensor_id,
+        "total_flows": flows,
+        "total_blocks": partition["total_blocks"],
+        "drift": round(partition["drift"], 4),
+        "avg_risk": round(partition["risk_sum"] / flows, 2) if flows else 0,
+        "ssi": round(partition["ssi"], 4),
+        "dynamic_threshold": round(partition["threshold"], 2),
+        "profile": partition["profile"],
+        "attacks": dict(partition["attack_counts"]),
+        "blocked": len(partition["blocked_ips"]),
+        "last_seen": partition["last_seen"],
+    }
+
+
+@app.get("/stats")
+async def stats(request: Request, sensor: str = None):
+    if sensor is None:
+        return cache.respond(request, "stats", build_stats)
+
+    if sensor not in sensors:
+        raise HTTPException(status_code=404, detail="unknown sensor")
+    return cache.respond(
+        request, f"stats:{sensor}", lambda: build_sensor_stats(sensor)
+    )
+
+
+def build_sensors():
+    count = len(sensors)
+
+    return {
+        "count": count,
+        # Means over each sensor's latest value, from running sums
+        "mean_drift": round(state["drift_sum"] / count, 4) if count else 0,
+        "mean_ssi": round(state["ssi_sum"] / count, 4) if count else 0,
+        "sensors": [
+            {
+                "sensor_id": sensor_id,
+                "total_flows": partition["total_flows"],
+                "total_blocks": partition["total_blocks"],
+                "drift": round(partition["drift"], 4),
+                "ssi": round(partition["ssi"], 4),
+                "profile": partition["profile"],
+                "last_seen": partition["last_seen"],
+            }
+            for sensor_id, partition in sensors.items()
+        ],
     }
 
 
+@app.get("/sensors")
+async def get_sensors(request: Request):
+    return cache.respond(request, "sensors", build_sensors)
+
+
+def rollup(name, range, resolution):
+    try:
+        return trends.query(name, range, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/risk-trend")
-def risk_trend():
-    return list(state["risk_history"])
+async def risk_trend(request: Request, range: str = None, resolution: str = None):
+    # Without a range, keep returning the raw recent points
+    if range is None:
+        return cache.respond(
+            request, "risk-trend", lambda: list(state["risk_history"])
+        )
+    return rollup("risk", range, resolution)
+
+
+@app.get("/threshold-trend")
+async def threshold_trend(range: str = "5m", resolution: str = None):
+    return rollup("threshold", range, resolution)
 
 
 @app.get("/drift-trend")
-def drift_trend():
-    return list(state["drift_history"])
+async def drift_trend(request: Request, range: str = None, resolution: str = None):
+    if range is None:
+        return cache.respond(
+            request, "drift-trend", lambda: list(state["drift_history"])
+        )
+    return rollup("drift", range, resolution)
+
+
+@app.get("/ssi-trend")
+async def ssi_trend(range: str = "5m", resolution: str = None):
+    return rollup("ssi", range, resolution)
+
+
+@app.get("/governance-threshold-trend")
+async def governance_threshold_trend(range: str = "5m", resolution: str = None):
+    return rollup("governance_threshold", range, resolution)
+
+
+@app.get("/top-talkers")
+async def get_top_talkers(request: Request, sensor: str = None):
+    if sensor is None:
+        return cache.respond(request, "top-talkers", lambda: state["top_talkers"])
+
+    if sensor not in sensors:
+        raise HTTPException(status_code=404, detail="unknown sensor")
+    return cache.respond(
+        request, f"top-talkers:{sensor}", lambda: sensors[sensor]["top_talkers"]
+    )
 
 
 @app.get("/attacks")
-def attacks():
-    return dict(state["attack_counts"])
+async def attacks(request: Request):
+    return cache.respond(
+        request, "attacks", lambda: dict(state["attack_counts"])
+    )
 
 
 @app.get("/blocked")
-def get_blocked():
-    return state["blocked_ips"]
+async def get_blocked(request: Request):
+    return cache.respond(
+        request, "blocked", lambda: dict(state["blocked_ips"])
+    )
 
 
 @app.post("/unblock")
-def unblock(data: dict):
-    ip = data.get("ip")
-    if ip in state["blocked_ips"]:
-        del state["blocked_ips"][ip]
+async def unblock(data: dict):
+    submit("unblock", data.get("ip"))
     return {"status": "unblocked"}
 
 
+LOG_TAIL = 100
+
+
 @app.get("/logs")
-def logs():
-    return state["logs"][-100:]
+async def logs(
+    request: Request,
+    response: Response,
+    since: str = None,
+    until: str = None,
+    ip: str = None,
+    level: str = None,
+    action: str = None,
+    limit: int = LOG_TAIL,
+    cursor: int = None,
+):
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+
+    # Plain /logs keeps serving the live tail from memory
+    if not any((since, until, ip, level, action, cursor)):
+        if limit == LOG_TAIL:
+            return cache.respond(
+                request, "logs", lambda: list(state["logs"])[-LOG_TAIL:]
+            )
+        return list(state["logs"])[-limit:]
+
+    try:
+        since_ts = parse_time(since)
+        until_ts = parse_time(until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"bad since/until: {e}")
+
+    # SQLite runs off the event loop
+    events, next_cursor = await asyncio.to_thread(
+        event_store.query,
+        since=since_ts,
+        until=until_ts,
+        ip=ip,
+        level=level,
+        action=action,
+        limit=limit,
+        before_id=cursor,
+    )
 
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
 
-@app.get("/governance")
-def get_governance():
+    return events
 
-    current_profile = (
-        state["profile_history"][-1]
-        if state["profile_history"]
-        else "precision"
-    )
 
-    current_ssi = (
-        state["ssi_history"][-1]
-        if state["ssi_history"]
-        else 0
-    )
+def build_governance():
 
-    current_threshold = (
-        state["threshold_history"][-1]
-        if state["threshold_history"]
-        else 150
-    )
+    # Merged over sensors: mean SSI / threshold, most common profile
+    fleet = fleet_governance()
 
+    # Running sum kept by ingest_governance, no pass over all IPs
     avg_trust = (
-        sum(state["trust_scores"].values()) / len(state["trust_scores"])
+        state["trust_sum"] / len(state["trust_scores"])
         if state["trust_scores"] else 0.7
     )
 
     trust_distribution = [
         {"ip": ip, "trust": score}
-        for ip, score in state["trust_scores"].items()
+        for ip, score in list(state["trust_scores"].items())
     ]
 
     return {
-        "profile": current_profile,
-        "ssi": round(current_ssi, 4),
-        "dynamic_threshold": round(current_threshold, 2),
+        "profile": fleet["profile"],
+        "ssi": round(fleet["ssi"], 4),
+        "dynamic_threshold": round(fleet["threshold"], 2),
         "avg_trust": round(avg_trust, 3),
-        "trust_distribution": trust_distribution
+        "trust_distribution": trust_distribution,
+        "sensors": {
+            sensor_id: {
+                "profile": partition["profile"],
+                "ssi": round(partition["ssi"], 4),
+                "dynamic_threshold": round(partition["threshold"], 2),
+            }
+            for sensor_id, partition in sensors.items()
+            if partition["governed"]
+        },
     }
+
+
+@app.get("/governance")
+async def get_governance(request: Request):
+    return cache.respond(request, "governance", build_governance)
+
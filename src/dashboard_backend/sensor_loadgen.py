@@ -0,0 +1,142 @@
+"""
+Multi-sensor load generator.
+
+Spawns one process per simulated sensor, each posting events and
+periodic governance updates under its own sensor_id over a
+keep-alive connection, and reports ingest throughput and latency
+as the number of sensors grows.
+
+    python -m src.dashboard_backend.sensor_loadgen --url http://localhost:9000 \\
+        --sensors 1,2,4,8 --events 2000
+"""
+
+import argparse
+import http.client
+import json
+import random
+import time
+import urllib.parse
+from multiprocessing import Pool
+
+from .stress_bench import make_event, http_json
+
+GOVERNANCE_EVERY = 50   # events between governance updates per sensor
+
+
+def run_sensor(args):
+    url, sensor_id, events, seed = args
+    parsed = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=10)
+    headers = {"Content-Type": "application/json"}
+    rng = random.Random(seed)
+
+    latencies = []
+    rejected = 0
+
+    def post(path, payload):
+        nonlocal rejected
+        start = time.perf_counter()
+        conn.request("POST", path, json.dumps(payload), headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status == 503:
+            rejected += 1
+
+    start = time.perf_counter()
+    for i in range(events):
+        event = make_event(i, rng)
+        event["sensor_id"] = sensor_id
+        post("/ingest", event)
+
+        if i % GOVERNANCE_EVERY == 0:
+            post("/ingest_governance", {
+                "ssi": round(rng.random(), 4),
+                "threshold": rng.randint(130, 200),
+                "trust": round(rng.random(), 3),
+                "profile": "precision",
+                "ip": event["src_ip"],
+                "sensor_id": sensor_id,
+            })
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    return {
+        "sensor_id": sensor_id,
+        "events": events,
+        "seconds": elapsed,
+        "rejected": rejected,
+        "latencies": latencies,
+    }
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_step(url, count, events, run_id):
+    sensor_ids = [f"loadgen-{run_id}-{count}-{n}" for n in range(count)]
+    before = http_json(f"{url}/stats")["total_flows"]
+
+    start = time.perf_counter()
+    with Pool(count) as pool:
+        results = pool.map(
+            run_sensor,
+            [(url, sensor_id, events, n) for n, sensor_id in enumerate(sensor_ids)],
+        )
+    elapsed = time.perf_counter() - start
+
+    # The writer applies asynchronously; give it a moment to drain
+    sent = count * events
+    for _ in range(50):
+        after = http_json(f"{url}/stats")["total_flows"]
+        if after - before >= sent:
+            break
+        time.sleep(0.1)
+
+    # Every sensor must have its own partition with exactly its events
+    listed = {
+        s["sensor_id"]: s["total_flows"]
+        for s in http_json(f"{url}/sensors")["sensors"]
+    }
+    latencies = [l for r in results for l in r["latencies"]]
+
+    checks = {
+        "total_flows": after - before == sent,
+        "partitions": all(listed.get(s) == events for s in sensor_ids),
+        "no_rejects": not any(r["rejected"] for r in results),
+    }
+
+    return {
+        "sensors": count,
+        "events": sent,
+        "seconds": round(elapsed, 3),
+        "ingest_per_sec": round(sent / elapsed),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+# ---------------- ENTRY ----------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:9000")
+    parser.add_argument("--sensors", default="1,2,4,8")
+    parser.add_argument("--events", type=int, default=2000)
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/")
+    run_id = int(time.time())
+    steps = [
+        run_step(url, int(count), args.events, run_id)
+        for count in args.sensors.split(",")
+    ]
+
+    print(json.dumps(steps, indent=2))
+    raise SystemExit(0 if all(step["ok"] for step in steps) else 1)
@@ -0,0 +1,56 @@
+import os
+
+from fastapi import Response
+
+# Optional fast JSON encoder
+try:
+    import orjson
+
+    def dumps(data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    import json
+
+    def dumps(data):
+        return json.dumps(data, separators=(",", ":")).encode()
+
+
+class SnapshotCache:
+    """
+    Pre-serialised response bodies keyed by topic.
+
+    Writers call bump(topic) when the data behind a topic changes.
+    Readers get the cached body while the generation is unchanged,
+    and 304 Not Modified when the client already holds that ETag,
+    so polling cost does not grow with the number of clients.
+    """
+
+    def __init__(self):
+        # Distinguishes ETags across restarts, when generations reset
+        self.boot = os.urandom(4).hex()
+        self.generations = {}
+        self.entries = {}   # topic -> (generation, etag, body)
+
+    def bump(self, *topics):
+        for topic in topics:
+            self.generations[topic] = self.generations.get(topic, 0) + 1
+
+    def get(self, topic, build):
+        generation = self.generations.get(topic, 0)
+        entry = self.entries.get(topic)
+
+        if entry is None or entry[0] != generation:
+            body = dumps(build())
+            entry = (generation, f'"{self.boot}-{topic}-{generation}"', body)
+            self.entries[topic] = entry
+
+        return entry
+
+    def respond(self, request, topic, build):
+        _, etag, body = self.get(topic, build)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        return Response(content=body, media_type="application/json", headers=headers)
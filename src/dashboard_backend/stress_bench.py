@@ -0,0 +1,297 @@
+"""
+Concurrency stress test and throughput benchmark for the backend.
+
+In-process (default): producer and reader threads drive the ingest
+actor and the cached read builders, then check the counters, including
+that every queue-full refusal (503) was counted.
+
+    python -m src.dashboard_backend.stress_bench --producers 16 --events 5000
+    python -m src.dashboard_backend.stress_bench --max-pending 64
+
+Against a running server: hammers /ingest and the read endpoints
+from threads and checks /stats moved by exactly the events sent.
+
+    python -m src.dashboard_backend.stress_bench --url http://localhost:9000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+IN_FLIGHT = 32      # outstanding submits per in-process producer thread
+
+
+def make_event(i, rng):
+    blocked = rng.random() < 0.1
+    return {
+        "timestamp": time.strftime("%H:%M:%S"),
+        "src_ip": f"10.{i % 7}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        "dst_ip": "10.0.0.1",
+        "risk": round(rng.uniform(5, 220), 2),
+        "level": "HIGH" if blocked else "LOW",
+        "mode": "STABLE",
+        "drift": round(rng.uniform(0, 0.3), 4),
+        "action": "BLOCKED" if blocked else "MONITOR",
+        "alert": blocked,
+    }
+
+
+# =========================================================
+# IN-PROCESS
+# =========================================================
+
+def run_in_process(producers, events_per_producer, readers, max_pending=None):
+    """
+    Producer and reader threads against the ingest actor on its own
+    event loop thread. Each thread reaches the actor the way a request
+    handler does, as a call scheduled on that loop, so submits from
+    many threads contend for the same queue. A refused submit (a 503
+    at the HTTP layer) is counted and retried.
+    """
+
+    from . import backend_state, main
+    from .backend_state import actor, state, cache
+
+    if max_pending is not None:
+        # Small queues make the 503 path part of the run
+        backend_state.MAX_PENDING = max_pending
+
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+
+    def schedule(fn):
+        async def call():
+            return fn()
+        return asyncio.run_coroutine_threadsafe(call(), loop)
+
+    def on_loop(fn):
+        return schedule(fn).result()
+
+    on_loop(actor.start)
+    stop = threading.Event()
+
+    # Checks compare deltas, so state left by earlier runs in the
+    # same process does not count against this one
+    def totals():
+        return {
+            "total_flows": state["total_flows"],
+            "attack_counts": sum(state["attack_counts"].values()),
+            "total_blocks": state["total_blocks"],
+            "applied": actor.applied,
+            "rejected": actor.rejected,
+            "errors": actor.errors,
+        }
+
+    before = on_loop(totals)
+
+    def producer(p):
+        rng = random.Random(p)
+        blocks = refused = 0
+        # Like IN_FLIGHT concurrent requests per client: submits queue
+        # up on the loop back to back, which is what fills the actor
+        in_flight = deque()
+
+        def issue(kind, payload):
+            in_flight.append((schedule(lambda: actor.submit(kind, payload)), kind, payload))
+
+        def settle(limit):
+            nonlocal refused
+            while len(in_flight) > limit:
+                future, kind, payload = in_flight.popleft()
+                if not future.result():
+                    refused += 1
+                    time.sleep(0.001)
+                    issue(kind, payload)
+
+        for i in range(events_per_producer):
+            event = make_event(i, rng)
+            blocks += event["action"] == "BLOCKED"
+            issue("event", event)
+            issue("governance", {
+                "ssi": rng.random(), "threshold": 150,
+                "trust": rng.random(), "ip": event["src_ip"],
+                "sensor_id": f"stress-{p % 4}",
+            })
+            settle(IN_FLIGHT)
+        settle(0)
+        return blocks, refused
+
+    builders = {
+        "stats": main.build_stats,
+        "governance": main.build_governance,
+        "attacks": lambda: dict(state["attack_counts"]),
+        "blocked": lambda: dict(state["blocked_ips"]),
+    }
+
+    def read_all():
+        for topic, build in builders.items():
+            cache.get(topic, build)
+        return len(builders)
+
+    def reader():
+        reads = 0
+        while not stop.is_set():
+            reads += on_loop(read_all)
+        return reads
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(producers + readers) as pool:
+        read_futures = [pool.submit(reader) for _ in range(readers)]
+        results = list(pool.map(producer, range(producers)))
+        asyncio.run_coroutine_threadsafe(actor.flush(), loop).result()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        reads = sum(f.result() for f in read_futures)
+
+    sent = producers * events_per_producer
+    expected_blocks = sum(blocks for blocks, _ in results)
+    refused = sum(r for _, r in results)
+
+    def check():
+        trust = state["trust_scores"]
+        delta = {key: value - before[key] for key, value in totals().items()}
+        return {
+            "total_flows": delta["total_flows"] == sent,
+            "attack_counts": delta["attack_counts"] == sent,
+            "total_blocks": delta["total_blocks"] == expected_blocks,
+            "trust_sum": abs(state["trust_sum"] - sum(trust.values())) < 1e-6,
+            # Every accepted event and governance update applied once
+            "all_applied": delta["applied"] == 2 * sent,
+            # Every refusal a caller saw is in the actor's counter
+            "refusals_counted": delta["rejected"] == refused,
+            "no_ingest_errors": delta["errors"] == 0,
+        }
+
+    checks = on_loop(check)
+    asyncio.run_coroutine_threadsafe(actor.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    loop_thread.join()
+    loop.close()
+
+    return {
+        "mode": "in-process",
+        "producer_threads": producers,
+        "reader_threads": readers,
+        "events": sent,
+        "seconds": round(elapsed, 3),
+        "ingest_per_sec": round(2 * sent / elapsed),
+        "queue_full_refusals": refused,
+        "cached_reads": reads,
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+# =========================================================
+# HTTP
+# =========================================================
+
+def http_json(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(
+        url, data=data, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read() or b"null")
+
+
+def run_http(url, producers, events_per_producer, readers):
+    before = http_json(f"{url}/stats")["total_flows"]
+    stop = threading.Event()
+    read_errors = []
+
+    def producer(p):
+        rng = random.Random(p)
+        refused = 0
+        for i in range(events_per_producer):
+            event = make_event(i, rng)
+            while True:
+                try:
+                    http_json(f"{url}/ingest", event)
+                    break
+                except urllib.error.HTTPError as e:
+                    # 503: ingest queue full; anything else is a failure
+                    if e.code != 503:
+                        raise
+                    refused += 1
+                    time.sleep(0.01)
+        return refused
+
+    def reader():
+        count = 0
+        while not stop.is_set():
+            for path in ("/stats", "/governance", "/attacks", "/blocked", "/logs"):
+                try:
+                    http_json(url + path)
+                    count += 1
+                except Exception as e:
+                    read_errors.append(str(e))
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(producers + readers) as pool:
+        read_futures = [pool.submit(reader) for _ in range(readers)]
+        refused = sum(pool.map(producer, range(producers)))
+        stop.set()
+        reads = sum(f.result() for f in read_futures)
+    elapsed = time.perf_counter() - start
+
+    # The writer applies asynchronously; give it a moment to drain
+    sent = producers * events_per_producer
+    for _ in range(50):
+        after = http_json(f"{url}/stats")["total_flows"]
+        if after - before >= sent:
+            break
+        time.sleep(0.1)
+
+    checks = {
+        "total_flows": after - before == sent,
+        "no_read_errors": not read_errors,
+    }
+
+    return {
+        "mode": "http",
+        "events": sent,
+        "seconds": round(elapsed, 3),
+        "ingest_per_sec": round(sent / elapsed),
+        "queue_full_refusals": refused,
+        "reads": reads,
+        "reads_per_sec": round(reads / elapsed),
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+# ---------------- ENTRY ----------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--producers", type=int, default=8)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="ingest queue size for the in-process run")
+    args = parser.parse_args()
+
+    if args.url:
+        result = run_http(args.url.rstrip("/"), args.producers, args.events, args.readers)
+    else:
+        # Keep the benchmark's events out of the real event store
+        os.environ.setdefault(
+            "IDS_EVENT_DB", os.path.join(tempfile.mkdtemp(), "stress.db")
+        )
+        result = run_in_process(args.producers, args.events, args.readers, args.max_pending)
+
+    print(json.dumps(result, indent=2))
+    raise SystemExit(0 if result["ok"] else 1)
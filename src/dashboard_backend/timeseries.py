@@ -0,0 +1,145 @@
+import bisect
+import time
+from collections import deque
+from datetime import datetime
+
+# resolution (s) -> buckets kept
+TIERS = {
+    1: 3600,        # 1 s buckets for the last hour
+    60: 10080,      # 1 min buckets for the last week
+    3600: 2160,     # 1 h buckets for the last 90 days
+}
+
+RESOLUTIONS = {"1s": 1, "1m": 60, "1h": 3600}
+
+# Auto-selected tiers return at most this many points
+MAX_POINTS = 720
+
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value):
+    """'90', '15m', '6h' or '30d' -> seconds."""
+
+    value = str(value).strip().lower()
+    if value and value[-1] in UNITS:
+        return float(value[:-1]) * UNITS[value[-1]]
+    return float(value)
+
+
+class RollupSeries:
+    """
+    One metric downsampled into 1 s / 1 min / 1 h buckets.
+
+    Every point updates the open bucket of each tier in place
+    (min / max / sum / count), so ingest is O(tiers) and a query
+    only touches the buckets it returns. Points are bucketed by
+    their own timestamp; late ones land in older buckets.
+    """
+
+    def __init__(self, tiers=TIERS):
+        # bucket = [start, min, max, sum, count]
+        self.tiers = {res: deque(maxlen=size) for res, size in tiers.items()}
+
+    def add(self, value, ts=None):
+        ts = time.time() if ts is None else ts
+
+        for res, buckets in self.tiers.items():
+            start = ts - ts % res
+            if buckets and buckets[-1][0] == start:
+                bucket = buckets[-1]
+            elif not buckets or start > buckets[-1][0]:
+                buckets.append([start, value, value, value, 1])
+                continue
+            else:
+                # Late point (spool replay, drained backlog): goes into
+                # the bucket of its own time, found by bisection
+                bucket = self._late_bucket(buckets, start, value)
+                if bucket is None:
+                    continue
+
+            if value < bucket[1]:
+                bucket[1] = value
+            if value > bucket[2]:
+                bucket[2] = value
+            bucket[3] += value
+            bucket[4] += 1
+
+    @staticmethod
+    def _late_bucket(buckets, start, value):
+        """Existing bucket for `start`, or None once a new one was inserted."""
+
+        i = bisect.bisect_left(buckets, start, key=lambda bucket: bucket[0])
+        if i < len(buckets) and buckets[i][0] == start:
+            return buckets[i]
+
+        if len(buckets) == buckets.maxlen:
+            if i == 0:
+                # Older than the tier keeps
+                return None
+            buckets.popleft()
+            i -= 1
+        buckets.insert(i, [start, value, value, value, 1])
+        return None
+
+    def pick_resolution(self, range_seconds):
+        """Finest tier that covers the range within MAX_POINTS."""
+
+        for res in sorted(self.tiers):
+            size = self.tiers[res].maxlen
+            if range_seconds / res <= MAX_POINTS and range_seconds <= res * size:
+                return res
+        return max(self.tiers)
+
+    def query(self, range_seconds, resolution=None, now=None):
+        now = time.time() if now is None else now
+        res = resolution or self.pick_resolution(range_seconds)
+        buckets = self.tiers[res]
+        cutoff = now - range_seconds
+
+        points = []
+        for start, low, high, total, count in reversed(buckets):
+            if start + res <= cutoff:
+                break
+            points.append({
+                "time": datetime.fromtimestamp(start).strftime(
+                    "%H:%M:%S" if res < 3600 else "%m-%d %H:%M"
+                ),
+                "start": start,
+                "min": low,
+                "max": high,
+                "mean": total / count,
+                "count": count,
+            })
+        points.reverse()
+        return res, points
+
+
+class TimeSeriesStore:
+    """Named rollup series maintained on ingest."""
+
+    def __init__(self, names=()):
+        self.series = {name: RollupSeries() for name in names}
+
+    def add(self, name, value, ts=None):
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = RollupSeries()
+        series.add(value, ts)
+
+    def query(self, name, range_value, resolution=None):
+        range_seconds = parse_duration(range_value)
+        if range_seconds <= 0:
+            raise ValueError(f"Invalid range: {range_value}")
+
+        res = None
+        if resolution and resolution != "auto":
+            if resolution not in RESOLUTIONS:
+                raise ValueError(f"Unknown resolution: {resolution}")
+            res = RESOLUTIONS[resolution]
+        series = self.series.get(name)
+        if series is None:
+            return {"series": name, "resolution": res, "points": []}
+
+        res, points = series.query(range_seconds, res)
+        return {"series": name, "resolution": res, "points": points}
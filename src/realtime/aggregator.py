@@ -0,0 +1,243 @@
+import os
+import threading
+import time
+
+from .metric_types import MetricFamily
+
+# Seconds per tumbling window; 0 ships every event as it comes
+AGGREGATION_WINDOW = float(os.environ.get("IDS_AGGREGATION_WINDOW", "1.0"))
+
+# Blocked sources remembered until the enforcer unblocks them; ones it
+# never reports (a manual unblock) are forgotten after the TTL, which
+# is longer than enforcement.BLOCK_DURATION
+BLOCKED_SOURCE_TTL = 600
+MAX_BLOCKED_SOURCES = 65536
+
+
+class EventAggregator:
+    """
+    Collapses repeated events before they are shipped.
+
+    Events with the same (src_ip, dst_ip, action, level) inside one
+    tumbling window become a single summary carrying count,
+    risk_min/risk_max, mean risk and first_seen/last_seen. A group of
+    one is shipped unchanged.
+
+    State transitions skip the window. The first BLOCKED event for a
+    source is returned by add() at once. Unblocks come only from the
+    enforcer's expiry path through unblocked(), which ships the
+    source's held events so they are not merged with what follows;
+    a later non-blocked event from the source is grouped as usual.
+
+    Windows close on the next add() after they expire, or from the
+    timer thread start() runs, so a quiet sensor still ships them.
+    """
+
+    def __init__(self, window=AGGREGATION_WINDOW, blocked_ttl=BLOCKED_SOURCE_TTL,
+                 max_blocked=MAX_BLOCKED_SOURCES):
+        self.window = window
+        self.window_start = None
+        self.groups = {}                # key -> [first, last, count, min, max, sum]
+        self.lock = threading.RLock()
+
+        # src -> last BLOCKED time, oldest first
+        self.blocked_sources = {}
+        self.blocked_ttl = blocked_ttl
+        self.max_blocked = max_blocked
+
+        self.worker = None
+        self.stop_event = threading.Event()
+
+        self.events_in = 0
+        self.events_out = 0
+        self.transitions = 0
+        self.summaries = 0
+        self.timed_flushes = 0
+        self.blocked_expired = 0
+
+    def add(self, event, now=None):
+        """Take one event; return the events to ship now."""
+
+        now = time.time() if now is None else now
+
+        with self.lock:
+            self.events_in += 1
+
+            out = []
+            if self.window_start is None:
+                self.window_start = now
+            elif now - self.window_start >= self.window:
+                out.extend(self.flush())
+                self.window_start = now
+
+            if self.window <= 0:
+                out.append(event)
+            elif self._transition(event, now):
+                # Keep the source's earlier events ahead of its transition
+                out.extend(self.flush(event.get("src_ip")))
+                out.append(event)
+                self.transitions += 1
+            else:
+                self._group(event)
+                return out
+
+            self.events_out += 1
+            return out
+
+    def _transition(self, event, now):
+        src = event.get("src_ip")
+        blocked = self.blocked_sources
+
+        if event.get("action") == "BLOCKED":
+            seen = src in blocked
+            # Re-insert so the dict stays ordered by last BLOCKED time
+            blocked.pop(src, None)
+            blocked[src] = now
+            if len(blocked) > self.max_blocked:
+                del blocked[next(iter(blocked))]
+                self.blocked_expired += 1
+            return not seen
+
+        return False
+
+    def unblocked(self, src_ip):
+        """
+        The enforcer lifted src_ip's block; returns its held events.
+        Its next BLOCKED event is a new transition.
+        """
+
+        with self.lock:
+            if self.blocked_sources.pop(src_ip, None) is None:
+                return []
+            self.transitions += 1
+            return self._flush(src_ip)
+
+    def expire(self, now=None):
+        """Close the window if it has run out; returns its events."""
+
+        now = time.time() if now is None else now
+
+        with self.lock:
+            blocked = self.blocked_sources
+            while blocked:
+                src, last = next(iter(blocked.items()))
+                if now - last < self.blocked_ttl:
+                    break
+                del blocked[src]
+                self.blocked_expired += 1
+
+            if self.window_start is None or now - self.window_start < self.window:
+                return []
+            self.timed_flushes += 1
+            return self.flush()
+
+    # ---------------- TIMER ----------------
+
+    def start(self, emit):
+        """Flush expired windows every `window` seconds through emit(event)."""
+
+        if self.worker is None and self.window > 0:
+            self.stop_event.clear()
+            self.worker = threading.Thread(target=self._run, args=(emit,), daemon=True)
+            self.worker.start()
+
+    def stop(self):
+        if self.worker is not None:
+            self.stop_event.set()
+            self.worker.join()
+            self.worker = None
+
+    def _run(self, emit):
+        while not self.stop_event.wait(self.window):
+            for event in self.expire():
+                emit(event)
+
+    def _group(self, event):
+        key = (event.get("src_ip"), event.get("dst_ip"),
+               event.get("action"), event.get("level"))
+        risk = event.get("risk", 0)
+
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = [event, event, 1, risk, risk, risk]
+            return
+
+        group[1] = event
+        group[2] += 1
+        if risk < group[3]:
+            group[3] = risk
+        if risk > group[4]:
+            group[4] = risk
+        group[5] += risk
+
+    def flush(self, src_ip=None):
+        """Close the current window (or one source's groups); returns its events."""
+
+        with self.lock:
+            return self._flush(src_ip)
+
+    def _flush(self, src_ip):
+        if src_ip is None:
+            groups = list(self.groups.values())
+            self.groups.clear()
+            self.window_start = None
+        else:
+            groups = [
+                self.groups.pop(key)
+                for key in [k for k in self.groups if k[0] == src_ip]
+            ]
+
+        out = []
+        for first, last, count, risk_min, risk_max, risk_sum in groups:
+            if count == 1:
+                out.append(last)
+                continue
+
+            summary = dict(last)
+            summary.update({
+                "risk": round(risk_sum / count, 2),
+                "count": count,
+                "risk_min": risk_min,
+                "risk_max": risk_max,
+                "first_seen": first.get("timestamp"),
+                "last_seen": last.get("timestamp"),
+            })
+            out.append(summary)
+            self.summaries += 1
+
+        self.events_out += len(out)
+        return out
+
+    def collapse_ratio(self):
+        shipped = self.events_out
+        return round(self.events_in / shipped, 3) if shipped else 0.0
+
+    def collect_metrics(self):
+        return [
+            MetricFamily(name, kind, help_text).add((), value)
+            for name, kind, help_text, value in (
+                ("ids_events_in_total", "counter",
+                 "Events produced by the detector", self.events_in),
+                ("ids_events_shipped_total", "counter",
+                 "Events and summaries shipped after aggregation", self.events_out),
+                ("ids_event_transitions_total", "counter",
+                 "Block/unblock transitions forwarded immediately", self.transitions),
+                ("ids_event_summaries_total", "counter",
+                 "Summary events covering more than one event", self.summaries),
+                ("ids_event_timed_flushes_total", "counter",
+                 "Windows closed by the timer rather than a new event",
+                 self.timed_flushes),
+                ("ids_event_blocked_sources", "gauge",
+                 "Blocked sources tracked for unblock transitions",
+                 len(self.blocked_sources)),
+                ("ids_event_blocked_sources_expired_total", "counter",
+                 "Blocked sources forgotten by TTL or the size cap",
+                 self.blocked_expired),
+                ("ids_event_collapse_ratio", "gauge",
+                 "Events produced per event shipped", self.collapse_ratio()),
+            )
+        ]
+
+
+# Shared instance used by realtime_main
+aggregator = EventAggregator()
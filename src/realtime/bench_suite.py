@@ -0,0 +1,532 @@
+"""
+Reproducible end-to-end benchmark suite.
+
+A seeded generator produces the same synthetic packet stream on
+every run (benign conversations, SYN flood, port scan, exfiltration,
+many distinct sources, in a configurable mix). Each stage runs in a
+fresh process so its peak RSS is its own:
+
+    flow_update     features.update_flow per packet
+    detect          detect.predict per completed flow
+    process_event   realtime_main.process_event per packet
+    backend_ingest  backend_state event handler per event
+    end_to_end      all of the above, as live mode chains them
+
+    python -m src.realtime.bench_suite --packets 200000 --out bench.json
+    python -m src.realtime.bench_suite --compare bench.json
+
+Stages whose dependencies are missing (no model file, no FastAPI)
+are reported as skipped with the reason rather than failing the run.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from .benchmark import LatencyHistogram
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+SCENARIOS = ("benign", "syn_flood", "port_scan", "exfiltration", "many_sources")
+
+MIXES = {
+    "default": {"benign": 0.8, "syn_flood": 0.05, "port_scan": 0.05,
+                "exfiltration": 0.05, "many_sources": 0.05},
+    "benign": {"benign": 1.0},
+    "attack": {"benign": 0.2, "syn_flood": 0.3, "port_scan": 0.2,
+               "exfiltration": 0.1, "many_sources": 0.2},
+    "flood": {"benign": 0.5, "syn_flood": 0.5},
+    "sources": {"benign": 0.5, "many_sources": 0.5},
+}
+
+STAGE_NAMES = ("flow_update", "detect", "process_event", "backend_ingest", "end_to_end")
+
+START_TIME = 1_700_000_000.0    # fixed simulated clock, for determinism
+BENIGN_CONVERSATIONS = 2000
+DRAIN_EVERY = 256   # packets between end_to_end backend drains, as the drainer batches
+
+
+# =========================================================
+# SYNTHETIC TRAFFIC
+# =========================================================
+
+class SyntheticPacket:
+    """The attributes update_flow reads from a scapy packet."""
+
+    # `flags` stays unset for UDP, as hasattr() checks expect
+    __slots__ = ("src", "dst", "sport", "dport", "proto", "flags",
+                 "payload", "time", "length", "scenario")
+
+    def __len__(self):
+        return self.length
+
+
+def parse_mix(spec):
+    """'attack' or 'benign=0.7,syn_flood=0.3' -> normalised weights."""
+
+    if spec in MIXES:
+        weights = MIXES[spec]
+    else:
+        weights = {}
+        for part in spec.split(","):
+            name, _, value = part.partition("=")
+            if name not in SCENARIOS:
+                raise ValueError(f"Unknown scenario: {name}")
+            weights[name] = float(value)
+
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Mix weights must be positive")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class TrafficGenerator:
+    """
+    Deterministic packet stream for a given seed, mix and rate.
+
+    Timestamps advance on a simulated clock at `rate` packets per
+    second, so flows age out of update_flow exactly as they would
+    live, without the benchmark having to sleep.
+    """
+
+    def __init__(self, mix="default", seed=1, rate=5000):
+        self.mix = parse_mix(mix) if isinstance(mix, str) else mix
+        self.rng = random.Random(seed)
+        self.rate = rate
+
+        self.cumulative = []
+        acc = 0.0
+        for name, weight in self.mix.items():
+            acc += weight
+            self.cumulative.append((acc, name))
+
+        rng = self.rng
+        self.conversations = [
+            (f"10.1.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+             f"192.168.1.{rng.randrange(1, 21)}",
+             rng.randrange(32768, 61000),
+             rng.choice((80, 443, 22, 8080)))
+            for _ in range(BENIGN_CONVERSATIONS)
+        ]
+        self.scan_port = 0
+        self.next_source = 0
+        self.payloads = {}
+
+    def _packet(self, scenario, src, dst, sport, dport, proto, length, flags, now):
+        packet = SyntheticPacket()
+        packet.src = src
+        packet.dst = dst
+        packet.sport = sport
+        packet.dport = dport
+        packet.proto = proto
+        packet.length = length
+        packet.time = now
+        packet.scenario = scenario
+        if flags is not None:
+            packet.flags = flags
+
+        payload = self.payloads.get(length)
+        if payload is None:
+            payload = self.payloads[length] = bytes(max(0, length - 40))
+        packet.payload = payload
+        return packet
+
+    def _pick(self):
+        r = self.rng.random()
+        for edge, name in self.cumulative:
+            if r < edge:
+                return name
+        return self.cumulative[-1][1]
+
+    def packets(self, count):
+        rng = self.rng
+        step = 1.0 / self.rate
+
+        for i in range(count):
+            now = START_TIME + i * step
+            scenario = self._pick()
+
+            if scenario == "benign":
+                client, server, sport, dport = rng.choice(self.conversations)
+                length = rng.choice((60, 60, 120, 576, 1200, 1500))
+                if rng.random() < 0.6:
+                    yield self._packet(scenario, client, server, sport, dport,
+                                       6, length, "PA", now)
+                else:
+                    yield self._packet(scenario, server, client, dport, sport,
+                                       6, length, "A", now)
+
+            elif scenario == "syn_flood":
+                src = (f"{rng.randrange(1, 224)}.{rng.randrange(256)}."
+                       f"{rng.randrange(256)}.{rng.randrange(1, 255)}")
+                yield self._packet(scenario, src, "192.168.1.10",
+                                   rng.randrange(1024, 65536), 80, 6, 60, "S", now)
+
+            elif scenario == "port_scan":
+                self.scan_port = self.scan_port % 65535 + 1
+                if rng.random() < 0.3:
+                    yield self._packet(scenario, "192.168.1.20", "203.0.113.7",
+                                       self.scan_port, 40000, 6, 60, "RA", now)
+                else:
+                    yield self._packet(scenario, "203.0.113.7", "192.168.1.20",
+                                       40000, self.scan_port, 6, 60, "S", now)
+
+            elif scenario == "exfiltration":
+                yield self._packet(scenario, "10.1.0.66", "198.51.100.9",
+                                   51515, 443, 6, 1400, "PA", now)
+
+            else:   # many_sources: a new source address every packet
+                n = self.next_source
+                self.next_source += 1
+                src = f"10.{64 + (n >> 16) % 64}.{(n >> 8) & 255}.{n & 255}"
+                yield self._packet(scenario, src, "192.168.1.53",
+                                   rng.randrange(1024, 65536), 53, 17, 80, None, now)
+
+
+def packet_risk(packet):
+    """The heuristic risk realtime_main.packet_handler assigns."""
+
+    risk = 40 if packet.proto == 6 else 20
+    if len(packet) > 1000:
+        risk += 60
+    return risk
+
+
+# =========================================================
+# STAGES (each runs in its own process)
+# =========================================================
+
+def _isolate():
+    """Point every on-disk side effect at a scratch directory."""
+
+    scratch = tempfile.mkdtemp(prefix="ids_bench_")
+    os.environ["IDS_SPOOL_DIR"] = os.path.join(scratch, "spool")
+    os.environ["IDS_EVENT_DB"] = os.path.join(scratch, "events.db")
+    # process_event snapshots adaptive state; keep it off the real checkpoint
+    os.environ["IDS_CHECKPOINT"] = os.path.join(scratch, "ids_state.ckpt")
+    os.environ["IDS_SENSOR_ID"] = "bench"
+    # end_to_end drains the spool in-process; the drainer must not
+    # reach a real backend
+    os.environ["IDS_BACKEND_URL"] = "http://127.0.0.1:9"
+    return scratch
+
+
+def _summary(histogram, seconds, **extra):
+    q = histogram.quantiles((0.5, 0.99))
+    result = {
+        "items": histogram.count,
+        "seconds": round(seconds, 3),
+        "throughput_per_sec": round(histogram.count / seconds) if seconds else 0,
+        "p50_us": round(q[0.5] / 1000, 2),
+        "p99_us": round(q[0.99] / 1000, 2),
+        "max_us": round(histogram.max_ns / 1000, 2),
+    }
+    result.update(extra)
+    return result
+
+
+def _timed(items, fn):
+    histogram = LatencyHistogram()
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for item in items:
+        t = clock()
+        fn(item)
+        histogram.record(clock() - t)
+    return histogram, time.perf_counter() - start
+
+
+def _completed_flows(packets, limit):
+    """Feature dicts for up to `limit` flows, closed out at the end."""
+
+    from . import features
+
+    results = []
+    for packet in packets:
+        emitted, src = features.update_flow(packet, now=packet.time)
+        if emitted is not None:
+            results.append((emitted, src))
+
+    end = packets[-1].time if packets else START_TIME
+    for flow_id, flow in list(features.flows.items()):
+        if len(results) >= limit:
+            break
+        results.append((
+            features.compute_features(flow, end - flow["start_time"]),
+            flow_id[0],
+        ))
+        del features.flows[flow_id]
+
+    return results[:limit]
+
+
+def stage_flow_update(packets, config):
+    from . import features
+
+    emitted = 0
+
+    def step(packet):
+        nonlocal emitted
+        if features.update_flow(packet, now=packet.time)[0] is not None:
+            emitted += 1
+
+    histogram, seconds = _timed(packets, step)
+    return _summary(histogram, seconds, flows_emitted=emitted,
+                    flows_open=len(features.flows))
+
+
+def stage_detect(packets, config):
+    flows = _completed_flows(packets, config["flows"])
+    from . import detect
+
+    histogram, seconds = _timed(flows, lambda f: detect.predict(f[0]))
+    return _summary(histogram, seconds)
+
+
+def _prepare_realtime_main():
+    from . import realtime_main
+    from .enforcement import make_backend
+
+    # Never touch the host firewall from a benchmark
+    realtime_main.enforcer.backend = make_backend("dryrun")
+    realtime_main.configure_profile("precision")
+    return realtime_main
+
+
+def stage_process_event(packets, config):
+    realtime_main = _prepare_realtime_main()
+    random.seed(config["seed"])     # calculate_drift() uses the global RNG
+
+    histogram, seconds = _timed(
+        packets,
+        lambda p: realtime_main.process_event(p.src, p.dst, packet_risk(p), live=True),
+    )
+    realtime_main.enforcer.flush()
+
+    return _summary(histogram, seconds, blocked=len(realtime_main.enforcer.blocked),
+                    spooled=realtime_main.spool.appended)
+
+
+def _backend_events(packets):
+    events = []
+    for packet in packets:
+        risk = packet_risk(packet)
+        blocked = packet.scenario != "benign" and risk >= 40
+        events.append({
+            "timestamp": time.strftime("%H:%M:%S", time.localtime(packet.time)),
+            "ts": packet.time,
+            "src_ip": packet.src,
+            "dst_ip": packet.dst,
+            "risk": float(risk),
+            "level": "HIGH" if blocked else "LOW",
+            "mode": "STABLE",
+            "drift": 0.0,
+            "action": "BLOCKED" if blocked else "MONITOR",
+            "alert": blocked,
+            "sample_rate": 1.0,
+            "sensor_id": "bench",
+        })
+    return events
+
+
+def stage_backend_ingest(packets, config):
+    from ..dashboard_backend import backend_state
+
+    events = _backend_events(packets)
+    apply_event = backend_state.HANDLERS["event"]
+
+    histogram, seconds = _timed(events, apply_event)
+    backend_state.event_store.close()
+    return _summary(histogram, seconds)
+
+
+def stage_end_to_end(packets, config):
+    from . import features
+    realtime_main = _prepare_realtime_main()
+    from ..dashboard_backend import backend_state
+
+    random.seed(config["seed"])
+    try:
+        from . import detect
+    except Exception:
+        detect = None   # model or TensorFlow unavailable: heuristic risk only
+
+    spool = realtime_main.spool
+    handlers = backend_state.HANDLERS
+    predicted = 0
+    seen = 0
+
+    def drain():
+        # Backend side: apply spooled records in bulk, as the drainer ships them
+        while True:
+            records = spool.read()
+            if not records:
+                return
+            for kind, payload, _ in records:
+                handlers[kind](payload)
+            spool.commit(records[-1][2], len(records))
+
+    def step(packet):
+        nonlocal predicted, seen
+        emitted, src = features.update_flow(packet, now=packet.time)
+
+        risk = packet_risk(packet)
+        if emitted is not None and detect is not None:
+            risk = detect.predict(emitted)["risk_score"] * 2
+            predicted += 1
+
+        realtime_main.process_event(packet.src, packet.dst, risk, live=True)
+
+        seen += 1
+        if seen % DRAIN_EVERY == 0:
+            drain()
+
+    histogram, seconds = _timed(packets, step)
+    drain()
+    realtime_main.enforcer.flush()
+    backend_state.event_store.close()
+
+    return _summary(histogram, seconds, predicted=predicted,
+                    detect="model" if detect is not None else "skipped",
+                    backend_flows=backend_state.state["total_flows"])
+
+
+STAGES = {
+    "flow_update": stage_flow_update,
+    "detect": stage_detect,
+    "process_event": stage_process_event,
+    "backend_ingest": stage_backend_ingest,
+    "end_to_end": stage_end_to_end,
+}
+
+
+def run_stage(name, config):
+    scratch = _isolate()
+
+    generator = TrafficGenerator(config["mix"], config["seed"], config["rate"])
+    packets = list(generator.packets(config["packets"]))
+
+    try:
+        result = STAGES[name](packets, config)
+    except (ImportError, OSError) as e:
+        # e.g. FastAPI / TensorFlow not installed, or no model file
+        return {"skipped": f"{type(e).__name__}: {e}"}
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if resource is not None:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        result["peak_rss_mb"] = round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1
+        )
+    return result
+
+
+# =========================================================
+# SUITE
+# =========================================================
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(stages, config):
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+
+    for name in stages:
+        # Fresh interpreter per stage: clean module state and peak RSS
+        with ctx.Pool(1) as pool:
+            results[name] = pool.apply(run_stage, (name, config))
+        print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+
+    return {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "stages": results,
+    }
+
+
+def compare(previous, current):
+    """Per-stage throughput / p99 ratios, current over previous."""
+
+    rows = {}
+    for name, result in current["stages"].items():
+        before = previous.get("stages", {}).get(name)
+        if not before or "skipped" in before or "skipped" in result:
+            continue
+        rows[name] = {
+            "throughput_ratio": round(
+                result["throughput_per_sec"] / max(before["throughput_per_sec"], 1), 3
+            ),
+            "p99_ratio": round(result["p99_us"] / max(before["p99_us"], 1e-9), 3),
+        }
+    return {"baseline": previous.get("commit"), "current": current.get("commit"),
+            "stages": rows}
+
+
+# ---------------- ENTRY ----------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--packets", type=int, default=100_000)
+    parser.add_argument("--flows", type=int, default=2000,
+                        help="completed flows scored by the detect stage")
+    parser.add_argument("--mix", default="default",
+                        help=f"one of {sorted(MIXES)} or 'benign=0.7,syn_flood=0.3'")
+    parser.add_argument("--rate", type=int, default=5000,
+                        help="simulated packets per second")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stages", default=",".join(STAGE_NAMES))
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", default=None,
+                        help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    parse_mix(args.mix)     # fail fast on a bad mix
+    stages = args.stages.split(",")
+    for name in stages:
+        if name not in STAGES:
+            parser.error(f"unknown stage: {name}")
+
+    config = {
+        "packets": args.packets,
+        "flows": args.flows,
+        "mix": args.mix,
+        "rate": args.rate,
+        "seed": args.seed,
+    }
+
+    results = run_suite(stages, config)
+
+    if args.compare:
+        with open(args.compare) as f:
+            results["comparison"] = compare(json.load(f), results)
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps(results.get("comparison", results["stages"]), indent=2))
@@ -1,42 +1,237 @@
+import functools
 import time
-import numpy as np
+
+from .metric_types import MetricFamily
+
+# Sub-buckets per power of two: 2**5 = 32 -> ~3% relative error
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_BITS = 48  # ~78 hours in ns, anything above is clamped
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+STAGES = (
+    "parse",
+    "flow_update",
+    "features",
+    "vectorize",
+    "ann",
+    "iforest",
+    "governance",
+    "enforcement",
+    "shipping",
+)
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory HDR-style histogram of nanosecond latencies.
+
+    Values are bucketed by power of two, each split into
+    SUB_BUCKETS linear sub-buckets, so memory is constant and
+    every quantile is within ~3% of the true value.
+    """
+
+    SIZE = (MAX_BITS + 1) * SUB_BUCKETS
+
+    def __init__(self):
+        self.counts = [0] * self.SIZE
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+
+    @staticmethod
+    def bucket(value_ns):
+        if value_ns < SUB_BUCKETS:
+            return value_ns
+        bits = value_ns.bit_length()
+        if bits > MAX_BITS:
+            return LatencyHistogram.SIZE - 1
+        shift = bits - SUB_BUCKET_BITS - 1
+        return (shift + 1) * SUB_BUCKETS + ((value_ns >> shift) & (SUB_BUCKETS - 1))
+
+    @staticmethod
+    def bucket_value(index):
+        """Upper edge of a bucket, in ns."""
+
+        if index < SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        sub = index % SUB_BUCKETS
+        return ((SUB_BUCKETS + sub + 1) << shift) - 1
+
+    def record(self, value_ns):
+        if value_ns < 0:
+            value_ns = 0
+        self.counts[self.bucket(value_ns)] += 1
+        self.count += 1
+        self.total_ns += value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+        if self.min_ns is None or value_ns < self.min_ns:
+            self.min_ns = value_ns
+
+    def quantiles(self, qs=QUANTILES):
+        """Map each quantile to a latency in ns (upper bucket edge)."""
+
+        result = {}
+        if self.count == 0:
+            return {q: 0 for q in qs}
+
+        targets = sorted((max(1, int(q * self.count + 0.5)), q) for q in qs)
+        seen = 0
+        t = 0
+
+        for index, n in enumerate(self.counts):
+            if not n:
+                continue
+            seen += n
+            while t < len(targets) and seen >= targets[t][0]:
+                result[targets[t][1]] = min(self.bucket_value(index), self.max_ns)
+                t += 1
+            if t == len(targets):
+                break
+
+        return result
+
+    def mean_ns(self):
+        return self.total_ns / self.count if self.count else 0
+
+    def reset(self):
+        self.__init__()
+
+
+class StageTimer:
+    """Context manager that records elapsed time into a histogram."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+        return False
 
 
 class PerformanceBenchmark:
     """
     Measures:
-    - Per-packet latency
-    - Average latency
-    - Throughput (packets/sec)
+    - Per-packet latency (histogram, not a list)
+    - Per-stage latency for every pipeline stage
+    - p50 / p90 / p99 / p99.9 and throughput, live or at the end
     """
 
     def __init__(self):
-        self.start_time = time.time()
+        self.start_time = time.perf_counter_ns()
         self.packet_count = 0
-        self.latencies = []
+        self.total = LatencyHistogram()
+        self.stages = {name: LatencyHistogram() for name in STAGES}
+
+    # ---------------- PER PACKET ----------------
 
     def start_timer(self):
-        return time.time()
+        return time.perf_counter_ns()
 
     def stop_timer(self, start):
-        end = time.time()
-        latency = (end - start) * 1000  # ms
-        self.latencies.append(latency)
+        latency_ns = time.perf_counter_ns() - start
+        self.total.record(latency_ns)
         self.packet_count += 1
+        return latency_ns / 1e6  # ms
+
+    # ---------------- PER STAGE ----------------
+
+    def stage(self, name):
+        """`with benchmark.stage("ann"): ...`"""
+
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages[name] = LatencyHistogram()
+        return StageTimer(histogram)
+
+    def timed(self, name):
+        """Decorator form of stage()."""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ---------------- REPORTING ----------------
+
+    def throughput(self):
+        elapsed = (time.perf_counter_ns() - self.start_time) / 1e9
+        return self.packet_count / elapsed if elapsed > 0 else 0
+
+    def summary(self):
+        rows = {"total": self.total}
+        rows.update(self.stages)
+
+        result = {}
+        for name, histogram in rows.items():
+            if histogram.count == 0:
+                continue
+            q = histogram.quantiles()
+            result[name] = {
+                "count": histogram.count,
+                "mean_ms": histogram.mean_ns() / 1e6,
+                "p50_ms": q[0.5] / 1e6,
+                "p90_ms": q[0.9] / 1e6,
+                "p99_ms": q[0.99] / 1e6,
+                "p999_ms": q[0.999] / 1e6,
+                "max_ms": histogram.max_ns / 1e6,
+            }
+        return result
+
+    def collect_metrics(self):
+        processed = MetricFamily(
+            "ids_packets_processed_total", "counter",
+            "Packets timed end to end by the pipeline benchmark"
+        ).add((), self.packet_count)
+
+        latency = MetricFamily(
+            "ids_stage_latency_seconds", "summary",
+            "Pipeline stage latency from fixed-memory histograms", ("stage",)
+        )
+
+        rows = {"total": self.total}
+        rows.update(self.stages)
+
+        for name, histogram in rows.items():
+            if histogram.count == 0:
+                continue
+            for q, value in histogram.quantiles().items():
+                latency.add((name,), value / 1e9, extra=(("quantile", str(q)),))
+            latency.add((name,), histogram.total_ns / 1e9, "_sum")
+            latency.add((name,), histogram.count, "_count")
+
+        return [processed, latency]
 
     def report(self):
         if self.packet_count == 0:
             return
 
-        total_time = time.time() - self.start_time
-        avg_latency = np.mean(self.latencies)
-        min_latency = np.min(self.latencies)
-        max_latency = np.max(self.latencies)
-        throughput = self.packet_count / total_time
-
         print("\n📊 PERFORMANCE REPORT")
         print(f"Packets processed : {self.packet_count}")
-        print(f"Average latency   : {avg_latency:.3f} ms")
-        print(f"Min latency       : {min_latency:.3f} ms")
-        print(f"Max latency       : {max_latency:.3f} ms")
-        print(f"Throughput        : {throughput:.2f} packets/sec\n")
+        print(f"Throughput        : {self.throughput():.2f} packets/sec")
+        print(f"{'stage':<12} {'count':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'p99.9':>9} {'max':>9}  (ms)")
+
+        for name, row in self.summary().items():
+            print(
+                f"{name:<12} {row['count']:>8} {row['p50_ms']:>9.3f} "
+                f"{row['p90_ms']:>9.3f} {row['p99_ms']:>9.3f} "
+                f"{row['p999_ms']:>9.3f} {row['max_ms']:>9.3f}"
+            )
+        print()
+
+
+# Shared instance for the live pipeline, exported by MetricsRegistry
+pipeline_benchmark = PerformanceBenchmark()
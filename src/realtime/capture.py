@@ -1,13 +1,105 @@
-from scapy.all import sniff
-from .features import update_flow
+import os
+import sys
+import time
+from .features import update_flow, update_flow_fields, get_flow_id
+from .prefilter import prefilter, sniff_prefiltered
+from .load_shedder import overload
+from .benchmark import pipeline_benchmark as benchmark
+from . import afpacket
+
+# "auto" uses the AF_PACKET ring on Linux when the socket can be opened
+CAPTURE_BACKEND = os.environ.get("IDS_CAPTURE_BACKEND", "auto")
+CAPTURE_IFACE = os.environ.get("IDS_CAPTURE_IFACE") or None
+
 
 def packet_handler(packet, callback):
-    result, src_ip = update_flow(packet)
+    if prefilter.drop(packet):
+        return
+
+    if not overload.admit(get_flow_id(packet)):
+        return
+
+    start = benchmark.start_timer()
+
+    with benchmark.stage("flow_update"):
+        result, src_ip = update_flow(packet)
 
     if result is not None:
         callback(result, src_ip=src_ip)
 
+    latency = benchmark.stop_timer(start)
+    overload.observe(latency, lag=time.time() - float(packet.time))
+
+
+def frame_handler(callback):
+    """packet_handler for headers parsed out of the AF_PACKET ring."""
+
+    def handle(src, dst, sport, dport, proto, wire_len, header_len, payload_len,
+               tcp_flags, window, ts):
+        flow_id = (src, dst, sport, dport, proto)
+
+        if prefilter.drop_fields(flow_id):
+            return
+
+        if not overload.admit(flow_id):
+            return
+
+        start = benchmark.start_timer()
 
-def capture_packets(callback):
+        with benchmark.stage("flow_update"):
+            result, src_ip = update_flow_fields(
+                flow_id, wire_len, header_len, tcp_flags, ts, payload_len, window
+            )
+
+        if result is not None:
+            callback(result, src_ip=src_ip)
+
+        latency = benchmark.stop_timer(start)
+        overload.observe(latency, lag=time.time() - ts)
+
+    return handle
+
+
+def capture_ring(callback, iface=CAPTURE_IFACE):
+    ring = afpacket.ring
+    ring.iface = iface
+
+    bpf = prefilter.bpf_filter()
+    try:
+        ring.open(bpf)
+    except ImportError:
+        # No libpcap compiler for the expression: match every rule in Python
+        prefilter.disable_bpf()
+        ring.open()
+    except (afpacket.FilterError, OSError) as e:
+        # libpcap could not compile it, or the kernel refused the program
+        if bpf is None:
+            raise
+        print("BPF prefilter rejected, using Python fallback:", e)
+        prefilter.disable_bpf()
+        ring.open()
+
+    try:
+        ring.run(frame_handler(callback))
+    finally:
+        ring.close()
+        print(
+            f"[CAPTURE] {ring.frames} frames, kernel drops "
+            f"{ring.kernel_drops} of {ring.kernel_packets}"
+        )
+
+
+def capture_packets(callback, backend=CAPTURE_BACKEND, iface=CAPTURE_IFACE):
     print("Starting packet capture...")
-    sniff(prn=lambda pkt: packet_handler(pkt, callback), store=False)
+
+    if backend in ("auto", "afpacket") and sys.platform.startswith("linux") \
+            and afpacket.available():
+        try:
+            capture_ring(callback, iface)
+            return
+        except PermissionError as e:
+            if backend == "afpacket":
+                raise
+            print("AF_PACKET ring unavailable, using scapy:", e)
+
+    sniff_prefiltered(lambda pkt: packet_handler(pkt, callback))
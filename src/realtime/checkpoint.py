@@ -0,0 +1,262 @@
+import os
+import pickle
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from .metric_types import MetricFamily
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CHECKPOINT_PATH = os.environ.get(
+    "IDS_CHECKPOINT",
+    os.path.join(PROJECT_ROOT, "data", "ids_state.ckpt")
+)
+
+CHECKPOINT_INTERVAL = 60    # seconds between snapshots
+
+MAGIC = b"IDSC"
+FORMAT_VERSION = 1
+
+# magic, format version, section count, created (unix time)
+HEADER = struct.Struct("<4sHHd")
+# name length, payload length, crc32 of payload
+SECTION = struct.Struct("<HII")
+
+
+class Checkpointer:
+    """
+    Periodic snapshots of adaptive state, for warm restarts.
+
+    Components register a named section with a `dump` callable that
+    returns a cheap copy of their state, and a `load` callable that
+    applies one. maybe_snapshot() runs on the detection thread and
+    only takes those copies; pickling, compression and the write
+    (temp file, fsync, atomic rename) happen on a background thread.
+
+    restore() reads the file once. Sections are applied as soon as
+    their component registers, so modules loaded after startup
+    (e.g. detect with its IsolationForest) still get their state.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+
+        self.sections = {}      # name -> (dump, load)
+        self.pending = {}       # restored sections not yet registered
+        self.lock = threading.Lock()
+
+        self.queue = queue.Queue(maxsize=1)
+        self.worker = None
+        self.last_snapshot = None
+
+        self.snapshots = 0
+        self.skipped = 0
+        self.errors = 0
+        self.snapshot_bytes = 0
+        self.write_seconds = 0.0
+        self.restore_seconds = 0.0
+        self.restored_bytes = 0
+
+    # ---------------- REGISTRATION ----------------
+
+    def register(self, name, dump, load):
+        with self.lock:
+            self.sections[name] = (dump, load)
+            state = self.pending.pop(name, None)
+        if state is not None:
+            self._apply(name, load, state)
+
+    def _apply(self, name, load, state):
+        try:
+            load(state)
+        except Exception as e:
+            self.errors += 1
+            print(f"[CHECKPOINT] Could not restore {name}: {e}")
+
+    # ---------------- SNAPSHOT ----------------
+
+    def maybe_snapshot(self, now=None):
+        now = time.time() if now is None else now
+        if self.last_snapshot is None:
+            self.last_snapshot = now
+            return False
+        if now - self.last_snapshot < self.interval:
+            return False
+        self.last_snapshot = now
+        return self.snapshot()
+
+    def snapshot(self, wait=False):
+        """
+        Copy every section now; serialise and write in the background.
+        wait=True blocks until this snapshot is on disk.
+        """
+
+        with self.lock:
+            sections = list(self.sections.items())
+
+        states = {}
+        for name, (dump, _) in sections:
+            try:
+                states[name] = dump()
+            except Exception as e:
+                self.errors += 1
+                print(f"[CHECKPOINT] Could not snapshot {name}: {e}")
+
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+
+        if wait:
+            # Through the worker too, so this write lands after any queued
+            # older snapshot and never races it on the .tmp file
+            self.queue.put(states)
+            self.queue.join()
+            return True
+
+        try:
+            self.queue.put_nowait(states)
+        except queue.Full:
+            # Previous snapshot still being written; the next one will do
+            self.skipped += 1
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            states = self.queue.get()
+            try:
+                self._write(states)
+            except Exception as e:
+                self.errors += 1
+                print(f"[CHECKPOINT] Snapshot failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _write(self, states):
+        start = time.perf_counter()
+
+        parts = [HEADER.pack(MAGIC, FORMAT_VERSION, len(states), time.time())]
+        for name, state in states.items():
+            raw_name = name.encode()
+            payload = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+            parts.append(SECTION.pack(len(raw_name), len(payload), zlib.crc32(payload)))
+            parts.append(raw_name)
+            parts.append(payload)
+        data = b"".join(parts)
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+
+        # State includes trust scores and blocked IPs: owner-only
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+        self.snapshots += 1
+        self.snapshot_bytes = len(data)
+        self.write_seconds = time.perf_counter() - start
+
+    # ---------------- RESTORE ----------------
+
+    def read(self, path=None):
+        """Parse a snapshot file into {section: state}."""
+
+        with open(path or self.path, "rb") as f:
+            data = f.read()
+
+        if len(data) < HEADER.size:
+            raise ValueError("truncated checkpoint")
+        magic, version, count, created = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not an IDS checkpoint")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"unsupported checkpoint version {version}")
+
+        offset = HEADER.size
+        states = {}
+        for _ in range(count):
+            name_len, payload_len, crc = SECTION.unpack_from(data, offset)
+            offset += SECTION.size
+            name = data[offset:offset + name_len].decode()
+            offset += name_len
+            payload = data[offset:offset + payload_len]
+            offset += payload_len
+
+            if len(payload) != payload_len or zlib.crc32(payload) != crc:
+                raise ValueError(f"corrupt checkpoint section {name!r}")
+            states[name] = pickle.loads(zlib.decompress(payload))
+
+        return states, created, len(data)
+
+    def restore(self):
+        """Load the last snapshot, if any. Returns True on a warm start."""
+
+        if not os.path.exists(self.path):
+            print("[CHECKPOINT] No snapshot, cold start")
+            return False
+
+        start = time.perf_counter()
+        try:
+            states, created, size = self.read()
+        except (OSError, ValueError, pickle.UnpicklingError, zlib.error) as e:
+            self.errors += 1
+            print(f"[CHECKPOINT] Ignoring unreadable snapshot: {e}")
+            return False
+
+        with self.lock:
+            ready = []
+            for name, state in states.items():
+                if name in self.sections:
+                    ready.append((name, self.sections[name][1], state))
+                else:
+                    self.pending[name] = state
+
+        for name, load, state in ready:
+            self._apply(name, load, state)
+
+        self.restore_seconds = time.perf_counter() - start
+        self.restored_bytes = size
+
+        print(
+            f"[CHECKPOINT] Restored {len(states)} sections "
+            f"({size / 1024:.1f} KB, {time.time() - created:.0f}s old) "
+            f"in {self.restore_seconds * 1000:.1f} ms"
+        )
+        return True
+
+    def collect_metrics(self):
+        return [
+            MetricFamily(name, kind, help_text).add((), value)
+            for name, kind, help_text, value in (
+                ("ids_checkpoint_snapshots_total", "counter",
+                 "State snapshots written", self.snapshots),
+                ("ids_checkpoint_skipped_total", "counter",
+                 "Snapshots skipped while a write was in progress", self.skipped),
+                ("ids_checkpoint_errors_total", "counter",
+                 "Snapshot or restore failures", self.errors),
+                ("ids_checkpoint_bytes", "gauge",
+                 "Size of the last snapshot written", self.snapshot_bytes),
+                ("ids_checkpoint_write_seconds", "gauge",
+                 "Time to serialise and write the last snapshot", self.write_seconds),
+                ("ids_checkpoint_restore_seconds", "gauge",
+                 "Time taken by the startup restore", self.restore_seconds),
+            )
+        ]
+
+
+# Shared instance; components register their sections on import
+checkpointer = Checkpointer()
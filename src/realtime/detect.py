@@ -3,6 +3,9 @@ import os
 from tensorflow.keras.models import load_model
 from sklearn.ensemble import IsolationForest
 from .drift_controller import DriftController
+from .load_shedder import overload
+from .benchmark import pipeline_benchmark as benchmark
+from .checkpoint import checkpointer
 
 EXPECTED_FEATURES = 77
 
@@ -11,22 +14,48 @@ MODEL_PATH = os.path.join(BASE, "models", "ids_model.h5")
 
 ann_model = load_model(MODEL_PATH)
 
-iforest = IsolationForest(
-    n_estimators=100,
-    contamination=0.05,
-    random_state=42
-)
+def new_iforest():
+    return IsolationForest(
+        n_estimators=100,
+        contamination=0.05,
+        random_state=42
+    )
+
 
+iforest = new_iforest()
 iforest_fitted = False
 drift_controller = DriftController()
 
 
 def fit_iforest(X_normal):
-    global iforest_fitted
-    iforest.fit(X_normal)
+    # Fit a fresh forest and swap it in, so a checkpoint holding the
+    # previous one never sees it change under it
+    global iforest, iforest_fitted
+    forest = new_iforest()
+    forest.fit(X_normal)
+    iforest = forest
     iforest_fitted = True
 
 
+def get_state():
+    # fit_iforest swaps in a new forest rather than refitting this one
+    return {
+        "iforest": iforest if iforest_fitted else None,
+        "drift_score": drift_controller.drift_score,
+    }
+
+
+def load_state(state):
+    global iforest, iforest_fitted
+    if state["iforest"] is not None:
+        iforest = state["iforest"]
+        iforest_fitted = True
+    drift_controller.update(state["drift_score"])
+
+
+checkpointer.register("detector", get_state, load_state)
+
+
 def build_feature_vector(features_dict):
     feature_vector = np.array(
         list(features_dict.values()),
@@ -46,17 +75,69 @@ def build_feature_vector(features_dict):
     return feature_vector.reshape(1, -1)
 
 
+def build_feature_matrix(rows):
+    """2-D batch counterpart of build_feature_vector."""
+
+    X = np.asarray(rows, dtype=np.float32)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+
+    # Flow datasets carry inf / NaN rates for zero-length flows
+    X = np.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0)
+
+    if X.shape[1] < EXPECTED_FEATURES:
+        X = np.pad(X, ((0, 0), (0, EXPECTED_FEATURES - X.shape[1])), mode='constant')
+
+    if X.shape[1] > EXPECTED_FEATURES:
+        X = X[:, :EXPECTED_FEATURES]
+
+    return X
+
+
+def predict_batch(rows, drift_score=0.0, batch_size=4096):
+    """
+    Risk scores (0-100, as predict's risk_score) for a whole batch
+    of feature rows, with one ANN and one IsolationForest call.
+    """
+
+    drift_controller.update(drift_score)
+    X = build_feature_matrix(rows)
+
+    ann_prob = ann_model.predict(X, batch_size=batch_size, verbose=0).reshape(-1)
+    ann_prob = np.clip(ann_prob, 0.0, 1.0)
+
+    if iforest_fitted:
+        iso_norm = np.clip((iforest.decision_function(X) + 1) / 2, 0.0, 1.0)
+    else:
+        iso_norm = 0.5
+
+    w_ann, w_anom = drift_controller.get_weights()
+
+    hybrid_score = np.clip(w_ann * ann_prob + w_anom * (1 - iso_norm), 0.0, 1.0)
+
+    return np.round(hybrid_score * 100, 2)
+
+
 def predict(features_dict, drift_score=0.0):
 
     drift_controller.update(drift_score)
 
-    x = build_feature_vector(features_dict)
+    with benchmark.stage("vectorize"):
+        x = build_feature_vector(features_dict)
 
-    ann_prob = float(ann_model.predict(x, verbose=0)[0][0])
-    ann_prob = max(0.0, min(1.0, ann_prob))
+    # Under overload the ANN is skipped for flows cheap rules call low risk
+    ann_skipped = overload.skip_ann(features_dict)
+
+    if ann_skipped:
+        ann_prob = 0.0
+    else:
+        with benchmark.stage("ann"):
+            ann_prob = float(ann_model.predict(x, verbose=0)[0][0])
+        ann_prob = max(0.0, min(1.0, ann_prob))
 
     if iforest_fitted:
-        iso_raw = float(iforest.decision_function(x)[0])
+        with benchmark.stage("iforest"):
+            iso_raw = float(iforest.decision_function(x)[0])
         iso_norm = (iso_raw + 1) / 2
         iso_norm = max(0.0, min(1.0, iso_norm))
     else:
@@ -85,5 +166,7 @@ def predict(features_dict, drift_score=0.0):
         "risk_level": risk_level,
         "confidence": confidence,
         "prediction": 1 if risk_level != "LOW" else 0,
-        "mode": drift_controller.mode
+        "mode": drift_controller.mode,
+        "ann_skipped": ann_skipped,
+        "sample_rate": overload.sample_rate
     }
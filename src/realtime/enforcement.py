@@ -0,0 +1,510 @@
+import heapq
+import ipaddress
+import platform
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from .ip_lists import ip_policy
+
+BLOCK_DURATION = 300  # seconds (5 minutes)
+
+BATCH_SIZE = 512        # max rule changes per backend call
+BATCH_WAIT = 0.05       # seconds to wait for more changes before flushing
+
+RETRY_BASE = 1.0        # seconds before a failed change is retried, doubling
+RETRY_MAX = 30.0
+MAX_ADD_ATTEMPTS = 5    # an add that still fails is rolled back out of `blocked`
+
+SET_NAME = "ids_blocked"
+
+
+# =========================================================
+# FIREWALL BACKENDS
+# =========================================================
+
+class ApplyError(Exception):
+    """Some changes of a batch failed; the rest were applied."""
+
+    def __init__(self, adds, removes, cause):
+        super().__init__(f"{len(adds) + len(removes)} rule changes failed: {cause}")
+        self.adds = adds
+        self.removes = removes
+
+
+class FirewallBackend:
+    """
+    Turns batches of block/unblock requests into firewall commands.
+
+    With dry_run=True commands are recorded in `self.commands`
+    instead of being executed, so the enforcement path can be
+    exercised without root. Rule checks in a dry run answer from the
+    rules that run inserted, so setup() behaves as it would for real.
+    """
+
+    name = "base"
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.commands = []
+        self.dry_rules = set()
+        self.ready = False
+
+    def run(self, argv, stdin=None):
+        self.commands.append((argv, stdin))
+        if self.dry_run:
+            return
+        subprocess.run(
+            argv,
+            input=stdin,
+            text=True,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+
+    def rule_present(self, argv, rule):
+        """Run a check command (exit status 0 = present)."""
+
+        self.commands.append((argv, None))
+        if self.dry_run:
+            return rule in self.dry_rules
+        result = subprocess.run(
+            argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return result.returncode == 0
+
+    def setup(self):
+        self.ready = True
+
+    def apply(self, adds, removes):
+        raise NotImplementedError
+
+
+class NetshBackend(FirewallBackend):
+    """Windows Firewall: one named rule per IP (netsh has no sets)."""
+
+    name = "netsh"
+
+    def apply(self, adds, removes):
+        # One command per IP: a failure is recorded and the rest of the
+        # batch still goes through
+        failed_adds, failed_removes, cause = [], [], None
+
+        for ip in adds:
+            try:
+                self.run([
+                    "netsh", "advfirewall", "firewall", "add", "rule",
+                    f"name=IDS_BLOCK_{ip}", "dir=in", "action=block",
+                    f"remoteip={ip}"
+                ])
+            except (subprocess.CalledProcessError, OSError) as e:
+                failed_adds.append(ip)
+                cause = e
+
+        for ip in removes:
+            try:
+                self.run([
+                    "netsh", "advfirewall", "firewall", "delete", "rule",
+                    f"name=IDS_BLOCK_{ip}"
+                ])
+            except (subprocess.CalledProcessError, OSError) as e:
+                # A rule that is already gone is what we wanted
+                if self.rule_present([
+                    "netsh", "advfirewall", "firewall", "show", "rule",
+                    f"name=IDS_BLOCK_{ip}"
+                ], ip):
+                    failed_removes.append(ip)
+                    cause = e
+
+        if failed_adds or failed_removes:
+            raise ApplyError(failed_adds, failed_removes, cause)
+
+
+class IpsetBackend(FirewallBackend):
+    """
+    Linux ipset: a single iptables rule per address family matches
+    the set, and each batch is one `ipset restore` call.
+    """
+
+    name = "ipset"
+
+    def setup(self):
+        for family, set_name, tool in (
+            ("inet", SET_NAME, "iptables"),
+            ("inet6", SET_NAME + "6", "ip6tables"),
+        ):
+            self.run([
+                "ipset", "create", set_name, "hash:net",
+                "family", family, "-exist"
+            ])
+            rule = ["INPUT", "-m", "set", "--match-set", set_name,
+                    "src", "-j", "DROP"]
+            key = (tool,) + tuple(rule)
+            if self.rule_present([tool, "-C"] + rule, key):
+                print(f"[ENFORCE] {tool} rule for {set_name} already present")
+                continue
+            self.run([tool, "-I"] + rule)
+            if self.dry_run:
+                self.dry_rules.add(key)
+        self.ready = True
+
+    def apply(self, adds, removes):
+        lines = []
+        for op, ips in (("add", adds), ("del", removes)):
+            for ip in ips:
+                set_name = SET_NAME + ("6" if _is_v6(ip) else "")
+                lines.append(f"{op} {set_name} {ip}")
+        if lines:
+            self.run(["ipset", "restore", "-exist"], "\n".join(lines) + "\n")
+
+
+class NftBackend(FirewallBackend):
+    """
+    Linux nftables: named interval sets, each batch one `nft -f -`
+    transaction for adds and one for deletes.
+    """
+
+    name = "nft"
+
+    def setup(self):
+        # `add` is a no-op for objects that exist, so the sets keep their
+        # elements; the chain is flushed and refilled in the same
+        # transaction, so re-running setup never duplicates its rules
+        script = (
+            "add table inet ids\n"
+            "add set inet ids blocked_v4 { type ipv4_addr; flags interval; }\n"
+            "add set inet ids blocked_v6 { type ipv6_addr; flags interval; }\n"
+            "add chain inet ids input { type filter hook input priority -10; }\n"
+            "flush chain inet ids input\n"
+            "add rule inet ids input ip saddr @blocked_v4 drop\n"
+            "add rule inet ids input ip6 saddr @blocked_v6 drop\n"
+        )
+        self.run(["nft", "-f", "-"], script)
+        self.ready = True
+
+    def apply(self, adds, removes):
+        # Adds and deletes are separate transactions: deleting an
+        # element that is not in the set (expired, removed by hand)
+        # fails its whole transaction and must not take adds with it
+        failed_adds, failed_removes, cause = [], [], None
+
+        if adds:
+            try:
+                self.run(["nft", "-f", "-"], self._script("add", adds))
+            except (subprocess.CalledProcessError, OSError) as e:
+                failed_adds, cause = list(adds), e
+
+        if removes:
+            try:
+                self.run(["nft", "-f", "-"], self._script("delete", removes))
+            except (subprocess.CalledProcessError, OSError):
+                # Find the element at fault one by one; one already
+                # missing from its set counts as removed
+                for ip in removes:
+                    set_name = self._set(ip)
+                    try:
+                        self.run(["nft", "delete", "element", "inet", "ids",
+                                  set_name, f"{{ {ip} }}"])
+                    except (subprocess.CalledProcessError, OSError) as e:
+                        if self.rule_present(["nft", "get", "element", "inet", "ids",
+                                              set_name, f"{{ {ip} }}"], ip):
+                            failed_removes.append(ip)
+                            cause = e
+
+        if failed_adds or failed_removes:
+            raise ApplyError(failed_adds, failed_removes, cause)
+
+    @staticmethod
+    def _set(ip):
+        return "blocked_v6" if _is_v6(ip) else "blocked_v4"
+
+    def _script(self, op, ips):
+        lines = []
+        for set_name in ("blocked_v4", "blocked_v6"):
+            members = [ip for ip in ips if self._set(ip) == set_name]
+            if members:
+                lines.append(
+                    f"{op} element inet ids {set_name} {{ {', '.join(members)} }}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+BACKENDS = {
+    "netsh": NetshBackend,
+    "ipset": IpsetBackend,
+    "nft": NftBackend,
+}
+
+
+def make_backend(name=None, dry_run=False):
+    """
+    Pick a firewall backend.
+
+    name=None selects one for the current OS; name="dryrun"
+    returns the platform default with dry_run enabled.
+    """
+
+    if name == "dryrun":
+        name, dry_run = None, True
+
+    if name is None:
+        if platform.system() == "Windows":
+            name = "netsh"
+        elif shutil.which("ipset"):
+            name = "ipset"
+        else:
+            name = "nft"
+
+    return BACKENDS[name](dry_run=dry_run)
+
+
+def _is_v6(ip):
+    return ":" in ip
+
+
+# =========================================================
+# ENFORCER
+# =========================================================
+
+class Enforcer:
+    """
+    Owns blocked-IP state and applies rule changes off the
+    detection thread.
+
+    - block()/unblock() only touch in-memory state and enqueue
+    - a worker thread drains the queue in batches into the backend
+    - expiries live in a min-heap, so unblock_expired() is
+      O(log n) per expired IP instead of a scan of all blocks
+    - IPs inside an allow-listed range of `policy` are never blocked
+    - changes the backend fails are retried with capped exponential
+      backoff; an add that still fails after MAX_ADD_ATTEMPTS is
+      rolled back out of `blocked`, so the map never claims a block
+      the firewall does not have (removes retry until they land)
+
+    With background=False no worker is started and changes are only
+    applied by flush(), for tests and benchmarks.
+    """
+
+    def __init__(self, backend=None, block_duration=BLOCK_DURATION,
+                 policy=None, background=True):
+        self.backend = backend or make_backend()
+        self.block_duration = block_duration
+        self.policy = policy
+        self.background = background
+
+        self.blocked = {}       # ip -> expiry time
+        self.expiry_heap = []   # (expiry, ip), stale entries skipped lazily
+
+        self.queue = queue.Queue()
+        self.worker = None
+
+        self.retry = {}         # ip -> (op, attempts) awaiting retry
+        self.retry_at = 0.0     # time.monotonic() when they are due
+
+        self.applied = 0
+        self.errors = 0
+        self.retried = 0
+        self.rolled_back = 0
+
+    # ---------------- STATE ----------------
+
+    def is_blocked(self, ip):
+        return ip in self.blocked
+
+    def block(self, ip, duration=None, now=None):
+        if ip in self.blocked:
+            return False
+
+        if self.policy is not None and self.policy.is_allowed(ip):
+            return False
+
+        try:
+            ipaddress.ip_address(ip)
+        except ValueError:
+            print(f"[FIREWALL] Refusing invalid IP {ip!r}")
+            return False
+
+        now = time.time() if now is None else now
+        expiry = now + (duration or self.block_duration)
+
+        self.blocked[ip] = expiry
+        heapq.heappush(self.expiry_heap, (expiry, ip))
+        self._submit("add", ip)
+
+        print(f"[FIREWALL] Blocked {ip}")
+        return True
+
+    def unblock(self, ip):
+        if self.blocked.pop(ip, None) is None:
+            return False
+
+        self._submit("del", ip)
+
+        print(f"[FIREWALL] Unblocked {ip}")
+        return True
+
+    def unblock_expired(self, now=None):
+        now = time.time() if now is None else now
+        heap = self.expiry_heap
+        expired = []
+
+        while heap and heap[0][0] <= now:
+            expiry, ip = heapq.heappop(heap)
+            # Skip entries left behind by a manual unblock or re-block
+            if self.blocked.get(ip) == expiry:
+                expired.append(ip)
+
+        for ip in expired:
+            self.unblock(ip)
+
+        return expired
+
+    # ---------------- CHECKPOINT ----------------
+
+    def get_state(self):
+        return dict(self.blocked)
+
+    def load_state(self, state, now=None):
+        # Re-apply unexpired blocks for their remaining time; the
+        # firewall rules may not have survived the restart
+        now = time.time() if now is None else now
+        restored = 0
+        for ip, expiry in state.items():
+            if expiry > now and self.block(ip, duration=expiry - now, now=now):
+                restored += 1
+        return restored
+
+    # ---------------- WORKER ----------------
+
+    def start(self):
+        if self.worker is not None:
+            return
+
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def stop(self, timeout=5):
+        if self.worker is None:
+            return
+
+        self.queue.put(None)
+        self.worker.join(timeout)
+        self.worker = None
+
+    def flush(self):
+        """Apply everything queued so far, and pending retries, on the calling thread."""
+
+        batch = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        self._apply(batch, retry_now=True)
+
+    def _submit(self, op, ip):
+        self.queue.put((op, ip))
+
+        if self.worker is None and self.background:
+            self.start()
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self.retry:
+                timeout = max(0.0, self.retry_at - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                # Only retries are due
+                self._apply([])
+                continue
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + BATCH_WAIT
+
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._apply(batch)
+                    return
+                batch.append(item)
+
+            self._apply(batch)
+
+    def _apply(self, batch, retry_now=False):
+        retries = {}
+        if self.retry and (retry_now or time.monotonic() >= self.retry_at):
+            retries, self.retry = self.retry, {}
+
+        if not batch and not retries:
+            return
+
+        # Collapse repeated changes per IP: an add followed by a del
+        # (or the reverse) leaves the firewall as it was. Retried
+        # changes come first, so newer ones override them.
+        ops = {}
+        for op, ip in [(op, ip) for ip, (op, _) in retries.items()] + batch:
+            if ip in ops:
+                ops[ip][1] = op
+            else:
+                ops[ip] = [op, op]
+
+        adds = [ip for ip, (first, last) in ops.items()
+                if first == last == "add"]
+        removes = [ip for ip, (first, last) in ops.items()
+                   if first == last == "del"]
+
+        failed_adds, failed_removes = [], []
+        try:
+            if not self.backend.ready:
+                self.backend.setup()
+            self.backend.apply(adds, removes)
+        except ApplyError as e:
+            self.errors += 1
+            failed_adds, failed_removes = e.adds, e.removes
+            print("Blocking error:", e)
+        except Exception as e:
+            self.errors += 1
+            failed_adds, failed_removes = adds, removes
+            print("Blocking error:", e)
+
+        self.applied += len(adds) + len(removes) - len(failed_adds) - len(failed_removes)
+        if failed_adds or failed_removes:
+            self._schedule_retry(failed_adds, failed_removes, retries)
+
+    def _schedule_retry(self, adds, removes, previous):
+        most = 0
+        for op, ips in (("add", adds), ("del", removes)):
+            for ip in ips:
+                attempts = previous.get(ip, (op, 0))[1] + 1
+                if op == "add" and attempts >= MAX_ADD_ATTEMPTS:
+                    # The firewall never took it: stop claiming the block
+                    if self.blocked.pop(ip, None) is not None:
+                        self.rolled_back += 1
+                        print(f"[FIREWALL] Giving up on blocking {ip}")
+                    continue
+                self.retry[ip] = (op, attempts)
+                self.retried += 1
+                most = max(most, attempts)
+
+        if most:
+            backoff = min(RETRY_MAX, RETRY_BASE * 2 ** (most - 1))
+            self.retry_at = time.monotonic() + backoff
+
+
+# Shared instance used by realtime_main and mitigation
+enforcer = Enforcer(policy=ip_policy)
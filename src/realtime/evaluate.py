@@ -0,0 +1,344 @@
+"""
+Labelled evaluation of the detector over every dataset under data/.
+
+Each CSV / Parquet file is scored in its own worker process, in
+chunks, with detect.predict_batch, keeping the label column that
+replay_loader drops. The 77 model inputs are picked by column name
+(features.MODEL_COLUMNS); files without all of them are skipped with
+the reason. Workers return only mergeable counts:
+
+- score histograms for attack and benign rows, one bin per 0.01 of
+  risk (scores are rounded to 2 decimals), which give exact
+  confusion matrices at any threshold and an exact ROC-AUC
+- the same histogram and a score sum per label, for per-attack rates
+
+    python -m src.realtime.evaluate --workers 4 --out evaluation.json
+    python -m src.realtime.evaluate --data /datasets/CICIDS2017 --thresholds 40,55,70
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .features import FEATURE_NAMES, MODEL_COLUMNS
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DATA_PATH = os.path.join(PROJECT_ROOT, "data")
+
+CHUNK_ROWS = 100_000
+SCORE_BINS = 10001          # risk 0.00 .. 100.00
+DEFAULT_THRESHOLDS = (40.0, 70.0)   # detect's MEDIUM / HIGH cut-offs
+
+BENIGN_LABEL = "BENIGN"
+
+
+def find_datasets(path=DATA_PATH):
+    files = []
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            if name.lower().endswith((".csv", ".parquet")):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunk_rows, low_memory=False)
+        return
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        df = pd.read_parquet(path)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def label_column(columns):
+    for col in columns:
+        if "label" in col.lower():
+            return col
+    return None
+
+
+def model_columns(columns):
+    """
+    (names, None) for the 77 model inputs in this file's headers, in
+    model order, or (None, reason). Matches the CICIDS2017 names or
+    CICFlowMeter's short ones; anything else is not guessed at.
+    """
+
+    present = set(columns)
+    best = None
+    for names in (MODEL_COLUMNS, FEATURE_NAMES):
+        missing = [name for name in names if name not in present]
+        if not missing:
+            return list(names), None
+        if best is None or len(missing) < len(best):
+            best = missing
+
+    return None, (f"{len(best)} of {len(MODEL_COLUMNS)} model columns missing "
+                  f"(e.g. {', '.join(best[:3])})")
+
+
+# =========================================================
+# WORKER
+# =========================================================
+
+_detect = None
+
+
+def _init_worker():
+    # One model load per worker process, not per file
+    global _detect
+    from . import detect
+    _detect = detect
+
+
+def evaluate_file(path, drift_score=0.0, chunk_rows=CHUNK_ROWS):
+    start = time.perf_counter()
+
+    attack_hist = np.zeros(SCORE_BINS, dtype=np.int64)
+    benign_hist = np.zeros(SCORE_BINS, dtype=np.int64)
+    label_hists = {}        # label -> score histogram
+    label_score_sums = {}
+    rows = 0
+
+    for chunk in iter_chunks(path, chunk_rows):
+        # CICIDS headers carry stray spaces (" Label", " Flow Duration")
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        label_col = label_column(chunk.columns)
+        if label_col is None:
+            return {"path": path, "skipped": "no label column"}
+
+        # By name, never by position: Destination Port and any extra
+        # columns (Timestamp, Flow ID, ...) must not shift the inputs
+        columns, reason = model_columns(chunk.columns)
+        if columns is None:
+            return {"path": path, "skipped": reason}
+
+        labels = chunk[label_col].astype(str).str.strip()
+        features = chunk[columns].apply(pd.to_numeric, errors="coerce").fillna(0)
+
+        scores = _detect.predict_batch(features.to_numpy(dtype=np.float32), drift_score)
+        bins = np.clip(np.rint(scores * 100).astype(np.int64), 0, SCORE_BINS - 1)
+
+        is_benign = (labels.str.upper() == BENIGN_LABEL).to_numpy()
+        attack_hist += np.bincount(bins[~is_benign], minlength=SCORE_BINS)
+        benign_hist += np.bincount(bins[is_benign], minlength=SCORE_BINS)
+
+        # Per-label score histograms from one 2-D bincount
+        codes, uniques = pd.factorize(labels)
+        hists = np.bincount(
+            codes * SCORE_BINS + bins, minlength=len(uniques) * SCORE_BINS
+        ).reshape(len(uniques), SCORE_BINS)
+        sums = np.bincount(codes, weights=scores, minlength=len(uniques))
+
+        for code, label in enumerate(uniques):
+            if label in label_hists:
+                label_hists[label] += hists[code]
+                label_score_sums[label] += float(sums[code])
+            else:
+                label_hists[label] = hists[code].copy()
+                label_score_sums[label] = float(sums[code])
+
+        rows += len(chunk)
+
+    return {
+        "path": path,
+        "rows": rows,
+        "seconds": time.perf_counter() - start,
+        "attack_hist": attack_hist,
+        "benign_hist": benign_hist,
+        "label_hists": label_hists,
+        "label_score_sums": label_score_sums,
+    }
+
+
+# =========================================================
+# METRICS
+# =========================================================
+
+def confusion(attack_hist, benign_hist, threshold):
+    """Flag a row as attack when its risk score >= threshold."""
+
+    cut = int(round(threshold * 100))
+    tp = int(attack_hist[cut:].sum())
+    fn = int(attack_hist[:cut].sum())
+    fp = int(benign_hist[cut:].sum())
+    tn = int(benign_hist[:cut].sum())
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    total = tp + fn + fp + tn
+
+    return {
+        "threshold": threshold,
+        "tp": tp, "fp": fp, "tn": tn, "fn": fn,
+        "precision": round(precision, 6),
+        "recall": round(recall, 6),
+        "f1": round(2 * precision * recall / (precision + recall), 6)
+        if precision + recall else 0.0,
+        "false_positive_rate": round(fp / (fp + tn), 6) if fp + tn else 0.0,
+        "accuracy": round((tp + tn) / total, 6) if total else 0.0,
+    }
+
+
+def roc_auc(attack_hist, benign_hist):
+    """Exact AUC from score histograms; ties within a bin count half."""
+
+    positives = attack_hist.sum()
+    negatives = benign_hist.sum()
+    if not positives or not negatives:
+        return None
+
+    tpr = np.concatenate(([0.0], np.cumsum(attack_hist[::-1]) / positives))
+    fpr = np.concatenate(([0.0], np.cumsum(benign_hist[::-1]) / negatives))
+    return round(float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)), 6)
+
+
+def merge(results):
+    merged = {
+        "rows": 0,
+        "attack_hist": np.zeros(SCORE_BINS, dtype=np.int64),
+        "benign_hist": np.zeros(SCORE_BINS, dtype=np.int64),
+        "label_hists": {},
+        "label_score_sums": {},
+    }
+
+    for result in results:
+        merged["rows"] += result["rows"]
+        merged["attack_hist"] += result["attack_hist"]
+        merged["benign_hist"] += result["benign_hist"]
+        for label, hist in result["label_hists"].items():
+            if label in merged["label_hists"]:
+                merged["label_hists"][label] += hist
+                merged["label_score_sums"][label] += result["label_score_sums"][label]
+            else:
+                merged["label_hists"][label] = hist.copy()
+                merged["label_score_sums"][label] = result["label_score_sums"][label]
+
+    return merged
+
+
+def report(result, thresholds):
+    attack_hist = result["attack_hist"]
+    benign_hist = result["benign_hist"]
+
+    per_label = {}
+    for label, hist in sorted(result["label_hists"].items()):
+        count = int(hist.sum())
+        per_label[label] = {
+            "rows": count,
+            "mean_risk": round(result["label_score_sums"][label] / count, 3) if count else 0.0,
+            # Detection rate for attacks, false-positive rate for BENIGN
+            "flagged_rate": {
+                str(t): round(int(hist[int(round(t * 100)):].sum()) / count, 6) if count else 0.0
+                for t in thresholds
+            },
+        }
+
+    return {
+        "rows": int(result["rows"]),
+        "attack_rows": int(attack_hist.sum()),
+        "benign_rows": int(benign_hist.sum()),
+        "roc_auc": roc_auc(attack_hist, benign_hist),
+        "confusion": [confusion(attack_hist, benign_hist, t) for t in thresholds],
+        "per_label": per_label,
+    }
+
+
+# =========================================================
+# DRIVER
+# =========================================================
+
+def evaluate(files, thresholds=DEFAULT_THRESHOLDS, workers=None, drift_score=0.0,
+             chunk_rows=CHUNK_ROWS):
+    workers = workers or min(len(files), os.cpu_count() or 1)
+    start = time.perf_counter()
+    results, skipped = [], []
+
+    # spawn: TensorFlow does not survive fork
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as pool:
+        futures = {
+            pool.submit(evaluate_file, path, drift_score, chunk_rows): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            if "skipped" in result:
+                skipped.append(result)
+            else:
+                results.append(result)
+            print(f"  {os.path.basename(futures[future])}: "
+                  f"{result.get('rows', 0)} rows", flush=True)
+
+    elapsed = time.perf_counter() - start
+    overall = report(merge(results), thresholds)
+    overall["seconds"] = round(elapsed, 2)
+    overall["rows_per_sec"] = round(overall["rows"] / elapsed) if elapsed else 0
+
+    per_file = {}
+    for result in sorted(results, key=lambda r: r["path"]):
+        summary = report(result, thresholds)
+        per_file[os.path.relpath(result["path"])] = {
+            "rows": summary["rows"],
+            "seconds": round(result["seconds"], 2),
+            "roc_auc": summary["roc_auc"],
+            "confusion": summary["confusion"],
+        }
+
+    return {
+        "files": len(files),
+        "workers": workers,
+        "drift_score": drift_score,
+        "overall": overall,
+        "per_file": per_file,
+        "skipped": {os.path.relpath(r["path"]): r["skipped"] for r in skipped},
+    }
+
+
+# ---------------- ENTRY ----------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--thresholds", default=",".join(str(t) for t in DEFAULT_THRESHOLDS))
+    parser.add_argument("--drift", type=float, default=0.0,
+                        help="drift score the detector weights are set for")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--out", default="evaluation.json")
+    args = parser.parse_args()
+
+    files = find_datasets(args.data)
+    if not files:
+        raise SystemExit(f"No CSV or Parquet files found under {args.data}")
+
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    print(f"Evaluating {len(files)} files")
+
+    result = evaluate(files, thresholds, args.workers, args.drift, args.chunk_rows)
+
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    overall = result["overall"]
+    print(json.dumps({
+        key: overall[key]
+        for key in ("rows", "rows_per_sec", "roc_auc", "confusion")
+    }, indent=2))
@@ -0,0 +1,424 @@
+"""
+Parity check for the incremental flow features in features.py.
+
+Packets go through update_flow as in production while the same
+packets are also kept per flow as plain lists. Every flow update_flow
+emits is recomputed from those lists by reference_features() (numpy
+over the stored values, CICFlowMeter's bulk / subflow / active-idle
+rules replayed packet by packet) and all 77 values are compared.
+
+Capture files are parsed here, without scapy, into the same header
+fields the AF_PACKET ring hands to update_flow_fields, so a pcap
+exercises the production fast path and needs neither root nor scapy.
+
+    python -m src.realtime.feature_parity --pcap tests/data/sample.pcap
+    python -m src.realtime.feature_parity --synthetic 200000 --mix attack
+"""
+
+import argparse
+import math
+import socket
+import struct
+import sys
+
+import numpy as np
+
+from . import afpacket, features
+
+RTOL = 1e-9
+ATOL = 1e-6
+
+
+# =========================================================
+# REFERENCE (per-packet lists)
+# =========================================================
+
+def _stats(values):
+    if len(values) == 0:
+        return 0.0, 0.0, 0.0, 0.0, 0.0
+    values = np.asarray(values, dtype=np.float64)
+    std = float(np.std(values, ddof=1)) if len(values) > 1 else 0.0
+    return float(values.max()), float(values.min()), float(values.mean()), std, float(values.sum())
+
+
+def _bulks(packets, forward):
+    """Replay CICFlowMeter's updateForwardBulk / updateBackwardBulk."""
+
+    state = {True: [0, 0, 0, 0], False: [0, 0, 0, 0]}   # start, count, size, last
+    bulks = packets_in = size_total = duration = 0
+
+    for ts, is_fwd, size, _, _, _ in packets:
+        mine, other = state[is_fwd], state[not is_fwd]
+        if other[3] > mine[0]:
+            mine[0] = 0
+        if size <= 0:
+            continue
+
+        if mine[0] == 0 or ts - mine[3] > features.BULK_GAP:
+            mine[:3] = [ts, 1, size]
+        else:
+            mine[1] += 1
+            mine[2] += size
+            if is_fwd == forward:
+                if mine[1] == features.BULK_MIN_PACKETS:
+                    bulks += 1
+                    packets_in += mine[1]
+                    size_total += mine[2]
+                    duration += ts - mine[0]
+                elif mine[1] > features.BULK_MIN_PACKETS:
+                    packets_in += 1
+                    size_total += size
+                    duration += ts - mine[3]
+        mine[3] = ts
+
+    if not bulks:
+        return 0, 0, 0
+    rate = int(size_total / (duration / 1e6)) if duration else 0
+    return size_total // bulks, packets_in // bulks, rate
+
+
+def _subflows_active_idle(times):
+    subflows = 0
+    active, idle = [], []
+    start = end = last = times[0]
+
+    for ts in times:
+        if ts - last > features.SUBFLOW_GAP:
+            subflows += 1
+            if ts - end > features.ACTIVITY_TIMEOUT:
+                if end - start > 0:
+                    active.append(end - start)
+                idle.append(ts - end)
+                start = ts
+            end = ts
+        last = ts
+
+    if end - start > 0:
+        active.append(end - start)
+    return subflows, active, idle
+
+
+def reference_features(packets, duration):
+    """
+    packets: [(ts_us, is_fwd, size, header_len, tcp_flags, window), ...]
+    in arrival order, first packet forward. Same keys and order as
+    features.compute_features.
+    """
+
+    times = [p[0] for p in packets]
+    fwd = [p for p in packets if p[1]]
+    bwd = [p for p in packets if not p[1]]
+
+    fwd_sizes = [p[2] for p in fwd]
+    bwd_sizes = [p[2] for p in bwd]
+    all_sizes = [p[2] for p in packets]
+
+    f_max, f_min, f_mean, f_std, f_sum = _stats(fwd_sizes)
+    b_max, b_min, b_mean, b_std, b_sum = _stats(bwd_sizes)
+    l_max, l_min, l_mean, l_std, _ = _stats(all_sizes)
+    i_max, i_min, i_mean, i_std, _ = _stats(np.diff(times))
+    fi_max, fi_min, fi_mean, fi_std, fi_sum = _stats(np.diff([p[0] for p in fwd]))
+    bi_max, bi_min, bi_mean, bi_std, bi_sum = _stats(np.diff([p[0] for p in bwd]))
+
+    def count(rows, bit):
+        return sum(1 for p in rows if p[4] & bit)
+
+    seconds = duration if duration > 0 else 0
+
+    def per_second(n):
+        return n / seconds if seconds else 0
+
+    subflows, active, idle = _subflows_active_idle(times)
+    a_max, a_min, a_mean, a_std, _ = _stats(active)
+    d_max, d_min, d_mean, d_std, _ = _stats(idle)
+    fwd_bulk = _bulks(packets, True)
+    bwd_bulk = _bulks(packets, False)
+
+    fwd_bytes, bwd_bytes = sum(fwd_sizes), sum(bwd_sizes)
+    header_fwd = sum(p[3] for p in fwd)
+
+    def first_window(rows):
+        return rows[0][5] if rows and rows[0][5] is not None else -1
+
+    def sub(n):
+        return n // subflows if subflows else 0
+
+    letters = dict(features.TCP_FLAGS)
+
+    return {
+        "Flow Duration": seconds * 1e6,
+        "Tot Fwd Pkts": len(fwd),
+        "Tot Bwd Pkts": len(bwd),
+        "TotLen Fwd Pkts": fwd_bytes,
+        "TotLen Bwd Pkts": bwd_bytes,
+        "Fwd Pkt Len Max": f_max, "Fwd Pkt Len Min": f_min,
+        "Fwd Pkt Len Mean": f_mean, "Fwd Pkt Len Std": f_std,
+        "Bwd Pkt Len Max": b_max, "Bwd Pkt Len Min": b_min,
+        "Bwd Pkt Len Mean": b_mean, "Bwd Pkt Len Std": b_std,
+        "Flow Byts/s": per_second(fwd_bytes + bwd_bytes),
+        "Flow Pkts/s": per_second(len(packets)),
+        "Flow IAT Mean": i_mean, "Flow IAT Std": i_std,
+        "Flow IAT Max": i_max, "Flow IAT Min": i_min,
+        "Fwd IAT Tot": fi_sum, "Fwd IAT Mean": fi_mean, "Fwd IAT Std": fi_std,
+        "Fwd IAT Max": fi_max, "Fwd IAT Min": fi_min,
+        "Bwd IAT Tot": bi_sum, "Bwd IAT Mean": bi_mean, "Bwd IAT Std": bi_std,
+        "Bwd IAT Max": bi_max, "Bwd IAT Min": bi_min,
+        "Fwd PSH Flags": count(fwd, features.PSH),
+        "Bwd PSH Flags": count(bwd, features.PSH),
+        "Fwd URG Flags": count(fwd, features.URG),
+        "Bwd URG Flags": count(bwd, features.URG),
+        "Fwd Header Len": header_fwd,
+        "Bwd Header Len": sum(p[3] for p in bwd),
+        "Fwd Pkts/s": per_second(len(fwd)),
+        "Bwd Pkts/s": per_second(len(bwd)),
+        "Pkt Len Min": l_min, "Pkt Len Max": l_max, "Pkt Len Mean": l_mean,
+        "Pkt Len Std": l_std, "Pkt Len Var": l_std ** 2,
+        "FIN Flag Cnt": count(packets, letters["F"]),
+        "SYN Flag Cnt": count(packets, letters["S"]),
+        "RST Flag Cnt": count(packets, letters["R"]),
+        "PSH Flag Cnt": count(packets, letters["P"]),
+        "ACK Flag Cnt": count(packets, letters["A"]),
+        "URG Flag Cnt": count(packets, letters["U"]),
+        "CWE Flag Count": count(packets, letters["C"]),
+        "ECE Flag Cnt": count(packets, letters["E"]),
+        "Down/Up Ratio": len(bwd) // len(fwd) if fwd else 0,
+        "Pkt Size Avg": l_mean,
+        "Fwd Seg Size Avg": f_mean,
+        "Bwd Seg Size Avg": b_mean,
+        "Fwd Header Len.1": header_fwd,
+        "Fwd Byts/b Avg": fwd_bulk[0], "Fwd Pkts/b Avg": fwd_bulk[1],
+        "Fwd Blk Rate Avg": fwd_bulk[2],
+        "Bwd Byts/b Avg": bwd_bulk[0], "Bwd Pkts/b Avg": bwd_bulk[1],
+        "Bwd Blk Rate Avg": bwd_bulk[2],
+        "Subflow Fwd Pkts": sub(len(fwd)), "Subflow Fwd Byts": sub(fwd_bytes),
+        "Subflow Bwd Pkts": sub(len(bwd)), "Subflow Bwd Byts": sub(bwd_bytes),
+        "Init Fwd Win Byts": first_window(fwd),
+        "Init Bwd Win Byts": first_window(bwd),
+        "Fwd Act Data Pkts": sum(1 for s in fwd_sizes if s >= 1),
+        "Fwd Seg Size Min": min(p[3] for p in fwd) if fwd else 0,
+        "Active Mean": a_mean, "Active Std": a_std,
+        "Active Max": a_max, "Active Min": a_min,
+        "Idle Mean": d_mean, "Idle Std": d_std,
+        "Idle Max": d_max, "Idle Min": d_min,
+    }
+
+
+# =========================================================
+# COMPARISON
+# =========================================================
+
+class ParityCheck:
+    """Feeds packets to update_flow and to per-flow lists side by side."""
+
+    def __init__(self):
+        features.flows.clear()
+        self.packets = {}       # flow key -> [(ts_us, is_fwd, size, header, flags, window)]
+        self.starts = {}        # flow key -> first packet time (s)
+        self.last_key = None
+        self.flows = 0
+        self.mismatches = {}    # feature -> (count, worst abs error, example)
+
+    def feed(self, packet, now):
+        tcp_flags, header_len, payload_len, window = features.packet_layers(packet)
+        self._record(features.get_flow_id(packet), len(packet), header_len,
+                     payload_len, tcp_flags, window, now)
+
+        result, _ = features.update_flow(packet, now=now)
+        self._emitted(result, now)
+
+    def feed_frame(self, src, dst, sport, dport, proto, wire_len, header_len,
+                   payload_len, tcp_flags, window, ts):
+        """feed() for parsed header fields, as the AF_PACKET ring delivers them."""
+
+        flow_id = (src, dst, sport, dport, proto)
+        self._record(flow_id, wire_len, header_len, payload_len, tcp_flags, window, ts)
+
+        result, _ = features.update_flow_fields(
+            flow_id, wire_len, header_len, tcp_flags, ts, payload_len, window
+        )
+        self._emitted(result, ts)
+
+    def _record(self, flow_id, wire_len, header_len, payload_len, tcp_flags, window, now):
+        reverse_id = (flow_id[1], flow_id[0], flow_id[3], flow_id[2], flow_id[4])
+
+        if flow_id in self.packets:
+            key, is_fwd = flow_id, True
+        elif reverse_id in self.packets:
+            key, is_fwd = reverse_id, False
+        else:
+            key, is_fwd = flow_id, True
+            self.packets[key] = []
+            self.starts[key] = now
+
+        size = wire_len if payload_len is None else payload_len
+        self.packets[key].append((now * 1e6, is_fwd, size, header_len, tcp_flags, window))
+        self.last_key = key
+
+    def _emitted(self, result, now):
+        if result is not None:
+            key = self.last_key
+            rows = self.packets.pop(key)
+            self.compare(result, reference_features(rows, now - self.starts.pop(key)))
+
+    def finish(self):
+        """Close the flows still open at the end of the capture."""
+
+        for key, flow in list(features.flows.items()):
+            duration = flow["last_seen"] - flow["start_time"]
+            rows = self.packets.pop(key)
+            self.starts.pop(key)
+            self.compare(features.compute_features(flow, duration),
+                         reference_features(rows, duration))
+        features.flows.clear()
+
+    def compare(self, incremental, reference):
+        self.flows += 1
+
+        if list(incremental) != list(reference):
+            self.mismatches.setdefault("<feature order>", [0, 0.0, None])[0] += 1
+            return
+
+        for name, value in incremental.items():
+            expected = reference[name]
+            if not math.isclose(value, expected, rel_tol=RTOL, abs_tol=ATOL):
+                entry = self.mismatches.setdefault(name, [0, 0.0, None])
+                entry[0] += 1
+                error = abs(value - expected)
+                if error > entry[1]:
+                    entry[1], entry[2] = error, (value, expected)
+
+
+# =========================================================
+# CAPTURE FILES
+# =========================================================
+
+PCAP_HEADER = struct.Struct("<IHHiIII")
+PCAP_RECORD = struct.Struct("<IIII")
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+LINKTYPE_ETHERNET = 1
+
+ETH_HEADER = 14
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86DD
+ETHERTYPE = struct.Struct("!H")
+
+
+def read_pcap(path):
+    """
+    Yield ring-handler fields (src, dst, sport, dport, proto, wire_len,
+    header_len, payload_len, tcp_flags, window, ts) for every IP frame
+    of a little-endian Ethernet pcap, split the way afpacket splits them.
+    """
+
+    with open(path, "rb") as f:
+        header = f.read(PCAP_HEADER.size)
+        if len(header) < PCAP_HEADER.size:
+            raise ValueError(f"{path}: truncated pcap header")
+        magic, _, _, _, _, _, linktype = PCAP_HEADER.unpack(header)
+        if magic not in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            raise ValueError(f"{path}: not a little-endian pcap file")
+        if linktype != LINKTYPE_ETHERNET:
+            raise ValueError(f"{path}: link type {linktype}, expected Ethernet")
+        fraction = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+
+        while True:
+            record = f.read(PCAP_RECORD.size)
+            if len(record) < PCAP_RECORD.size:
+                return
+            sec, frac, caplen, wire_len = PCAP_RECORD.unpack(record)
+            frame = f.read(caplen)
+            if len(frame) < caplen:
+                return
+
+            fields = parse_frame(frame, wire_len)
+            if fields is not None:
+                yield fields + (sec + frac * fraction,)
+
+
+def parse_frame(frame, wire_len):
+    if len(frame) < ETH_HEADER:
+        return None
+    (ethertype,) = ETHERTYPE.unpack_from(frame, 12)
+    ip = ETH_HEADER
+
+    if ethertype == ETH_IPV4 and len(frame) >= ip + afpacket.IPV4_HEADER.size:
+        ver_ihl, ip_len, proto, src, dst = afpacket.IPV4_HEADER.unpack_from(frame, ip)
+        l4 = ip + (ver_ihl & 0x0F) * 4
+        family = socket.AF_INET
+    elif ethertype == ETH_IPV6 and len(frame) >= ip + afpacket.IPV6_HEADER.size:
+        _, payload_len, proto, src, dst = afpacket.IPV6_HEADER.unpack_from(frame, ip)
+        ip_len = payload_len + 40
+        l4 = ip + 40
+        family = socket.AF_INET6
+    else:
+        return None
+
+    sport = dport = tcp_flags = 0
+    header_len, payload_len, window = ip_len, None, None
+    l4_len = ip_len - (l4 - ip)
+    if proto == afpacket.TCP and l4 + 16 <= len(frame):
+        sport, dport, offset_flags, window = afpacket.TCP_HEADER.unpack_from(frame, l4)
+        tcp_flags = offset_flags & 0xFF
+        header_len = (offset_flags >> 12) * 4
+        payload_len = max(0, l4_len - header_len)
+    elif proto == afpacket.UDP and l4 + 4 <= len(frame):
+        sport, dport = afpacket.PORTS.unpack_from(frame, l4)
+        header_len = 8
+        payload_len = max(0, l4_len - 8)
+
+    return (socket.inet_ntop(family, src), socket.inet_ntop(family, dst),
+            sport, dport, proto, wire_len, header_len, payload_len, tcp_flags, window)
+
+
+def check_pcap(path):
+    """Run a capture file through ParityCheck; returns (check, frames)."""
+
+    check = ParityCheck()
+    frames = 0
+    for fields in read_pcap(path):
+        check.feed_frame(*fields)
+        frames += 1
+    check.finish()
+    return check, frames
+
+
+def synthetic(count, mix, seed):
+    from .bench_suite import TrafficGenerator
+
+    for packet in TrafficGenerator(mix, seed).packets(count):
+        yield packet, packet.time
+
+
+# ---------------- ENTRY ----------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pcap", help="capture file to check against")
+    parser.add_argument("--synthetic", type=int, default=200_000,
+                        help="packets of generated traffic when no --pcap is given")
+    parser.add_argument("--mix", default="default")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.pcap:
+        check, packets = check_pcap(args.pcap)
+    else:
+        check = ParityCheck()
+        packets = 0
+        for packet, now in synthetic(args.synthetic, args.mix, args.seed):
+            check.feed(packet, now)
+            packets += 1
+        check.finish()
+
+    print(f"{packets} packets, {check.flows} flows, "
+          f"{len(features.compute_features(features.new_flow(0), 0))} features")
+
+    if not check.mismatches:
+        print("All features match the reference")
+        sys.exit(0)
+
+    for name, (count, error, example) in sorted(check.mismatches.items()):
+        print(f"  {name}: {count} flows differ, worst |error| {error:.6g} "
+              f"(incremental, reference) = {example}")
+    sys.exit(1)
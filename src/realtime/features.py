@@ -1,36 +1,267 @@
 import time
 from collections import defaultdict
-import numpy as np
+from .heavy_hitters import top_talkers
+from .benchmark import pipeline_benchmark
 
 FLOW_TIMEOUT = 10  # seconds
 
+# CICFlowMeter constants (microseconds)
+SUBFLOW_GAP = 1_000_000         # a gap longer than this starts a new subflow
+BULK_GAP = 1_000_000            # ... or breaks a bulk transfer
+BULK_MIN_PACKETS = 4
+ACTIVITY_TIMEOUT = 5_000_000    # idle periods longer than this end an active period
+
 flows = {}
 
+# The model's input contract: CICIDS2017 CSV columns (headers stripped)
+# in training order, Destination Port and Label removed. compute_features
+# returns the same 77 values under CICFlowMeter's short names.
+MODEL_COLUMNS = (
+    "Flow Duration", "Total Fwd Packets", "Total Backward Packets",
+    "Total Length of Fwd Packets", "Total Length of Bwd Packets",
+    "Fwd Packet Length Max", "Fwd Packet Length Min",
+    "Fwd Packet Length Mean", "Fwd Packet Length Std",
+    "Bwd Packet Length Max", "Bwd Packet Length Min",
+    "Bwd Packet Length Mean", "Bwd Packet Length Std",
+    "Flow Bytes/s", "Flow Packets/s",
+    "Flow IAT Mean", "Flow IAT Std", "Flow IAT Max", "Flow IAT Min",
+    "Fwd IAT Total", "Fwd IAT Mean", "Fwd IAT Std", "Fwd IAT Max", "Fwd IAT Min",
+    "Bwd IAT Total", "Bwd IAT Mean", "Bwd IAT Std", "Bwd IAT Max", "Bwd IAT Min",
+    "Fwd PSH Flags", "Bwd PSH Flags", "Fwd URG Flags", "Bwd URG Flags",
+    "Fwd Header Length", "Bwd Header Length",
+    "Fwd Packets/s", "Bwd Packets/s",
+    "Min Packet Length", "Max Packet Length", "Packet Length Mean",
+    "Packet Length Std", "Packet Length Variance",
+    "FIN Flag Count", "SYN Flag Count", "RST Flag Count", "PSH Flag Count",
+    "ACK Flag Count", "URG Flag Count", "CWE Flag Count", "ECE Flag Count",
+    "Down/Up Ratio", "Average Packet Size",
+    "Avg Fwd Segment Size", "Avg Bwd Segment Size", "Fwd Header Length.1",
+    "Fwd Avg Bytes/Bulk", "Fwd Avg Packets/Bulk", "Fwd Avg Bulk Rate",
+    "Bwd Avg Bytes/Bulk", "Bwd Avg Packets/Bulk", "Bwd Avg Bulk Rate",
+    "Subflow Fwd Packets", "Subflow Fwd Bytes",
+    "Subflow Bwd Packets", "Subflow Bwd Bytes",
+    "Init_Win_bytes_forward", "Init_Win_bytes_backward",
+    "act_data_pkt_fwd", "min_seg_size_forward",
+    "Active Mean", "Active Std", "Active Max", "Active Min",
+    "Idle Mean", "Idle Std", "Idle Max", "Idle Min",
+)
+
 # =========================================================
 # FLOW IDENTIFIER (5‑tuple)
 # =========================================================
 
 def get_flow_id(packet):
-    src = getattr(packet, "src", "0.0.0.0")
-    dst = getattr(packet, "dst", "0.0.0.0")
+    # Addresses come from the IP layer: on a scapy Ether frame a plain
+    # packet.src is the MAC address
+    getlayer = getattr(packet, "getlayer", None)
+    ip = None
+    if getlayer is not None:
+        ip = getlayer("IP")
+        if ip is None:
+            ip = getlayer("IPv6")
+
+    if ip is not None:
+        src, dst = ip.src, ip.dst
+        proto = ip.nh if ip.name == "IPv6" else ip.proto
+    else:
+        src = getattr(packet, "src", "0.0.0.0")
+        dst = getattr(packet, "dst", "0.0.0.0")
+        proto = getattr(packet, "proto", 0)
+
     sport = getattr(packet, "sport", 0)
     dport = getattr(packet, "dport", 0)
-    proto = getattr(packet, "proto", 0)
 
     return (src, dst, sport, dport, proto)
 
 
+# =========================================================
+# RUNNING STATISTICS
+# =========================================================
+
+class RunningStats:
+    """
+    Count / sum / min / max / mean / variance in O(1) per value
+    (Welford), so flows keep no per-packet lists.
+
+    std() and variance() are the sample (n - 1) forms, as CICFlowMeter
+    reports them through commons-math SummaryStatistics.
+    """
+
+    __slots__ = ("n", "total", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        n = self.n = self.n + 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (value - self.mean)
+
+        if n == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def std(self):
+        return self.variance() ** 0.5
+
+    def copy(self):
+        other = RunningStats()
+        other.n, other.total, other.mean = self.n, self.total, self.mean
+        other.m2, other.min, other.max = self.m2, self.min, self.max
+        return other
+
+
 # =========================================================
 # UPDATE FLOW
 # =========================================================
 
-def update_flow(packet):
-    now = time.time()
-    flow_id = get_flow_id(packet)
-    reverse_id = (flow_id[1], flow_id[0], flow_id[3], flow_id[2], flow_id[4])
+# TCP flag letters as scapy prints them, and their header bits
+TCP_FLAGS = (
+    ("F", 0x01), ("S", 0x02), ("R", 0x04), ("P", 0x08),
+    ("A", 0x10), ("U", 0x20), ("E", 0x40), ("C", 0x80),
+)
+PSH = 0x08
+URG = 0x20
+
+
+def packet_layers(packet):
+    """(tcp_flags, header_len, payload_len, tcp_window) from a scapy packet."""
+
+    getlayer = getattr(packet, "getlayer", None)
+    l4 = None
+    if getlayer is not None:
+        l4 = getlayer("TCP")
+        if l4 is None:
+            l4 = getlayer("UDP")
+
+    if l4 is not None:
+        payload_len = len(l4.payload)
+        header_len = len(l4) - payload_len
+        if hasattr(l4, "window"):
+            return int(l4.flags), header_len, payload_len, l4.window
+        return 0, header_len, payload_len, None
+
+    # Neither TCP nor UDP (or not a scapy packet): whole-packet lengths
+    tcp_flags = 0
+    if hasattr(packet, "flags"):
+        flags = str(packet.flags)
+        for letter, bit in TCP_FLAGS:
+            if letter in flags:
+                tcp_flags |= bit
 
-    pkt_len = len(packet)
     header_len = len(packet.payload) if hasattr(packet, "payload") else 0
+    return tcp_flags, header_len, None, None
+
+
+def update_flow(packet, now=None):
+    # `now` lets replays and benchmarks drive flow ageing on packet time
+    tcp_flags, header_len, payload_len, window = packet_layers(packet)
+
+    return update_flow_fields(
+        get_flow_id(packet),
+        len(packet),
+        header_len,
+        tcp_flags,
+        now,
+        payload_len,
+        window
+    )
+
+
+def new_flow(now):
+    ts = now * 1e6
+    return {
+        "start_time": now,
+        "last_seen": now,
+        "fwd_packets": 0,
+        "bwd_packets": 0,
+        "fwd_bytes": 0,
+        "bwd_bytes": 0,
+        "fwd_lengths": RunningStats(),
+        "bwd_lengths": RunningStats(),
+        "all_lengths": RunningStats(),
+        "flow_iat": RunningStats(),
+        "fwd_iat": RunningStats(),
+        "bwd_iat": RunningStats(),
+        "fwd_last": None,
+        "bwd_last": None,
+        "last_packet_time": None,
+        "flags": defaultdict(int),
+        "fwd_psh": 0,
+        "bwd_psh": 0,
+        "fwd_urg": 0,
+        "bwd_urg": 0,
+        "header_fwd": 0,
+        "header_bwd": 0,
+        "fwd_header_min": None,
+        "fwd_data_packets": 0,
+        "init_win_fwd": -1,
+        "init_win_bwd": -1,
+        # [start, packets, bytes, last ts] of the run in progress, then
+        # completed bulks, their packets, bytes and duration
+        "fwd_bulk": [0, 0, 0, 0, 0, 0, 0, 0],
+        "bwd_bulk": [0, 0, 0, 0, 0, 0, 0, 0],
+        "subflow_last": ts,
+        "subflows": 0,
+        "active_start": ts,
+        "active_end": ts,
+        "active": RunningStats(),
+        "idle": RunningStats(),
+    }
+
+
+def update_bulk(bulk, other_last, ts, size):
+    """CICFlowMeter's bulk tracking: >= 4 data packets, gaps <= 1 s."""
+
+    if other_last > bulk[0]:
+        bulk[0] = 0
+    if size <= 0:
+        return
+
+    if bulk[0] == 0 or ts - bulk[3] > BULK_GAP:
+        bulk[0], bulk[1], bulk[2] = ts, 1, size
+    else:
+        bulk[1] += 1
+        bulk[2] += size
+        if bulk[1] == BULK_MIN_PACKETS:
+            bulk[4] += 1
+            bulk[5] += bulk[1]
+            bulk[6] += bulk[2]
+            bulk[7] += ts - bulk[0]
+        elif bulk[1] > BULK_MIN_PACKETS:
+            bulk[5] += 1
+            bulk[6] += size
+            bulk[7] += ts - bulk[3]
+    bulk[3] = ts
+
+
+def update_flow_fields(flow_id, pkt_len, header_len, tcp_flags=0, now=None,
+                       payload_len=None, tcp_window=None):
+    """
+    update_flow for captures that parse headers themselves (afpacket).
+
+    Length statistics use payload_len (TCP/UDP payload bytes) when
+    given, as CICFlowMeter does, and pkt_len otherwise. Every update
+    is constant-time: flows hold running statistics, not packet lists.
+    """
+
+    now = time.time() if now is None else now
+    reverse_id = (flow_id[1], flow_id[0], flow_id[3], flow_id[2], flow_id[4])
+
+    top_talkers.observe(flow_id, pkt_len)
 
     # Determine direction
     if flow_id in flows:
@@ -39,52 +270,82 @@ def update_flow(packet):
         flow_id = reverse_id
         direction = "bwd"
     else:
-        flows[flow_id] = {
-            "start_time": now,
-            "last_seen": now,
-            "fwd_packets": 0,
-            "bwd_packets": 0,
-            "fwd_bytes": 0,
-            "bwd_bytes": 0,
-            "fwd_lengths": [],
-            "bwd_lengths": [],
-            "iat_times": [],
-            "last_packet_time": now,
-            "flags": defaultdict(int),
-            "header_fwd": 0,
-            "header_bwd": 0
-        }
+        flows[flow_id] = new_flow(now)
         direction = "fwd"
 
     flow = flows[flow_id]
+    ts = now * 1e6
+    size = pkt_len if payload_len is None else payload_len
+
+    # Bulk transfers, subflows and active/idle periods (all in µs)
+    if direction == "fwd":
+        update_bulk(flow["fwd_bulk"], flow["bwd_bulk"][3], ts, size)
+    else:
+        update_bulk(flow["bwd_bulk"], flow["fwd_bulk"][3], ts, size)
+
+    if ts - flow["subflow_last"] > SUBFLOW_GAP:
+        flow["subflows"] += 1
+        if ts - flow["active_end"] > ACTIVITY_TIMEOUT:
+            if flow["active_end"] - flow["active_start"] > 0:
+                flow["active"].add(flow["active_end"] - flow["active_start"])
+            flow["idle"].add(ts - flow["active_end"])
+            flow["active_start"] = ts
+        flow["active_end"] = ts
+    flow["subflow_last"] = ts
 
     # Update timestamps
-    flow["iat_times"].append(now - flow["last_packet_time"])
-    flow["last_packet_time"] = now
+    if flow["last_packet_time"] is not None:
+        flow["flow_iat"].add(ts - flow["last_packet_time"])
+    flow["last_packet_time"] = ts
     flow["last_seen"] = now
 
+    flow["all_lengths"].add(size)
+
     # Update direction stats
     if direction == "fwd":
         flow["fwd_packets"] += 1
-        flow["fwd_bytes"] += pkt_len
-        flow["fwd_lengths"].append(pkt_len)
+        flow["fwd_bytes"] += size
+        flow["fwd_lengths"].add(size)
         flow["header_fwd"] += header_len
+        if flow["fwd_header_min"] is None or header_len < flow["fwd_header_min"]:
+            flow["fwd_header_min"] = header_len
+        if size >= 1:
+            flow["fwd_data_packets"] += 1
+        if flow["fwd_last"] is not None:
+            flow["fwd_iat"].add(ts - flow["fwd_last"])
+        flow["fwd_last"] = ts
+        if flow["fwd_packets"] == 1 and tcp_window is not None:
+            flow["init_win_fwd"] = tcp_window
+        if tcp_flags & PSH:
+            flow["fwd_psh"] += 1
+        if tcp_flags & URG:
+            flow["fwd_urg"] += 1
     else:
         flow["bwd_packets"] += 1
-        flow["bwd_bytes"] += pkt_len
-        flow["bwd_lengths"].append(pkt_len)
+        flow["bwd_bytes"] += size
+        flow["bwd_lengths"].add(size)
         flow["header_bwd"] += header_len
+        if flow["bwd_last"] is not None:
+            flow["bwd_iat"].add(ts - flow["bwd_last"])
+        flow["bwd_last"] = ts
+        if flow["bwd_packets"] == 1 and tcp_window is not None:
+            flow["init_win_bwd"] = tcp_window
+        if tcp_flags & PSH:
+            flow["bwd_psh"] += 1
+        if tcp_flags & URG:
+            flow["bwd_urg"] += 1
 
     # TCP flags (if available)
-    if hasattr(packet, "flags"):
-        for flag in ["F", "S", "R", "P", "A", "U", "E", "C"]:
-            if flag in str(packet.flags):
-                flow["flags"][flag] += 1
+    if tcp_flags:
+        for letter, bit in TCP_FLAGS:
+            if tcp_flags & bit:
+                flow["flags"][letter] += 1
 
     duration = now - flow["start_time"]
 
     if duration >= FLOW_TIMEOUT:
-        features = compute_features(flow, duration)
+        with pipeline_benchmark.stage("features"):
+            features = compute_features(flow, duration)
         src_ip = flow_id[0]
         del flows[flow_id]
         return features, src_ip
@@ -96,64 +357,153 @@ def update_flow(packet):
 # FEATURE COMPUTATION
 # =========================================================
 
-def compute_features(flow, duration):
+def bulk_features(bulk):
+    bulks, packets, size, duration = bulk[4], bulk[5], bulk[6], bulk[7]
+    if not bulks:
+        return 0, 0, 0
+    # CICFlowMeter reports these as integers
+    rate = int(size / (duration / 1e6)) if duration else 0
+    return size // bulks, packets // bulks, rate
 
-    if duration == 0:
-        duration = 1
 
-    def safe_stats(values):
-        if len(values) == 0:
-            return 0, 0, 0, 0
-        return (
-            max(values),
-            min(values),
-            np.mean(values),
-            np.std(values)
-        )
+def compute_features(flow, duration):
+    """
+    The 77 model inputs, in the order of the CICIDS2017 training
+    columns (without Destination Port). Durations and IATs are in
+    microseconds, rates per second, as in CICFlowMeter.
+    """
+
+    seconds = duration if duration > 0 else 0
+    duration_us = seconds * 1e6
+
+    def per_second(count):
+        return count / seconds if seconds else 0
+
+    fwd = flow["fwd_lengths"]
+    bwd = flow["bwd_lengths"]
+    lengths = flow["all_lengths"]
+    flow_iat = flow["flow_iat"]
+    fwd_iat = flow["fwd_iat"]
+    bwd_iat = flow["bwd_iat"]
+    flags = flow["flags"]
+
+    fwd_packets = flow["fwd_packets"]
+    bwd_packets = flow["bwd_packets"]
+    total_packets = fwd_packets + bwd_packets
+    total_bytes = flow["fwd_bytes"] + flow["bwd_bytes"]
 
-    fwd_max, fwd_min, fwd_mean, fwd_std = safe_stats(flow["fwd_lengths"])
-    bwd_max, bwd_min, bwd_mean, bwd_std = safe_stats(flow["bwd_lengths"])
-    iat_max, iat_min, iat_mean, iat_std = safe_stats(flow["iat_times"])
+    fwd_bulk = bulk_features(flow["fwd_bulk"])
+    bwd_bulk = bulk_features(flow["bwd_bulk"])
 
-    total_packets = flow["fwd_packets"] + flow["bwd_packets"]
-    total_bytes = flow["fwd_bytes"] + flow["bwd_bytes"]
+    subflows = flow["subflows"]
+
+    # The active period still open when the flow is exported
+    active = flow["active"]
+    if flow["active_end"] - flow["active_start"] > 0:
+        active = active.copy()
+        active.add(flow["active_end"] - flow["active_start"])
+    idle = flow["idle"]
 
     features = {
-        "Flow Duration": duration,
-        "Tot Fwd Pkts": flow["fwd_packets"],
-        "Tot Bwd Pkts": flow["bwd_packets"],
+        "Flow Duration": duration_us,
+        "Tot Fwd Pkts": fwd_packets,
+        "Tot Bwd Pkts": bwd_packets,
         "TotLen Fwd Pkts": flow["fwd_bytes"],
         "TotLen Bwd Pkts": flow["bwd_bytes"],
 
-        "Fwd Pkt Len Max": fwd_max,
-        "Fwd Pkt Len Min": fwd_min,
-        "Fwd Pkt Len Mean": fwd_mean,
-        "Fwd Pkt Len Std": fwd_std,
-
-        "Bwd Pkt Len Max": bwd_max,
-        "Bwd Pkt Len Min": bwd_min,
-        "Bwd Pkt Len Mean": bwd_mean,
-        "Bwd Pkt Len Std": bwd_std,
-
-        "Flow Byts/s": total_bytes / duration,
-        "Flow Pkts/s": total_packets / duration,
-
-        "Fwd IAT Tot": sum(flow["iat_times"]),
-        "Fwd IAT Mean": iat_mean,
-        "Fwd IAT Std": iat_std,
-        "Fwd IAT Max": iat_max,
-        "Fwd IAT Min": iat_min,
+        "Fwd Pkt Len Max": fwd.max,
+        "Fwd Pkt Len Min": fwd.min,
+        "Fwd Pkt Len Mean": fwd.mean,
+        "Fwd Pkt Len Std": fwd.std(),
+
+        "Bwd Pkt Len Max": bwd.max,
+        "Bwd Pkt Len Min": bwd.min,
+        "Bwd Pkt Len Mean": bwd.mean,
+        "Bwd Pkt Len Std": bwd.std(),
+
+        "Flow Byts/s": per_second(total_bytes),
+        "Flow Pkts/s": per_second(total_packets),
+
+        "Flow IAT Mean": flow_iat.mean,
+        "Flow IAT Std": flow_iat.std(),
+        "Flow IAT Max": flow_iat.max,
+        "Flow IAT Min": flow_iat.min,
+
+        "Fwd IAT Tot": fwd_iat.total,
+        "Fwd IAT Mean": fwd_iat.mean,
+        "Fwd IAT Std": fwd_iat.std(),
+        "Fwd IAT Max": fwd_iat.max,
+        "Fwd IAT Min": fwd_iat.min,
+
+        "Bwd IAT Tot": bwd_iat.total,
+        "Bwd IAT Mean": bwd_iat.mean,
+        "Bwd IAT Std": bwd_iat.std(),
+        "Bwd IAT Max": bwd_iat.max,
+        "Bwd IAT Min": bwd_iat.min,
+
+        "Fwd PSH Flags": flow["fwd_psh"],
+        "Bwd PSH Flags": flow["bwd_psh"],
+        "Fwd URG Flags": flow["fwd_urg"],
+        "Bwd URG Flags": flow["bwd_urg"],
 
         "Fwd Header Len": flow["header_fwd"],
         "Bwd Header Len": flow["header_bwd"],
 
-        "FIN Flag Cnt": flow["flags"]["F"],
-        "SYN Flag Cnt": flow["flags"]["S"],
-        "RST Flag Cnt": flow["flags"]["R"],
-        "PSH Flag Cnt": flow["flags"]["P"],
-        "ACK Flag Cnt": flow["flags"]["A"],
-        "URG Flag Cnt": flow["flags"]["U"],
-        "ECE Flag Cnt": flow["flags"]["E"]
+        "Fwd Pkts/s": per_second(fwd_packets),
+        "Bwd Pkts/s": per_second(bwd_packets),
+
+        "Pkt Len Min": lengths.min,
+        "Pkt Len Max": lengths.max,
+        "Pkt Len Mean": lengths.mean,
+        "Pkt Len Std": lengths.std(),
+        "Pkt Len Var": lengths.variance(),
+
+        "FIN Flag Cnt": flags["F"],
+        "SYN Flag Cnt": flags["S"],
+        "RST Flag Cnt": flags["R"],
+        "PSH Flag Cnt": flags["P"],
+        "ACK Flag Cnt": flags["A"],
+        "URG Flag Cnt": flags["U"],
+        "CWE Flag Count": flags["C"],
+        "ECE Flag Cnt": flags["E"],
+
+        "Down/Up Ratio": bwd_packets // fwd_packets if fwd_packets else 0,
+        "Pkt Size Avg": lengths.mean,
+        "Fwd Seg Size Avg": fwd.mean,
+        "Bwd Seg Size Avg": bwd.mean,
+        "Fwd Header Len.1": flow["header_fwd"],
+
+        "Fwd Byts/b Avg": fwd_bulk[0],
+        "Fwd Pkts/b Avg": fwd_bulk[1],
+        "Fwd Blk Rate Avg": fwd_bulk[2],
+        "Bwd Byts/b Avg": bwd_bulk[0],
+        "Bwd Pkts/b Avg": bwd_bulk[1],
+        "Bwd Blk Rate Avg": bwd_bulk[2],
+
+        "Subflow Fwd Pkts": fwd_packets // subflows if subflows else 0,
+        "Subflow Fwd Byts": flow["fwd_bytes"] // subflows if subflows else 0,
+        "Subflow Bwd Pkts": bwd_packets // subflows if subflows else 0,
+        "Subflow Bwd Byts": flow["bwd_bytes"] // subflows if subflows else 0,
+
+        "Init Fwd Win Byts": flow["init_win_fwd"],
+        "Init Bwd Win Byts": flow["init_win_bwd"],
+        "Fwd Act Data Pkts": flow["fwd_data_packets"],
+        "Fwd Seg Size Min": flow["fwd_header_min"] or 0,
+
+        "Active Mean": active.mean,
+        "Active Std": active.std(),
+        "Active Max": active.max,
+        "Active Min": active.min,
+
+        "Idle Mean": idle.mean,
+        "Idle Std": idle.std(),
+        "Idle Max": idle.max,
+        "Idle Min": idle.min,
     }
 
     return features
+
+
+# compute_features' names, position for position with MODEL_COLUMNS
+FEATURE_NAMES = tuple(compute_features(new_flow(0), 0))
+assert len(FEATURE_NAMES) == len(MODEL_COLUMNS)
@@ -0,0 +1,370 @@
+"""
+Offline governance simulator for tuning configure_profile().
+
+Replays whole risk / drift series through the same SSI and damped
+threshold recursion as realtime_main.process_event (replay mode
+decisions: block when risk > threshold) with array operations
+instead of one event at a time:
+
+- rolling variances and the mode switch rate come from cumulative
+  sums, computed once per series
+- the threshold recursion without its clamp is a first-order IIR
+  filter, thr = BASE + SSI_GAIN * F_damping(ssi), so one filter
+  pass serves every SSI_GAIN and MIN_THRESHOLD; settings where the
+  clamp would bind are re-run exactly, sequentially
+
+Per-IP trust feeds back through block decisions and cannot be
+vectorised; the simulator takes the average trust as an input
+series (a constant 0.7, the starting trust, by default).
+
+    python -m src.realtime.governance_sim --synthetic 1000000 --out grid.json
+    python -m src.realtime.governance_sim --input series.csv --workers 8
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Optional C implementation of the recursion
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+# Mirrors realtime_main
+BASE_THRESHOLD = 150
+MAX_THRESHOLD = 200
+RISK_WINDOW = 50
+DRIFT_WINDOW = 20
+MODE_WINDOW = 50
+DEFAULT_TRUST = 0.7
+
+SCAN_BLOCK = 256    # block length for the NumPy filter fallback
+
+DEFAULT_GRID = {
+    "ssi_gain": [5, 10, 15, 20, 25, 30, 35, 40, 45, 50],
+    "damping": [0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5],
+    "trust_gov_gain": [0.0, 0.1, 0.3, 0.5, 0.75],
+    "min_threshold": [130, 140, 145, 150],
+}
+
+
+# =========================================================
+# PER-SERIES QUANTITIES (parameter independent)
+# =========================================================
+
+def rolling_variance(x, window):
+    """
+    Population variance of the last `window` values at every index,
+    over however many values exist so far (0 until there are two),
+    as compute_variance() sees the deque.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+
+    # Shift by the mean so the sum-of-squares form keeps its precision
+    centred = x - x.mean() if n else x
+    s1 = np.concatenate(([0.0], np.cumsum(centred)))
+    s2 = np.concatenate(([0.0], np.cumsum(centred * centred)))
+
+    end = np.arange(1, n + 1)
+    start = np.maximum(0, end - window)
+    count = end - start
+
+    mean = (s1[end] - s1[start]) / count
+    var = (s2[end] - s2[start]) / count - mean * mean
+    var = np.maximum(var, 0.0)
+    var[count < 2] = 0.0
+    return var
+
+
+def drift_modes(drift):
+    """update_mode(): 0 STABLE, 1 ALERT, 2 DEFENSIVE."""
+
+    return np.digitize(drift, (0.1, 0.2))
+
+
+def mode_switch_rate(modes, window=MODE_WINDOW):
+    """compute_mode_switch_rate() at every index."""
+
+    n = len(modes)
+    switches = np.zeros(n)
+    switches[1:] = modes[1:] != modes[:-1]
+    cumulative = np.concatenate(([0.0], np.cumsum(switches)))
+
+    end = np.arange(1, n + 1)
+    count = np.minimum(end, window)
+    first = end - count
+    # Switches between consecutive entries inside the window only
+    rate = (cumulative[end] - cumulative[first + 1]) / count
+    rate[count < 2] = 0.0
+    return rate
+
+
+class Series:
+    """Risk / drift / trust arrays plus everything SSI needs from them."""
+
+    def __init__(self, risk, drift, trust=None):
+        self.risk = np.asarray(risk, dtype=np.float64)
+        self.drift = np.asarray(drift, dtype=np.float64)
+        if len(self.risk) != len(self.drift):
+            raise ValueError("risk and drift series must have the same length")
+
+        if trust is None:
+            trust = np.full(len(self.risk), DEFAULT_TRUST)
+        self.trust = np.asarray(trust, dtype=np.float64)
+
+        self.risk_var = rolling_variance(self.risk, RISK_WINDOW)
+        self.drift_norm = np.minimum(rolling_variance(self.drift, DRIFT_WINDOW) / 0.05, 1)
+        self.modes = drift_modes(self.drift)
+        self.mode_rate = mode_switch_rate(self.modes)
+
+    def __len__(self):
+        return len(self.risk)
+
+    def ssi(self, trust_gov_gain):
+        multiplier = 1 + trust_gov_gain * (1 - self.trust)
+        risk_norm = np.minimum(self.risk_var * multiplier / 1000, 1)
+        ssi = 0.5 * risk_norm + 0.3 * self.drift_norm + 0.2 * self.mode_rate
+        return np.minimum(ssi, 1)
+
+
+# =========================================================
+# THRESHOLD RECURSION
+# =========================================================
+
+def damped_response(u, damping):
+    """y[t] = (1 - d) * y[t-1] + d * u[t], y[-1] = 0."""
+
+    a = 1.0 - damping
+    if lfilter is not None:
+        return lfilter([damping], [1.0, -a], u)
+
+    # Blocked scan: each block is a matrix product with zero initial
+    # state, then block carries are propagated and added back
+    n = len(u)
+    if n == 0:
+        return np.zeros(0)
+    blocks = -(-n // SCAN_BLOCK)
+    padded = np.zeros(blocks * SCAN_BLOCK)
+    padded[:n] = u
+    U = padded.reshape(blocks, SCAN_BLOCK)
+
+    lag = np.arange(SCAN_BLOCK)[:, None] - np.arange(SCAN_BLOCK)[None, :]
+    with np.errstate(under="ignore"):
+        kernel = np.where(lag >= 0, damping * a ** np.maximum(lag, 0), 0.0)
+        decay = a ** np.arange(1, SCAN_BLOCK + 1)
+    Y = U @ kernel.T
+
+    carry = 0.0
+    for k in range(blocks):
+        if carry:
+            Y[k] += carry * decay
+        carry = Y[k, -1]
+
+    return Y.reshape(-1)[:n]
+
+
+def clamped_thresholds(ssi, ssi_gain, damping, min_threshold):
+    """Exact governance_controller() recursion, clamp included."""
+
+    target = (BASE_THRESHOLD + ssi_gain * ssi).tolist()
+    keep = 1 - damping
+    threshold = float(BASE_THRESHOLD)
+    out = np.empty(len(target))
+
+    for i, value in enumerate(target):
+        threshold = keep * threshold + damping * value
+        if threshold > MAX_THRESHOLD:
+            threshold = MAX_THRESHOLD
+        elif threshold < min_threshold:
+            threshold = min_threshold
+        out[i] = threshold
+
+    return out
+
+
+def thresholds(response, ssi, ssi_gain, damping, min_threshold):
+    """
+    Threshold series for one setting. With y[-1] = BASE the recursion
+    is BASE + ssi_gain * response; only if that leaves
+    [min_threshold, MAX_THRESHOLD] does the clamp change anything.
+    """
+
+    thr = BASE_THRESHOLD + ssi_gain * response
+    if len(thr) and (thr.max() > MAX_THRESHOLD or thr.min() < min_threshold):
+        return clamped_thresholds(ssi, ssi_gain, damping, min_threshold), True
+    return thr, False
+
+
+def summarise(risk, thr):
+    blocked = risk > thr
+    n = len(risk)
+    step = np.abs(np.diff(thr))
+
+    return {
+        "block_rate": round(float(blocked.mean()), 6) if n else 0.0,
+        "decision_switch_rate": round(
+            float((blocked[1:] != blocked[:-1]).mean()), 6) if n > 1 else 0.0,
+        "threshold_mean": round(float(thr.mean()), 4) if n else 0.0,
+        "threshold_std": round(float(thr.std()), 4) if n else 0.0,
+        "threshold_mean_step": round(float(step.mean()), 6) if n > 1 else 0.0,
+        "threshold_max_step": round(float(step.max()), 6) if n > 1 else 0.0,
+    }
+
+
+def simulate(series, ssi_gain, damping, trust_gov_gain, min_threshold):
+    """One profile setting over the whole series."""
+
+    ssi = series.ssi(trust_gov_gain)
+    response = damped_response(ssi, damping)
+    thr, clamped = thresholds(response, ssi, ssi_gain, damping, min_threshold)
+
+    result = summarise(series.risk, thr)
+    result["clamped"] = clamped
+    return result, thr
+
+
+# =========================================================
+# GRID SWEEP
+# =========================================================
+
+_series = None
+
+
+def _init_worker(risk, drift, trust):
+    global _series
+    _series = Series(risk, drift, trust)
+
+
+def _sweep_group(trust_gov_gain, damping, ssi_gains, min_thresholds):
+    """Every (ssi_gain, min_threshold) sharing one SSI and filter pass."""
+
+    series = _series
+    ssi = series.ssi(trust_gov_gain)
+    response = damped_response(ssi, damping)
+
+    rows = []
+    for ssi_gain, min_threshold in itertools.product(ssi_gains, min_thresholds):
+        thr, clamped = thresholds(response, ssi, ssi_gain, damping, min_threshold)
+        row = {
+            "ssi_gain": ssi_gain,
+            "damping": damping,
+            "trust_gov_gain": trust_gov_gain,
+            "min_threshold": min_threshold,
+            "clamped": clamped,
+        }
+        row.update(summarise(series.risk, thr))
+        rows.append(row)
+    return rows
+
+
+def sweep(risk, drift, grid=None, trust=None, workers=None):
+    grid = grid or DEFAULT_GRID
+    groups = list(itertools.product(grid["trust_gov_gain"], grid["damping"]))
+
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(risk, drift, trust),
+    ) as pool:
+        futures = [
+            pool.submit(_sweep_group, g, d, grid["ssi_gain"], grid["min_threshold"])
+            for g, d in groups
+        ]
+        rows = [row for future in futures for row in future.result()]
+
+    return rows
+
+
+# =========================================================
+# INPUT
+# =========================================================
+
+def synthetic_series(n, seed=0):
+    """Distributions replay_mode draws from."""
+
+    rng = np.random.default_rng(seed)
+    return rng.uniform(5, 220, n), rng.uniform(0, 0.3, n), None
+
+
+def load_series(path):
+    """.npz with risk / drift [/ trust] arrays, or CSV with those columns."""
+
+    if path.endswith(".npz"):
+        data = np.load(path)
+        return data["risk"], data["drift"], data["trust"] if "trust" in data else None
+
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    risk = np.array([float(r["risk"]) for r in rows])
+    drift = np.array([float(r["drift"]) for r in rows])
+    trust = (
+        np.array([float(r["trust"]) for r in rows])
+        if rows and "trust" in rows[0] else None
+    )
+    return risk, drift, trust
+
+
+def parse_grid(spec):
+    """'ssi_gain=10,20;damping=0.1,0.2' overrides the default axes."""
+
+    grid = {key: list(values) for key, values in DEFAULT_GRID.items()}
+    for part in filter(None, (spec or "").split(";")):
+        name, _, values = part.partition("=")
+        name = name.strip()
+        if name not in grid:
+            raise ValueError(f"Unknown grid axis: {name}")
+        grid[name] = [float(v) for v in values.split(",")]
+    return grid
+
+
+# ---------------- ENTRY ----------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="CSV or .npz with risk, drift[, trust]")
+    source.add_argument("--synthetic", type=int, help="events of replay-mode noise")
+    parser.add_argument("--grid", default=None,
+                        help="e.g. 'ssi_gain=10,20,30;min_threshold=140,145'")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default="governance_grid.json")
+    args = parser.parse_args()
+
+    if args.input:
+        risk, drift, trust = load_series(args.input)
+    else:
+        risk, drift, trust = synthetic_series(args.synthetic, args.seed)
+
+    grid = parse_grid(args.grid)
+    settings = 1
+    for values in grid.values():
+        settings *= len(values)
+
+    start = time.perf_counter()
+    rows = sweep(risk, drift, grid, trust, args.workers)
+    elapsed = time.perf_counter() - start
+
+    with open(args.out, "w") as f:
+        json.dump({
+            "events": len(risk),
+            "settings": settings,
+            "seconds": round(elapsed, 2),
+            "scipy": lfilter is not None,
+            "rows": rows,
+        }, f)
+
+    print(f"{settings} settings x {len(risk)} events in {elapsed:.1f}s -> {args.out}")
+    print("Most stable thresholds:")
+    for row in sorted(rows, key=lambda r: r["threshold_std"])[:args.top]:
+        print(json.dumps(row))
@@ -0,0 +1,172 @@
+import heapq
+import itertools
+
+from .metric_types import MetricFamily
+
+DEFAULT_CAPACITY = 256
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter sketch (Metwally et al.)
+
+    - Holds at most `capacity` counters regardless of how many
+      distinct keys are seen
+    - Every key with true weight > total / capacity is guaranteed
+      to be present
+    - count - error is a lower bound on the true weight
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counters = {}   # key -> [count, error]
+        self.heap = []       # (count_at_push, seq, key), one entry per key
+        self.total = 0
+        self._seq = itertools.count()
+
+    def update(self, key, weight=1):
+        self.total += weight
+
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+            return
+
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0]
+            heapq.heappush(self.heap, (weight, next(self._seq), key))
+            return
+
+        # Evict the current minimum. Heap entries are lazily refreshed:
+        # counts only grow, so a stale entry is re-pushed with its real
+        # count until the true minimum surfaces.
+        while True:
+            count, _, victim = self.heap[0]
+            real = self.counters[victim][0]
+            if count == real:
+                break
+            heapq.heapreplace(self.heap, (real, next(self._seq), victim))
+
+        heapq.heapreplace(self.heap, (real + weight, next(self._seq), key))
+        del self.counters[victim]
+        self.counters[key] = [real + weight, real]
+
+    def merge(self, other):
+        """
+        Fold another sketch (e.g. another worker's) into this one.
+
+        A full sketch that lacks a key may have evicted up to its
+        minimum count of it, so that minimum is added to the key's
+        count and error; the merged counts keep both bounds.
+        """
+
+        floors = []
+        for sketch in (self, other):
+            full = sketch.counters and len(sketch.counters) >= sketch.capacity
+            floors.append(min(c[0] for c in sketch.counters.values()) if full else 0)
+
+        merged = {}
+        for key in self.counters.keys() | other.counters.keys():
+            count = error = 0
+            for sketch, floor in zip((self, other), floors):
+                counter = sketch.counters.get(key)
+                if counter is None:
+                    count += floor
+                    error += floor
+                else:
+                    count += counter[0]
+                    error += counter[1]
+            merged[key] = [count, error]
+
+        kept = heapq.nlargest(self.capacity, merged.items(), key=lambda item: item[1][0])
+        self.counters = dict(kept)
+        self.heap = [(counter[0], next(self._seq), key) for key, counter in kept]
+        heapq.heapify(self.heap)
+        self.total += other.total
+
+    def top(self, k=10):
+        # list() copies under the GIL, so readers never see the
+        # dict change size mid-iteration
+        items = heapq.nlargest(
+            k,
+            list(self.counters.items()),
+            key=lambda item: item[1][0]
+        )
+        return [
+            {"key": key, "count": count, "error": error}
+            for key, (count, error) in items
+        ]
+
+    def reset(self):
+        self.counters.clear()
+        self.heap.clear()
+        self.total = 0
+
+
+class TopTalkers:
+    """
+    Tracks top source IPs, destination ports and 5-tuples
+    by packets and by bytes with fixed memory.
+    """
+
+    DIMENSIONS = ("src_ip", "dst_port", "flow")
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.sketches = {
+            (dim, unit): SpaceSaving(capacity)
+            for dim in self.DIMENSIONS
+            for unit in ("packets", "bytes")
+        }
+
+    def observe(self, flow_id, pkt_len):
+        src, dst, sport, dport, proto = flow_id
+        s = self.sketches
+
+        s["src_ip", "packets"].update(src)
+        s["src_ip", "bytes"].update(src, pkt_len)
+        s["dst_port", "packets"].update(dport)
+        s["dst_port", "bytes"].update(dport, pkt_len)
+        s["flow", "packets"].update(flow_id)
+        s["flow", "bytes"].update(flow_id, pkt_len)
+
+    def snapshot(self, k=10):
+        result = {}
+        for (dim, unit), sketch in self.sketches.items():
+            rows = sketch.top(k)
+            for row in rows:
+                if dim == "flow":
+                    row["key"] = "{}:{}->{}:{}/{}".format(
+                        row["key"][0], row["key"][2],
+                        row["key"][1], row["key"][3],
+                        row["key"][4]
+                    )
+                else:
+                    row["key"] = str(row["key"])
+            result.setdefault(dim, {})[unit] = rows
+        return result
+
+    def collect_metrics(self, k=10):
+        families = {
+            unit: MetricFamily(
+                f"ids_top_talker_{unit}",
+                "gauge",
+                f"Space-Saving estimate of {unit} for the top keys per dimension",
+                ("dim", "key"),
+            )
+            for unit in ("packets", "bytes")
+        }
+
+        for dim, units in self.snapshot(k).items():
+            for unit, rows in units.items():
+                for row in rows:
+                    families[unit].add((dim, row["key"]), row["count"])
+
+        return list(families.values())
+
+    def reset(self):
+        for sketch in self.sketches.values():
+            sketch.reset()
+
+
+# Shared instance fed from features.update_flow and the live packet handler
+top_talkers = TopTalkers()
@@ -0,0 +1,218 @@
+import os
+import socket
+import threading
+import time
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ALLOW_LIST_PATH = os.path.join(BASE, "config", "allowlist.txt")
+BLOCK_LIST_PATH = os.path.join(BASE, "config", "blocklist.txt")
+
+RELOAD_CHECK_INTERVAL = 10  # seconds between list file mtime checks
+
+ALLOW = "allow"
+BLOCK = "block"
+
+# Ranges that are never scored or blocked, even without an allow list file
+DEFAULT_ALLOW = (
+    "127.0.0.0/8",
+    "0.0.0.0/32",
+    "::1/128",
+)
+
+
+# =========================================================
+# LONGEST-PREFIX-MATCH TRIE
+# =========================================================
+
+def parse_ip(ip):
+    """Return (version, int) for an IPv4/IPv6 string, or (None, None)."""
+
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, TypeError):
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    except (OSError, TypeError):
+        return None, None
+
+
+class PrefixTrie:
+    """
+    Longest-prefix-match table for IPv4 and IPv6 CIDRs.
+
+    Each level of the binary trie is stored as a hash of the
+    prefixes of that length (level-compressed), so memory is one
+    dict entry per CIDR and a lookup is at most one probe per
+    populated prefix length, longest first.
+    """
+
+    BITS = {4: 32, 6: 128}
+
+    def __init__(self):
+        self.levels = {4: {}, 6: {}}    # version -> prefix_len -> {net: value}
+        self.lengths = {4: [], 6: []}   # populated prefix lengths, longest first
+        self.size = 0
+
+    def insert(self, cidr, value):
+        addr, _, plen = cidr.partition("/")
+        version, number = parse_ip(addr)
+        if version is None:
+            raise ValueError(f"Invalid CIDR: {cidr}")
+
+        bits = self.BITS[version]
+        plen = int(plen) if plen else bits
+        if not 0 <= plen <= bits:
+            raise ValueError(f"Invalid prefix length: {cidr}")
+
+        key = number >> (bits - plen)
+
+        level = self.levels[version].get(plen)
+        if level is None:
+            level = self.levels[version][plen] = {}
+            self.lengths[version] = sorted(self.levels[version], reverse=True)
+
+        if key not in level:
+            self.size += 1
+        level[key] = value
+
+    def lookup(self, ip):
+        """Return the value of the longest matching prefix, or None."""
+
+        version, value = parse_ip(ip)
+        if version is None:
+            return None
+
+        bits = self.BITS[version]
+        levels = self.levels[version]
+
+        for plen in self.lengths[version]:
+            hit = levels[plen].get(value >> (bits - plen))
+            if hit is not None:
+                return hit
+
+        return None
+
+    def __len__(self):
+        return self.size
+
+
+# =========================================================
+# ALLOW / BLOCK POLICY
+# =========================================================
+
+def read_cidr_file(path):
+    """Yield CIDRs from a list file: one per line, '#' starts a comment."""
+
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                yield line.split()[0]
+
+
+def default_trie():
+    trie = PrefixTrie()
+    for cidr in DEFAULT_ALLOW:
+        trie.insert(cidr, ALLOW)
+    return trie
+
+
+class IpPolicy:
+    """
+    Allow and block lists merged into one trie, so the most
+    specific matching range decides (a /32 allow inside a /16
+    block list entry wins).
+
+    Only DEFAULT_ALLOW applies until load() reads the list files;
+    the sensor calls it at startup, and reload_if_changed() picks
+    the files up on first use elsewhere.
+    """
+
+    def __init__(self, allow_path=ALLOW_LIST_PATH, block_path=BLOCK_LIST_PATH):
+        self.allow_path = allow_path
+        self.block_path = block_path
+
+        self.trie = default_trie()
+        self.mtimes = {}
+        self.last_check = 0.0
+        self.reloading = False
+
+        self.load_time_ms = 0.0
+
+    def load(self):
+        start = time.perf_counter()
+
+        trie = default_trie()
+        mtimes = {}
+        invalid = 0
+
+        # Block list first so an explicit allow for the same CIDR wins
+        for path, value in (
+            (self.block_path, BLOCK),
+            (self.allow_path, ALLOW),
+        ):
+            if not path or not os.path.exists(path):
+                continue
+
+            mtimes[path] = os.path.getmtime(path)
+
+            for cidr in read_cidr_file(path):
+                try:
+                    trie.insert(cidr, value)
+                except ValueError:
+                    invalid += 1
+
+        # Swap in one assignment so lookups never see a half-built trie
+        self.trie = trie
+        self.mtimes = mtimes
+        self.load_time_ms = (time.perf_counter() - start) * 1000
+
+        print(
+            f"[POLICY] Loaded {len(trie)} ranges "
+            f"in {self.load_time_ms:.1f} ms"
+            + (f" ({invalid} invalid skipped)" if invalid else "")
+        )
+
+    def reload_if_changed(self, now=None):
+        """
+        Rebuild in a background thread when a list file changed.
+        The old trie keeps serving lookups until the swap.
+        """
+
+        now = time.time() if now is None else now
+        if self.reloading or now - self.last_check < RELOAD_CHECK_INTERVAL:
+            return False
+        self.last_check = now
+
+        for path in (self.allow_path, self.block_path):
+            exists = path and os.path.exists(path)
+            mtime = os.path.getmtime(path) if exists else None
+            if mtime != self.mtimes.get(path):
+                self.reloading = True
+                threading.Thread(target=self._reload, daemon=True).start()
+                return True
+
+        return False
+
+    def _reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            print("Policy reload error:", e)
+        finally:
+            self.reloading = False
+
+    def lookup(self, ip):
+        return self.trie.lookup(ip)
+
+    def is_allowed(self, ip):
+        return self.lookup(ip) == ALLOW
+
+    def is_blocked(self, ip):
+        return self.lookup(ip) == BLOCK
+
+
+# Shared instance consulted by realtime_main and the enforcer;
+# realtime_main loads the list files at startup
+ip_policy = IpPolicy()
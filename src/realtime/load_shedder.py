@@ -0,0 +1,158 @@
+import time
+import zlib
+
+from .metric_types import MetricFamily
+
+EVAL_INTERVAL = 1.0     # seconds between controller decisions
+
+HIGH_WATER = 0.9        # load above this is overload
+LOW_WATER = 0.6         # load below this lets coverage recover
+TARGET_LOAD = 0.75      # load the sampling rate is sized for
+
+MAX_LAG = 1.0           # seconds a packet may wait before we call it backlog
+MIN_SAMPLE_RATE = 0.01
+RECOVERY_STEP = 1.5     # multiplicative sample-rate increase per interval
+
+# Cheap-rule thresholds under which a flow counts as low risk
+LOW_RISK_PKT_RATE = 100
+LOW_RISK_SYN = 3
+
+
+def cheap_low_risk(features):
+    """Cheap rules that make the ANN unnecessary for a flow."""
+
+    return (
+        features.get("Flow Pkts/s", 0) < LOW_RISK_PKT_RATE and
+        features.get("SYN Flag Cnt", 0) < LOW_RISK_SYN and
+        features.get("RST Flag Cnt", 0) == 0
+    )
+
+
+class OverloadController:
+    """
+    Adaptive load shedding for the packet pipeline.
+
+    Load is (arrival rate x mean service time x sample rate), with
+    service time taken from PerformanceBenchmark.stop_timer(); packet
+    lag (now - capture timestamp) stands in for scapy's hidden queue.
+
+    Under overload it first skips the ANN for flows the cheap rules
+    call low risk, then samples flows by a deterministic hash of the
+    5-tuple. Coverage is restored step by step as load drops.
+    """
+
+    def __init__(self):
+        self.sample_rate = 1.0
+        self.ann_shedding = False
+
+        self.window_start = None
+        self.window_seen = 0
+        self.window_latency = 0.0
+        self.window_processed = 0
+        self.max_lag = 0.0
+
+        self.load = 0.0
+        self.lag = 0.0
+        self.shed_packets = 0
+        self.ann_skipped = 0
+
+    # ---------------- ADMISSION ----------------
+
+    def admit(self, flow_id):
+        self.window_seen += 1
+
+        if self.sample_rate >= 1.0:
+            return True
+
+        src, dst, sport, dport, proto = flow_id
+        # Order endpoints so both directions of a flow hash the same
+        a, b = sorted(((str(src), sport), (str(dst), dport)))
+        h = zlib.crc32(f"{a[0]}:{a[1]}|{b[0]}:{b[1]}|{proto}".encode())
+
+        if h < self.sample_rate * 0xFFFFFFFF:
+            return True
+
+        self.shed_packets += 1
+        return False
+
+    def skip_ann(self, features):
+        if self.ann_shedding and cheap_low_risk(features):
+            self.ann_skipped += 1
+            return True
+        return False
+
+    # ---------------- FEEDBACK ----------------
+
+    def observe(self, latency_ms, lag=0.0, now=None):
+        self.window_latency += latency_ms / 1000
+        self.window_processed += 1
+        if lag > self.max_lag:
+            self.max_lag = lag
+
+        now = time.time() if now is None else now
+        if self.window_start is None:
+            self.window_start = now
+        elif now - self.window_start >= EVAL_INTERVAL:
+            self._evaluate(now)
+
+    def _evaluate(self, now):
+        elapsed = now - self.window_start
+        arrival_rate = self.window_seen / elapsed
+        service_time = self.window_latency / max(self.window_processed, 1)
+
+        full_load = arrival_rate * service_time
+        self.load = full_load * self.sample_rate
+        self.lag = self.max_lag
+
+        if self.load > HIGH_WATER or self.lag > MAX_LAG:
+            if not self.ann_shedding:
+                self.ann_shedding = True
+            else:
+                rate = TARGET_LOAD / full_load if full_load else 1.0
+                if self.lag > MAX_LAG:
+                    # Drain the backlog, not just keep up with it
+                    rate = min(rate, self.sample_rate / 2)
+                self.sample_rate = max(
+                    MIN_SAMPLE_RATE,
+                    min(self.sample_rate, rate)
+                )
+
+        elif self.load < LOW_WATER:
+            if self.sample_rate < 1.0:
+                rate = self.sample_rate * RECOVERY_STEP
+                if full_load:
+                    rate = min(rate, TARGET_LOAD / full_load)
+                self.sample_rate = min(1.0, max(rate, self.sample_rate))
+            else:
+                self.ann_shedding = False
+
+        self.window_start = now
+        self.window_seen = 0
+        self.window_latency = 0.0
+        self.window_processed = 0
+        self.max_lag = 0.0
+
+    def collect_metrics(self):
+        return [
+            MetricFamily(name, kind, help_text).add((), value)
+            for name, kind, help_text, value in (
+                ("ids_sample_rate", "gauge",
+                 "Fraction of flows currently scored", self.sample_rate),
+                ("ids_ann_shedding", "gauge",
+                 "1 while the ANN is skipped for low-risk flows",
+                 int(self.ann_shedding)),
+                ("ids_pipeline_load", "gauge",
+                 "Estimated pipeline utilisation", self.load),
+                ("ids_pipeline_lag_seconds", "gauge",
+                 "Worst capture-to-processing lag in the last interval",
+                 self.lag),
+                ("ids_shed_packets_total", "counter",
+                 "Packets dropped by flow sampling", self.shed_packets),
+                ("ids_ann_skipped_total", "counter",
+                 "Flows scored without the ANN", self.ann_skipped),
+            )
+        ]
+
+
+# Shared instance used by the capture paths and detect.predict
+overload = OverloadController()
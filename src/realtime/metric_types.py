@@ -0,0 +1,313 @@
+import bisect
+import math
+import threading
+
+# Default latency buckets in seconds (Prometheus client defaults + sub-ms)
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+# =========================================================
+# PER-THREAD CELLS
+# =========================================================
+
+class ThreadCells:
+    """
+    One small list of numbers per writing thread.
+
+    The hot path only touches its own thread's cell, so it takes
+    no lock; a scrape sums all cells. The lock is only taken the
+    first time a thread writes.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.cells = []
+        self.lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = [0] * self.size
+            with self.lock:
+                self.cells.append(cell)
+            self.local.cell = cell
+            return cell
+
+    def totals(self):
+        with self.lock:
+            cells = list(self.cells)
+        totals = [0] * self.size
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+# =========================================================
+# METRIC TYPES
+# =========================================================
+
+def format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+        return repr(value)
+    return str(value)
+
+
+def escape_label(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{n}="{escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.extend(f'{n}="{escape_label(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class MetricFamily:
+    """A named set of samples ready for exposition (used by collectors)."""
+
+    def __init__(self, name, kind, help_text, labelnames=()):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.samples = []   # (suffix, label values, extra labels, value)
+
+    def add(self, labelvalues, value, suffix="", extra=None):
+        self.samples.append((suffix, tuple(labelvalues), extra, value))
+        return self
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, values, extra, value in self.samples:
+            lines.append(
+                f"{self.name}{suffix}"
+                f"{format_labels(self.labelnames, values, extra)} "
+                f"{format_value(value)}"
+            )
+        return lines
+
+
+class _Metric:
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+
+        if not self.labelnames:
+            self._default = self._new_child()
+            self.children[()] = self._default
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.children[values] = self._new_child()
+        return child
+
+    def collect(self):
+        family = MetricFamily(self.name, self.kind, self.help, self.labelnames)
+        for values, child in list(self.children.items()):
+            child.collect(family, values)
+        return family
+
+
+class _CounterChild:
+
+    __slots__ = ("cells",)
+
+    def __init__(self):
+        self.cells = ThreadCells(1)
+
+    def inc(self, amount=1):
+        self.cells.cell()[0] += amount
+
+    def value(self):
+        return self.cells.totals()[0]
+
+    def collect(self, family, values):
+        family.add(values, self.value())
+
+
+class Counter(_Metric):
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def value(self):
+        return self._default.value()
+
+
+class _GaugeChild:
+
+    __slots__ = ("current", "function")
+
+    def __init__(self):
+        self.current = 0
+        self.function = None
+
+    def set(self, value):
+        self.current = value
+
+    def set_function(self, function):
+        """Evaluate `function()` at scrape time instead of storing a value."""
+        self.function = function
+
+    def value(self):
+        return self.function() if self.function else self.current
+
+    def collect(self, family, values):
+        family.add(values, self.value())
+
+
+class Gauge(_Metric):
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+    def value(self):
+        return self._default.value()
+
+
+class _HistogramChild:
+
+    __slots__ = ("bounds", "cells")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # one slot per bucket, +Inf bucket, then the running sum
+        self.cells = ThreadCells(len(bounds) + 2)
+
+    def observe(self, value):
+        cell = self.cells.cell()
+        cell[bisect.bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self):
+        totals = self.cells.totals()
+        return totals[:-1], totals[-1]
+
+    def collect(self, family, values):
+        counts, total = self.snapshot()
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            family.add(values, cumulative, "_bucket", (("le", format_value(float(bound))),))
+        family.add(values, total, "_sum")
+        family.add(values, cumulative, "_count")
+
+
+class Histogram(_Metric):
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+# =========================================================
+# REGISTRY
+# =========================================================
+
+class CollectorRegistry:
+    """
+    Holds metrics plus collector callbacks and renders the
+    Prometheus text exposition format (version 0.0.4).
+
+    A scrape sums per-thread cells, so its cost depends on the
+    number of series and threads, never on the event rate.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector):
+        """`collector()` returns an iterable of MetricFamily."""
+        with self.lock:
+            self.collectors.append(collector)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def collect(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+
+        families = [metric.collect() for metric in metrics]
+        for collector in collectors:
+            families.extend(collector())
+        return families
+
+    def expose(self):
+        lines = []
+        for family in self.collect():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
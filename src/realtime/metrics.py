@@ -1,50 +1,71 @@
-from collections import defaultdict
-import threading
+from .metric_types import CollectorRegistry
+from .heavy_hitters import top_talkers
+from .prefilter import prefilter
+from .load_shedder import overload
+from .benchmark import pipeline_benchmark
+from .spool import spool, drainer
+from .checkpoint import checkpointer
+from .afpacket import ring
+from .aggregator import aggregator
+
+RISK_BUCKETS = (10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 150, 200)
+
 
 class MetricsRegistry:
+    """
+    Detection metrics on top of lock-free per-thread cells.
+
+    record_* calls only touch the calling thread's cell; the
+    values are summed when export_metrics() renders a scrape.
+    """
 
     def __init__(self):
-        self.lock = threading.Lock()
+        self.registry = CollectorRegistry()
+        r = self.registry
+
+        self.total_flows = r.counter(
+            "ids_total_flows", "Flows seen by the detector, allow-listed included")
+        self.total_blocks = r.counter(
+            "ids_total_blocks", "Block decisions taken")
+        self.attack_type_counts = r.counter(
+            "ids_attack_type_total",
+            "Block decisions per attack type (blocklist / risk in the sensor)", ("type",))
+        self.risk_sum = r.counter(
+            "ids_risk_score_sum_total", "Sum of all flow risk scores")
+
+        self.current_drift_score = r.gauge(
+            "ids_current_drift_score", "Latest drift score")
+        self.avg_risk = r.gauge(
+            "ids_average_risk", "Mean risk score over all flows")
+        self.avg_risk.set_function(self._average_risk)
 
-        self.total_flows = 0
-        self.total_blocks = 0
-        self.attack_type_counts = defaultdict(int)
-        self.current_drift_score = 0
-        self.avg_risk = 0
-        self.risk_samples = 0
+        self.risk = r.histogram(
+            "ids_risk_score", "Distribution of flow risk scores",
+            buckets=RISK_BUCKETS)
+
+        for source in (top_talkers, prefilter, overload, pipeline_benchmark,
+                       spool, drainer, checkpointer, ring,
+                       aggregator):
+            r.register_collector(source.collect_metrics)
+
+    def _average_risk(self):
+        flows = self.total_flows.value()
+        return round(self.risk_sum.value() / flows, 2) if flows else 0
 
     def record_flow(self, risk_score):
-        with self.lock:
-            self.total_flows += 1
-            self.risk_samples += 1
-            self.avg_risk = (
-                (self.avg_risk * (self.risk_samples - 1) + risk_score)
-                / self.risk_samples
-            )
+        self.total_flows.inc()
+        self.risk_sum.inc(risk_score)
+        self.risk.observe(risk_score)
 
     def record_block(self):
-        with self.lock:
-            self.total_blocks += 1
+        self.total_blocks.inc()
 
     def record_attack_type(self, attack_type):
         if attack_type != "NONE":
-            with self.lock:
-                self.attack_type_counts[attack_type] += 1
+            self.attack_type_counts.labels(attack_type).inc()
 
     def update_drift(self, drift_score):
-        with self.lock:
-            self.current_drift_score = drift_score
+        self.current_drift_score.set(drift_score)
 
     def export_metrics(self):
-        with self.lock:
-            lines = []
-
-            lines.append(f"ids_total_flows {self.total_flows}")
-            lines.append(f"ids_total_blocks {self.total_blocks}")
-            lines.append(f"ids_current_drift_score {self.current_drift_score}")
-            lines.append(f"ids_average_risk {round(self.avg_risk,2)}")
-
-            for attack, count in self.attack_type_counts.items():
-                lines.append(f'ids_attack_type_total{{type="{attack}"}} {count}')
-
-            return "\n".join(lines)
+        return self.registry.expose()
@@ -1,25 +1,107 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import ipaddress
+import json
+import os
 import threading
+from urllib.parse import urlsplit, parse_qs
+from .heavy_hitters import top_talkers
+from .metric_types import CollectorRegistry
+from . import profiler
+
+# /debug/* is off unless enabled, and then only answers loopback clients:
+# profiles and allocation sites expose code paths and data
+DEBUG_ENDPOINTS = os.environ.get("IDS_DEBUG_ENDPOINTS", "0") == "1"
+
+
+def is_loopback(client_ip):
+    try:
+        return ipaddress.ip_address(client_ip).is_loopback
+    except ValueError:
+        return False
+
 
 def start_metrics_server(metrics_registry, port=8000):
 
     class MetricsHandler(BaseHTTPRequestHandler):
 
+        def send_body(self, body, content_type):
+            accept = self.headers.get("Accept-Encoding", "")
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            if "gzip" in accept:
+                body = gzip.compress(body, compresslevel=5)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_error_text(self, status, message):
+            body = message.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
         def do_GET(self):
-            if self.path == "/metrics":
-                metrics_data = metrics_registry.export_metrics()
+            url = urlsplit(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
 
-                self.send_response(200)
-                self.send_header("Content-type", "text/plain")
-                self.end_headers()
-                self.wfile.write(metrics_data.encode())
+            if url.path == "/metrics":
+                metrics_data = metrics_registry.export_metrics()
+                self.send_body(
+                    metrics_data.encode(),
+                    CollectorRegistry.CONTENT_TYPE
+                )
+            elif url.path == "/top-talkers":
+                body = json.dumps(top_talkers.snapshot()).encode()
+                self.send_body(body, "application/json")
+            elif url.path.startswith("/debug/") and not DEBUG_ENDPOINTS:
+                self.send_error_text(404, "debug endpoints are off (IDS_DEBUG_ENDPOINTS=1)")
+            elif url.path.startswith("/debug/") and not is_loopback(self.client_address[0]):
+                self.send_error_text(403, "debug endpoints only answer localhost")
+            elif url.path == "/debug/profile":
+                # Collapsed stacks: flamegraph.pl profile.txt > profile.svg
+                try:
+                    seconds = float(query.get("seconds", 10))
+                    stacks, _ = profiler.profile(seconds)
+                except ValueError:
+                    self.send_error_text(400, "seconds must be a number")
+                    return
+                except profiler.ProfilerBusy as e:
+                    self.send_error_text(409, str(e))
+                    return
+                self.send_body(profiler.render_collapsed(stacks).encode(), "text/plain")
+            elif url.path == "/debug/tracemalloc":
+                try:
+                    top = int(query.get("top", 25))
+                    if top < 0:
+                        raise ValueError
+                except ValueError:
+                    self.send_error_text(400, "top must be a non-negative integer")
+                    return
+                group_by = query.get("group", "lineno")
+                if group_by not in ("lineno", "filename", "traceback"):
+                    self.send_error_text(400, "group must be lineno, filename or traceback")
+                    return
+                result = profiler.allocations(top, group_by, stop="stop" in query)
+                self.send_body(json.dumps(result, indent=2).encode(), "application/json")
             else:
                 self.send_response(404)
                 self.end_headers()
 
-    server = HTTPServer(("0.0.0.0", port), MetricsHandler)
+        def log_message(self, format, *args):
+            # One line per scrape would flood the detector's console
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    server.daemon_threads = True
 
     thread = threading.Thread(target=server.serve_forever, daemon=True)
     thread.start()
 
     print(f"📊 Metrics server running at http://localhost:{port}/metrics")
+
+    return server
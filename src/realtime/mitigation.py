@@ -1,8 +1,7 @@
-import os
-import platform
+from .enforcement import enforcer
 
 # keep track of already blocked IPs
-blocked_ips = set()
+blocked_ips = enforcer.blocked
 
 
 def block_ip(ip):
@@ -11,28 +10,4 @@ def block_ip(ip):
     Works for Windows and Linux
     """
 
-    if ip in blocked_ips:
-        return  # avoid duplicate rules
-
-    system = platform.system()
-
-    try:
-        if system == "Windows":
-            # Windows Firewall
-            cmd = f'netsh advfirewall firewall add rule name="IDS_Block_{ip}" dir=in action=block remoteip={ip}'
-            os.system(cmd)
-
-        elif system == "Linux":
-            # iptables
-            cmd = f"sudo iptables -A INPUT -s {ip} -j DROP"
-            os.system(cmd)
-
-        else:
-            print("Unsupported OS for auto-blocking")
-            return
-
-        blocked_ips.add(ip)
-        print(f"[MITIGATION] Blocked IP: {ip}")
-
-    except Exception as e:
-        print("Blocking error:", e)
+    enforcer.block(ip)
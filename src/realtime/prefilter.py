@@ -0,0 +1,352 @@
+import json
+import os
+
+from .ip_lists import PrefixTrie, read_cidr_file
+from .metric_types import MetricFamily
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PREFILTER_PATH = os.path.join(BASE, "config", "prefilter.json")
+
+# Address lists longer than this are matched in Python instead of
+# being expanded into a huge BPF expression
+BPF_MAX_ADDRESSES = 64
+
+PROTOCOLS = {"tcp": 6, "udp": 17, "icmp": 1, "icmp6": 58}
+
+# Fields that select traffic; a rule needs at least one
+MATCH_FIELDS = ("src", "dst", "src_file", "dst_file", "proto",
+                "port", "sport", "dport", "portrange")
+RULE_FIELDS = frozenset(MATCH_FIELDS + ("name", "bpf"))
+
+
+class PrefilterConfigError(ValueError):
+    """A prefilter rule that would not do what it says."""
+
+
+# =========================================================
+# RULES
+# =========================================================
+
+class PrefilterRule:
+    """
+    One drop rule. All given fields must match (AND):
+
+    - src / dst      : CIDR or list of CIDRs
+    - src_file / dst_file : CIDR list file (always matched in Python)
+    - proto          : "tcp", "udp", "icmp" or "icmp6"
+    - port / sport / dport : single port, either direction for `port`
+    - portrange      : [low, high], either direction
+    - bpf            : false forces the Python path
+
+    A rule with no match fields would drop every packet, so it is
+    rejected with PrefilterConfigError, as are unknown fields (a
+    typo leaves the rule emptier than intended), unknown protocols,
+    bad ports and bad CIDRs.
+    """
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise PrefilterConfigError(f"rule must be an object, got {spec!r}")
+
+        self.name = spec.get("name", "unnamed")
+        self.spec = spec
+        self.dropped = 0
+
+        unknown = set(spec) - RULE_FIELDS
+        if unknown:
+            raise PrefilterConfigError(
+                f"rule {self.name!r}: unknown fields {sorted(unknown)}"
+            )
+        if all(spec.get(field) in (None, [], "") for field in MATCH_FIELDS):
+            raise PrefilterConfigError(
+                f"rule {self.name!r} has no match fields and would drop all traffic"
+            )
+
+        try:
+            self.src = self._load_addresses(spec.get("src"), spec.get("src_file"))
+            self.dst = self._load_addresses(spec.get("dst"), spec.get("dst_file"))
+        except (OSError, ValueError) as e:
+            raise PrefilterConfigError(f"rule {self.name!r}: {e}")
+
+        proto = spec.get("proto")
+        if proto is not None and proto not in PROTOCOLS:
+            raise PrefilterConfigError(
+                f"rule {self.name!r}: unknown proto {proto!r} "
+                f"(expected one of {', '.join(PROTOCOLS)})"
+            )
+        self.proto = PROTOCOLS[proto] if proto else None
+
+        self.port = self._port(spec.get("port"))
+        self.sport = self._port(spec.get("sport"))
+        self.dport = self._port(spec.get("dport"))
+
+        self.portrange = spec.get("portrange")
+        if self.portrange is not None:
+            if not isinstance(self.portrange, (list, tuple)) or len(self.portrange) != 2:
+                raise PrefilterConfigError(
+                    f"rule {self.name!r}: portrange must be [low, high]"
+                )
+            low, high = (self._port(p) for p in self.portrange)
+            if low > high:
+                raise PrefilterConfigError(f"rule {self.name!r}: empty portrange")
+            self.portrange = (low, high)
+
+        self.bpf = self._compile_bpf() if spec.get("bpf", True) else None
+
+    def _port(self, value):
+        if value is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 65535:
+            raise PrefilterConfigError(f"rule {self.name!r}: bad port {value!r}")
+        return value
+
+    @staticmethod
+    def _load_addresses(cidrs, path):
+        if cidrs is None and path is None:
+            return None
+
+        if isinstance(cidrs, str):
+            cidrs = [cidrs]
+        cidrs = list(cidrs or [])
+        if path:
+            cidrs.extend(read_cidr_file(path))
+
+        trie = PrefixTrie()
+        for cidr in cidrs:
+            trie.insert(cidr, True)
+        return cidrs, trie
+
+    # ---------------- KERNEL (BPF) ----------------
+
+    def _compile_bpf(self):
+        spec = self.spec
+        if spec.get("src_file") or spec.get("dst_file"):
+            return None
+
+        parts = []
+
+        for direction, addresses in (("src", self.src), ("dst", self.dst)):
+            if addresses is None:
+                continue
+            cidrs = addresses[0]
+            if len(cidrs) > BPF_MAX_ADDRESSES:
+                return None
+            parts.append(
+                "(" + " or ".join(f"{direction} net {c}" for c in cidrs) + ")"
+            )
+
+        if self.proto is not None:
+            parts.append(spec["proto"])
+
+        if self.port is not None:
+            parts.append(f"port {int(self.port)}")
+        if self.sport is not None:
+            parts.append(f"src port {int(self.sport)}")
+        if self.dport is not None:
+            parts.append(f"dst port {int(self.dport)}")
+        if self.portrange is not None:
+            low, high = self.portrange
+            parts.append(f"portrange {int(low)}-{int(high)}")
+
+        if not parts:
+            return None
+
+        return " and ".join(parts)
+
+    # ---------------- PYTHON FALLBACK ----------------
+
+    def matches(self, src, dst, sport, dport, proto):
+        if self.proto is not None and proto != self.proto:
+            return False
+        if self.src is not None and self.src[1].lookup(src) is None:
+            return False
+        if self.dst is not None and self.dst[1].lookup(dst) is None:
+            return False
+        if self.port is not None and self.port not in (sport, dport):
+            return False
+        if self.sport is not None and sport != self.sport:
+            return False
+        if self.dport is not None and dport != self.dport:
+            return False
+        if self.portrange is not None:
+            low, high = self.portrange
+            if not (low <= sport <= high or low <= dport <= high):
+                return False
+        return True
+
+
+# =========================================================
+# PREFILTER
+# =========================================================
+
+def packet_fields(packet):
+    """(src, dst, sport, dport, proto) from a scapy packet, or None if not IP."""
+
+    ip = packet.getlayer("IP") or packet.getlayer("IPv6")
+    if ip is None:
+        return None
+
+    proto = getattr(ip, "proto", None)
+    if proto is None:
+        proto = getattr(ip, "nh", 0)
+
+    l4 = ip.payload
+    return (
+        ip.src,
+        ip.dst,
+        getattr(l4, "sport", 0),
+        getattr(l4, "dport", 0),
+        proto,
+    )
+
+
+class Prefilter:
+    """
+    Drops traffic we never act on before it reaches update_flow.
+
+    Rules that BPF can express are compiled into one kernel-side
+    filter for sniff(filter=...); the rest are checked in Python.
+    Kernel-side drops never reach userspace, so per-rule drop
+    counts exist only for Python-side rules.
+    """
+
+    def __init__(self, path=PREFILTER_PATH):
+        self.path = path
+        self.rules = []
+        self.use_bpf = True
+        self.passed = 0
+        self.rejected = []    # validation errors from the last load
+        self._python = None   # cached Python-side rules
+
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except (OSError, ValueError) as e:
+                # Unreadable config: run without rules rather than not at all
+                print(f"[PREFILTER] Not loaded, passing all traffic: {path}: {e}")
+
+    def load(self, path):
+        """
+        Read rules from a JSON config. Invalid rules are logged and
+        left out; the valid ones still load.
+        """
+
+        with open(path) as f:
+            config = json.load(f)
+
+        rules, rejected = [], []
+        for spec in config.get("rules", []):
+            try:
+                rules.append(PrefilterRule(spec))
+            except PrefilterConfigError as e:
+                rejected.append(str(e))
+                print(f"[PREFILTER] Rejected rule: {e}")
+
+        self.rules = rules
+        self.rejected = rejected
+        self.use_bpf = config.get("bpf", True)
+        self._python = None
+
+        kernel = len(self.kernel_rules())
+        print(
+            f"[PREFILTER] {len(self.rules)} rules "
+            f"({kernel} in BPF, {len(self.rules) - kernel} in Python)"
+            + (f", {len(rejected)} rejected" if rejected else "")
+        )
+
+    def kernel_rules(self):
+        if not self.use_bpf:
+            return []
+        return [r for r in self.rules if r.bpf is not None]
+
+    def python_rules(self):
+        kernel = self.kernel_rules()
+        return [r for r in self.rules if r not in kernel]
+
+    def bpf_filter(self):
+        """BPF expression for sniff(filter=...), or None when nothing compiles."""
+
+        rules = self.kernel_rules()
+        if not rules:
+            return None
+        return "not (" + " or ".join(f"({r.bpf})" for r in rules) + ")"
+
+    def disable_bpf(self):
+        self.use_bpf = False
+        self._python = None
+
+    def drop(self, packet):
+        rules = self._python
+        if rules is None:
+            rules = self._python = self.python_rules()
+
+        return self.drop_fields(packet_fields(packet) if rules else None)
+
+    def drop_fields(self, fields):
+        """drop() for (src, dst, sport, dport, proto) already parsed."""
+
+        rules = self._python
+        if rules is None:
+            rules = self._python = self.python_rules()
+
+        if rules and fields is not None:
+            for rule in rules:
+                if rule.matches(*fields):
+                    rule.dropped += 1
+                    return True
+
+        self.passed += 1
+        return False
+
+    def collect_metrics(self):
+        passed = MetricFamily(
+            "ids_prefilter_passed_total", "counter",
+            "Packets that passed the Python-side prefilter"
+        ).add((), self.passed)
+        dropped = MetricFamily(
+            "ids_prefilter_dropped_total", "counter",
+            "Packets dropped by Python-side prefilter rules", ("rule",)
+        )
+        # Dropped in the kernel, never counted in userspace
+        in_bpf = MetricFamily(
+            "ids_prefilter_bpf_rule", "gauge",
+            "Prefilter rules compiled into the kernel BPF filter", ("rule",)
+        )
+
+        kernel = self.kernel_rules()
+        for rule in self.rules:
+            if rule in kernel:
+                in_bpf.add((rule.name,), 1)
+            else:
+                dropped.add((rule.name,), rule.dropped)
+
+        return [passed, dropped, in_bpf]
+
+
+def sniff_prefiltered(prn):
+    """
+    Run scapy sniff() with the kernel-side prefilter. If libpcap
+    rejects the expression, fall back to matching every rule in Python.
+    """
+
+    from scapy.all import sniff
+    from scapy.arch.common import compile_filter
+    from scapy.error import Scapy_Exception
+
+    bpf = prefilter.bpf_filter()
+
+    # Compile up front so only a bad expression triggers the fallback;
+    # errors raised from prn inside sniff() propagate as they are
+    if bpf is not None:
+        try:
+            compile_filter(bpf)
+        except Scapy_Exception as e:
+            print("BPF prefilter rejected, using Python fallback:", e)
+            prefilter.disable_bpf()
+            bpf = None
+
+    sniff(filter=bpf, prn=prn, store=False)
+
+
+# Shared instance used by capture and realtime_main
+prefilter = Prefilter()
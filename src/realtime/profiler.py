@@ -0,0 +1,167 @@
+"""
+In-process diagnostics for a running sensor, served by metrics_server.
+
+- profile(): a sampling profiler. A background thread reads every
+  thread's stack with sys._current_frames() at a fixed rate, so the
+  profiled code runs untouched (no settrace/setprofile hooks). The
+  result is in collapsed-stack format, one "frame;frame;frame count"
+  line per distinct stack, for flamegraph.pl / speedscope / inferno.
+
+- allocations(): the top tracemalloc allocation sites, plus growth
+  since the previous call, for flow-table and trust-store leaks.
+"""
+
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.01      # 100 Hz
+MAX_PROFILE_SECONDS = 60
+TRACEMALLOC_FRAMES = 1
+TRACEMALLOC_IDLE_STOP = 600     # seconds without a call before tracing stops itself
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    filename = code.co_filename.replace("\\", "/").rsplit("/", 1)[-1]
+    return f"{code.co_name} ({filename}:{frame.f_lineno})"
+
+
+def collapse(frame):
+    """Root-first 'a;b;c' for one stack."""
+
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def profile(seconds, interval=SAMPLE_INTERVAL):
+    """Sample all threads for `seconds`; returns (Counter of stacks, samples)."""
+
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                thread = names.get(ident, f"thread-{ident}").replace(";", ":")
+                stacks[f"{thread};{collapse(frame)}"] += 1
+
+            samples += 1
+            time.sleep(interval)
+
+        return stacks, samples
+    finally:
+        _profile_lock.release()
+
+
+def render_collapsed(stacks):
+    return "".join(
+        f"{stack} {count}\n" for stack, count in stacks.most_common()
+    )
+
+
+# ---------------- TRACEMALLOC ----------------
+
+_last_snapshot = None
+_idle_timer = None
+_tracemalloc_lock = threading.Lock()
+
+
+def _stop_tracing():
+    global _last_snapshot
+    with _tracemalloc_lock:
+        tracemalloc.stop()
+        _last_snapshot = None
+
+
+def _arm_idle_stop():
+    # Tracing slows every allocation; don't leave it on once nobody asks
+    global _idle_timer
+    if _idle_timer is not None:
+        _idle_timer.cancel()
+    _idle_timer = threading.Timer(TRACEMALLOC_IDLE_STOP, _stop_tracing)
+    _idle_timer.daemon = True
+    _idle_timer.start()
+
+
+def allocations(top=25, group_by="lineno", stop=False):
+    """
+    Top allocation sites. The first call starts tracing (allocations
+    made before then are not attributed); later calls also report the
+    sites that grew most since the call before. Tracing stops after
+    TRACEMALLOC_IDLE_STOP seconds without a call, or on stop=True.
+    """
+
+    if stop:
+        if _idle_timer is not None:
+            _idle_timer.cancel()
+        _stop_tracing()
+        return {"tracing": False}
+
+    with _tracemalloc_lock:
+        _arm_idle_stop()
+        return _allocations(top, group_by)
+
+
+def _allocations(top, group_by):
+    global _last_snapshot
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        _last_snapshot = None
+        return {
+            "tracing": True,
+            "started": True,
+            "message": "tracemalloc started; call again to see allocations",
+        }
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+
+    result = {
+        "tracing": True,
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "top": [
+            {"site": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(group_by)[:top]
+        ],
+    }
+
+    if _last_snapshot is not None:
+        result["growth"] = [
+            {"site": str(stat.traceback), "bytes": stat.size_diff,
+             "count": stat.count_diff}
+            for stat in snapshot.compare_to(_last_snapshot, group_by)[:top]
+            if stat.size_diff
+        ]
+
+    _last_snapshot = snapshot
+    return result
@@ -1,19 +1,45 @@
+import os
 import time
 import random
+import socket
 import argparse
-import requests
-import subprocess
 from collections import deque, defaultdict
 from datetime import datetime
 
+from .features import get_flow_id
+from .heavy_hitters import top_talkers
+from .enforcement import enforcer
+from .ip_lists import ip_policy, ALLOW, BLOCK
+from .prefilter import prefilter, sniff_prefiltered
+from .load_shedder import overload
+from .benchmark import pipeline_benchmark as benchmark
+from .spool import spool, drainer
+from .checkpoint import checkpointer
+from .aggregator import aggregator
+from .metrics import MetricsRegistry
+from .metrics_server import start_metrics_server
+from .shared_metrics import enable_worker_mode
+
 # Optional Scapy import for live mode
 try:
-    from scapy.all import sniff, IP, TCP, UDP
+    from scapy.all import IP, TCP, UDP
     SCAPY_AVAILABLE = True
 except:
     SCAPY_AVAILABLE = False
 
-BACKEND_URL = "http://localhost:9000"
+# One backend can aggregate many sensors; each tags its payloads
+BACKEND_URL = os.environ.get("IDS_BACKEND_URL", "http://localhost:9000")
+SENSOR_ID = os.environ.get("IDS_SENSOR_ID", socket.gethostname())
+
+# Event batch encoding used by the spool drainer: "json" or "binary"
+WIRE_FORMAT = os.environ.get("IDS_WIRE_FORMAT", "json")
+drainer.configure(BACKEND_URL, WIRE_FORMAT)
+
+# "server": own /metrics endpoint; "worker": publish to the shared
+# exporter (python -m src.realtime.shared_metrics) when several
+# sensors run on one host; "off": neither
+METRICS_MODE = os.environ.get("IDS_METRICS_MODE", "off")
+METRICS_PORT = int(os.environ.get("IDS_METRICS_PORT", "8000"))
 
 # ---------------- CONFIG ----------------
 
@@ -23,14 +49,14 @@ dynamic_threshold = 150
 MAX_THRESHOLD = 200
 MIN_THRESHOLD = 130
 
-BLOCK_DURATION = 300  # seconds (5 minutes)
+TOP_TALKERS_INTERVAL = 5  # seconds between top-talker snapshots
+last_top_talkers_sent = 0.0
 
-SAFE_IPS = {
-    "127.0.0.1",
-    "0.0.0.0",
-}
+# ip -> expiry time, owned by the enforcement engine
+blocked_ips = enforcer.blocked
 
-blocked_ips = {}
+# Detection counters; exposed by --metrics server / worker
+sensor_metrics = MetricsRegistry()
 
 risk_window = deque(maxlen=50)
 drift_window = deque(maxlen=20)
@@ -45,6 +71,35 @@ SSI_GAIN = 25
 DAMPING = 0.2
 TRUST_GOV_GAIN = 0.5
 
+# ---------------- CHECKPOINT ----------------
+
+def get_state():
+    # Plain copies: the checkpointer pickles them on its own thread
+    return {
+        "trust_scores": dict(trust_scores),
+        "risk_window": list(risk_window),
+        "drift_window": list(drift_window),
+        "mode_window": list(mode_window),
+        "dynamic_threshold": dynamic_threshold,
+        "current_mode": current_mode,
+    }
+
+def load_state(state):
+    global dynamic_threshold, current_mode
+
+    trust_scores.clear()
+    trust_scores.update(state["trust_scores"])
+    for window in ("risk_window", "drift_window", "mode_window"):
+        target = globals()[window]
+        target.clear()
+        target.extend(state[window])
+
+    dynamic_threshold = state["dynamic_threshold"]
+    current_mode = state["current_mode"]
+
+checkpointer.register("governance", get_state, load_state)
+checkpointer.register("enforcer", enforcer.get_state, enforcer.load_state)
+
 # ---------------- PROFILE ----------------
 
 def configure_profile(profile):
@@ -155,75 +210,107 @@ def update_trust(ip, blocked):
 # ---------------- FIREWALL CONTROL ----------------
 
 def block_ip(ip):
-    if ip in SAFE_IPS:
-        return
+    # Allow-listed ranges (src/config/allowlist.txt) are refused by the enforcer
+    return enforcer.block(ip)
 
-    if ip in blocked_ips:
-        return
+def unblock_expired():
+    # Expiry is the only unblock the aggregator treats as a transition
+    for ip in enforcer.unblock_expired():
+        for outgoing in aggregator.unblocked(ip):
+            ship("event", outgoing)
 
-    rule_name = f"IDS_BLOCK_{ip}"
+# ---------------- BACKEND COMM ----------------
 
-    cmd = (
-        f'netsh advfirewall firewall add rule '
-        f'name="{rule_name}" dir=in action=block remoteip={ip}'
-    )
+def ship(kind, payload):
+    # Local write-ahead spool; the drainer thread does the network I/O,
+    # so detection never waits on (or loses events to) the backend
+    spool.append(kind, payload)
+    drainer.start()
 
-    subprocess.run(cmd, shell=True)
+def send_event(event):
+    event["sensor_id"] = SENSOR_ID
+    event["ts"] = time.time()
+    # Repeats are held for the current window and shipped as one summary
+    for outgoing in aggregator.add(event, event["ts"]):
+        ship("event", outgoing)
 
-    blocked_ips[ip] = time.time()
-    print(f"[FIREWALL] Blocked {ip}")
+def send_governance(ssi, threshold, trust, profile):
+    ship("governance", {
+        "ssi": ssi,
+        "threshold": threshold,
+        "trust": trust,
+        "profile": profile,
+        "sensor_id": SENSOR_ID,
+        "ts": time.time()
+    })
+
+def send_top_talkers():
+    global last_top_talkers_sent
 
-def unblock_expired():
     now = time.time()
+    if now - last_top_talkers_sent < TOP_TALKERS_INTERVAL:
+        return
+    last_top_talkers_sent = now
 
-    for ip in list(blocked_ips.keys()):
-        if now - blocked_ips[ip] > BLOCK_DURATION:
-            rule_name = f"IDS_BLOCK_{ip}"
-            cmd = (
-                f'netsh advfirewall firewall delete rule '
-                f'name="{rule_name}"'
-            )
-            subprocess.run(cmd, shell=True)
-            del blocked_ips[ip]
-            print(f"[FIREWALL] Unblocked {ip}")
+    snapshot = top_talkers.snapshot()
+    snapshot["sensor_id"] = SENSOR_ID
+    ship("top_talkers", snapshot)
 
-# ---------------- BACKEND COMM ----------------
+# ---------------- EVENT PROCESSING ----------------
 
-def send_event(event):
-    try:
-        requests.post(f"{BACKEND_URL}/ingest", json=event, timeout=1)
-    except:
-        pass
+def process_event(src_ip, dst_ip, risk, live=False, metrics=None):
+    metrics = sensor_metrics if metrics is None else metrics
 
-def send_governance(ssi, threshold, trust, profile):
-    try:
-        requests.post(
-            f"{BACKEND_URL}/ingest_governance",
-            json={
-                "ssi": ssi,
-                "threshold": threshold,
-                "trust": trust,
-                "profile": profile
-            },
-            timeout=1
-        )
-    except:
-        pass
+    ip_policy.reload_if_changed()
+    verdict = ip_policy.lookup(src_ip)
 
-# ---------------- EVENT PROCESSING ----------------
+    # Every flow is counted, whichever path it takes below
+    metrics.record_flow(risk)
 
-def process_event(src_ip, dst_ip, risk, live=False):
+    # Known-good ranges are never scored
+    if verdict == ALLOW:
+        return
 
-    unblock_expired()
+    with benchmark.stage("enforcement"):
+        unblock_expired()
+
+    # Known-bad ranges are blocked before scoring
+    if verdict == BLOCK:
+        if live:
+            with benchmark.stage("enforcement"):
+                newly_blocked = block_ip(src_ip)
+            if not newly_blocked:
+                return
+
+        metrics.record_block()
+        metrics.record_attack_type("blocklist")
+
+        with benchmark.stage("shipping"):
+            send_event({
+                "timestamp": datetime.now().strftime("%H:%M:%S"),
+                "src_ip": src_ip,
+                "dst_ip": dst_ip,
+                "risk": round(risk, 2),
+                "level": "HIGH",
+                "mode": current_mode,
+                "drift": 0.0,
+                "action": "BLOCKED",
+                "alert": True,
+                "reason": "blocklist",
+                "sample_rate": round(overload.sample_rate, 4)
+            })
+        return
 
     drift = calculate_drift()
     drift_window.append(drift)
     update_mode(drift)
+    metrics.update_drift(drift)
 
     risk_window.append(risk)
 
-    ssi = compute_ssi()
-    governance_controller(ssi)
+    with benchmark.stage("governance"):
+        ssi = compute_ssi()
+        governance_controller(ssi)
 
     blocked = False
 
@@ -235,13 +322,18 @@ def process_event(src_ip, dst_ip, risk, live=False):
             ssi > 0.5 and
             avg_trust < 0.6
         ):
-            block_ip(src_ip)
+            with benchmark.stage("enforcement"):
+                block_ip(src_ip)
             blocked = True
     else:
         blocked = risk > dynamic_threshold
 
     update_trust(src_ip, blocked)
 
+    if blocked:
+        metrics.record_block()
+        metrics.record_attack_type("risk")
+
     event = {
         "timestamp": datetime.now().strftime("%H:%M:%S"),
         "src_ip": src_ip,
@@ -251,16 +343,21 @@ def process_event(src_ip, dst_ip, risk, live=False):
         "mode": current_mode,
         "drift": round(drift, 4),
         "action": "BLOCKED" if blocked else "MONITOR",
-        "alert": True if blocked else False
+        "alert": True if blocked else False,
+        "sample_rate": round(overload.sample_rate, 4)
     }
 
-    send_event(event)
-    send_governance(
-        ssi,
-        dynamic_threshold,
-        compute_average_trust(),
-        current_profile
-    )
+    with benchmark.stage("shipping"):
+        send_event(event)
+        send_governance(
+            ssi,
+            dynamic_threshold,
+            compute_average_trust(),
+            current_profile
+        )
+        send_top_talkers()
+
+    checkpointer.maybe_snapshot()
 
 # ---------------- REPLAY MODE ----------------
 
@@ -281,7 +378,24 @@ def replay_mode():
 # ---------------- LIVE MODE ----------------
 
 def packet_handler(packet):
-    if IP in packet:
+    if prefilter.drop(packet):
+        return
+
+    if IP not in packet:
+        return
+
+    flow_id = get_flow_id(packet)
+    if not overload.admit(flow_id):
+        return
+
+    start = benchmark.start_timer()
+
+    # Risk here is header-based, so no per-flow state is kept: top
+    # talkers are fed straight from the headers in fixed memory
+    with benchmark.stage("flow_update"):
+        top_talkers.observe(flow_id, len(packet))
+
+    with benchmark.stage("parse"):
         src_ip = packet[IP].src
         dst_ip = packet[IP].dst
 
@@ -293,7 +407,10 @@ def packet_handler(packet):
         if len(packet) > 1000:
             risk += 60
 
-        process_event(src_ip, dst_ip, risk, live=True)
+    process_event(src_ip, dst_ip, risk, live=True)
+
+    latency = benchmark.stop_timer(start)
+    overload.observe(latency, lag=time.time() - float(packet.time))
 
 def live_mode():
     if not SCAPY_AVAILABLE:
@@ -302,10 +419,12 @@ def live_mode():
 
     print("Running LIVE MODE (Admin required, Ctrl+C to stop)")
     try:
-        sniff(prn=packet_handler, store=False)
+        sniff_prefiltered(packet_handler)
     except KeyboardInterrupt:
         print("\nLive mode stopped safely.")
 
+    benchmark.report()
+
 # ---------------- ENTRY ----------------
 
 if __name__ == "__main__":
@@ -315,9 +434,36 @@ if __name__ == "__main__":
         default="replay",
         choices=["replay", "live"]
     )
+    parser.add_argument("--backend-url", default=BACKEND_URL)
+    parser.add_argument("--sensor-id", default=SENSOR_ID)
+    parser.add_argument(
+        "--wire-format",
+        default=WIRE_FORMAT,
+        choices=["json", "binary"]
+    )
+    parser.add_argument(
+        "--metrics",
+        default=METRICS_MODE,
+        choices=["off", "server", "worker"]
+    )
     args = parser.parse_args()
 
+    BACKEND_URL = args.backend_url.rstrip("/")
+    SENSOR_ID = args.sensor_id
+    WIRE_FORMAT = args.wire_format
+    drainer.configure(BACKEND_URL, WIRE_FORMAT)
+
     configure_profile("precision")
+    ip_policy.load()
+    checkpointer.restore()
+    # Close aggregation windows on time too, not only on the next event
+    aggregator.start(lambda event: ship("event", event))
+
+    metrics_writer = None
+    if args.metrics == "server":
+        start_metrics_server(sensor_metrics, METRICS_PORT)
+    elif args.metrics == "worker":
+        metrics_writer = enable_worker_mode(sensor_metrics)
 
     try:
         if args.mode == "live":
@@ -326,3 +472,13 @@ if __name__ == "__main__":
             replay_mode()
     except KeyboardInterrupt:
         print("\nSystem shutdown complete.")
+    finally:
+        aggregator.stop()
+        for event in aggregator.flush():
+            ship("event", event)
+        checkpointer.snapshot(wait=True)
+        drainer.stop()
+        spool.close()
+        if metrics_writer is not None:
+            # Final snapshot, so the exporter keeps this worker's totals
+            metrics_writer.stop()
@@ -0,0 +1,355 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from .benchmark import LatencyHistogram, pipeline_benchmark
+from .metric_types import MetricFamily
+
+METRICS_DIR = os.environ.get(
+    "IDS_METRICS_DIR",
+    os.path.join(tempfile.gettempdir(), "ids_metrics")
+)
+
+# Workers and the exporter started with the same run id only see each
+# other; without one, regions left by processes that exited before the
+# exporter started are treated as a previous run's
+RUN_ID = os.environ.get("IDS_RUN_ID", "")
+
+FLUSH_INTERVAL = 1.0        # seconds between worker snapshots
+INITIAL_SIZE = 1 << 20      # 1 MiB per worker region, grown on demand
+
+MAGIC = b"IDSM"
+FORMAT_VERSION = 1
+# magic, version, sequence (odd while writing), payload length
+HEADER = struct.Struct("<4sIQQ")
+
+
+# =========================================================
+# WORKER SIDE
+# =========================================================
+
+class SharedMetricsWriter:
+    """
+    Publishes one worker's metrics into an mmap-backed file.
+
+    The hot path is untouched: record_* still writes per-thread
+    cells. A background thread snapshots the registry every
+    FLUSH_INTERVAL and copies it into the region under a seqlock,
+    so the exporter never reads a torn snapshot.
+    """
+
+    def __init__(self, registry, directory=METRICS_DIR,
+                 benchmark=pipeline_benchmark, interval=FLUSH_INTERVAL, run_id=RUN_ID):
+        self.registry = registry
+        self.benchmark = benchmark
+        self.interval = interval
+        self.run_id = run_id
+        self.pid = os.getpid()
+        self.started = time.time()
+
+        # Start time in the name: a recycled PID never overwrites the
+        # region of an exited worker whose counts still belong to the run
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(
+            directory, f"worker_{self.pid}_{int(self.started * 1000)}.mmap"
+        )
+
+        self.file = open(self.path, "w+b")
+        self.size = INITIAL_SIZE
+        self.file.truncate(self.size)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+        self.sequence = 0
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.flush()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("Shared metrics flush error:", e)
+
+    def snapshot(self):
+        families = []
+        for family in self.registry.collect():
+            # Quantiles cannot be merged; the raw latency histograms
+            # below are shipped instead
+            if family.kind == "summary":
+                continue
+            families.append({
+                "name": family.name,
+                "kind": family.kind,
+                "help": family.help,
+                "labelnames": list(family.labelnames),
+                "samples": [
+                    [suffix, list(values), list(extra or ()), value]
+                    for suffix, values, extra, value in family.samples
+                ],
+            })
+
+        latency = {}
+        if self.benchmark is not None:
+            rows = {"total": self.benchmark.total}
+            rows.update(self.benchmark.stages)
+            for name, histogram in rows.items():
+                if histogram.count == 0:
+                    continue
+                latency[name] = {
+                    "counts": {i: n for i, n in enumerate(histogram.counts) if n},
+                    "count": histogram.count,
+                    "total_ns": histogram.total_ns,
+                    "max_ns": histogram.max_ns,
+                }
+
+        return {
+            "pid": self.pid,
+            "run_id": self.run_id,
+            "started": self.started,
+            "time": time.time(),
+            "families": families,
+            "latency": latency,
+        }
+
+    def flush(self):
+        payload = json.dumps(self.snapshot(), separators=(",", ":")).encode()
+
+        needed = HEADER.size + len(payload)
+        if needed > self.size:
+            self._grow(needed)
+
+        self.sequence += 1   # odd: write in progress
+        HEADER.pack_into(self.map, 0, MAGIC, FORMAT_VERSION, self.sequence, 0)
+        self.map[HEADER.size:needed] = payload
+        self.sequence += 1   # even: snapshot complete
+        HEADER.pack_into(
+            self.map, 0, MAGIC, FORMAT_VERSION, self.sequence, len(payload)
+        )
+
+    def _grow(self, needed):
+        size = self.size
+        while size < needed:
+            size *= 2
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.size = size
+
+
+def enable_worker_mode(metrics_registry, directory=METRICS_DIR, run_id=RUN_ID):
+    """Start publishing a MetricsRegistry for the shared exporter."""
+
+    return SharedMetricsWriter(metrics_registry.registry, directory, run_id=run_id).start()
+
+
+# =========================================================
+# EXPORTER SIDE
+# =========================================================
+
+def read_region(path, retries=5):
+    """Return the latest complete snapshot in a worker file, or None."""
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            return None
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as region:
+            for _ in range(retries):
+                magic, version, seq, length = HEADER.unpack_from(region, 0)
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    return None
+                if seq % 2 or HEADER.size + length > size:
+                    time.sleep(0.001)
+                    continue
+                payload = region[HEADER.size:HEADER.size + length]
+                if HEADER.unpack_from(region, 0)[2] == seq:
+                    return json.loads(payload)
+    return None
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedMetricsExporter:
+    """
+    Merges every worker region at scrape time.
+
+    - counters and histograms are summed across the run's workers,
+      including exited ones, so cluster totals never go backwards
+    - regions from other runs (another IDS_RUN_ID, or workers that had
+      already exited when the exporter started) are left out
+    - a region that cannot be read this scrape contributes its last
+      good snapshot rather than disappearing from the sums
+    - gauges are reported per live worker with a `worker` label
+    - latency histograms are merged bucket by bucket before the
+      cluster-wide quantiles are computed
+    """
+
+    def __init__(self, directory=METRICS_DIR, run_id=RUN_ID):
+        self.directory = directory
+        self.run_id = run_id
+        self.started = time.time()
+        self.last_good = {}     # path -> last snapshot read whole
+        self.read_errors = 0
+        self.stale = 0
+
+    def read_workers(self):
+        snapshots = []
+        if not os.path.isdir(self.directory):
+            return snapshots
+
+        stale = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".mmap"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                snapshot = read_region(path)
+            except (OSError, ValueError):
+                snapshot = None
+            if snapshot is None:
+                self.read_errors += 1
+                snapshot = self.last_good.get(path)
+                if snapshot is None:
+                    continue
+            else:
+                self.last_good[path] = snapshot
+
+            if self.is_stale(snapshot):
+                stale += 1
+                continue
+            snapshots.append(snapshot)
+
+        self.stale = stale
+        return snapshots
+
+    def is_stale(self, snapshot):
+        if self.run_id:
+            return snapshot.get("run_id", "") != self.run_id
+        # Finished before this exporter came up: a previous run
+        return snapshot["time"] < self.started and not pid_alive(snapshot["pid"])
+
+    def collect(self):
+        snapshots = self.read_workers()
+        families = {}
+        merged = {}          # (name, suffix, values, extra) -> value
+        latency = {}
+
+        live = MetricFamily(
+            "ids_workers", "gauge", "Worker processes publishing metrics", ("state",)
+        )
+        alive = [pid_alive(s["pid"]) for s in snapshots]
+        live.add(("live",), sum(alive))
+        live.add(("exited",), len(alive) - sum(alive))
+        live.add(("stale",), self.stale)
+
+        read_errors = MetricFamily(
+            "ids_worker_region_read_errors_total", "counter",
+            "Scrapes that fell back to a worker's last good snapshot"
+        ).add((), self.read_errors)
+
+        for snapshot, is_alive in zip(snapshots, alive):
+            for f in snapshot["families"]:
+                name = f["name"]
+                gauge = f["kind"] == "gauge"
+                if gauge and not is_alive:
+                    continue
+
+                if name not in families:
+                    labelnames = tuple(f["labelnames"]) + (("worker",) if gauge else ())
+                    families[name] = MetricFamily(name, f["kind"], f["help"], labelnames)
+
+                for suffix, values, extra, value in f["samples"]:
+                    if gauge:
+                        values = values + [str(snapshot["pid"])]
+                    key = (name, suffix, tuple(values), tuple(map(tuple, extra)))
+                    merged[key] = value if gauge else merged.get(key, 0) + value
+
+            for stage, data in snapshot["latency"].items():
+                histogram = latency.get(stage)
+                if histogram is None:
+                    histogram = latency[stage] = LatencyHistogram()
+                for index, n in data["counts"].items():
+                    histogram.counts[int(index)] += n
+                histogram.count += data["count"]
+                histogram.total_ns += data["total_ns"]
+                histogram.max_ns = max(histogram.max_ns, data["max_ns"])
+
+        for (name, suffix, values, extra), value in merged.items():
+            families[name].add(values, value, suffix, extra or None)
+
+        stage_latency = MetricFamily(
+            "ids_stage_latency_seconds", "summary",
+            "Pipeline stage latency merged across workers", ("stage",)
+        )
+        for stage, histogram in latency.items():
+            for q, value in histogram.quantiles().items():
+                stage_latency.add((stage,), value / 1e9, extra=(("quantile", str(q)),))
+            stage_latency.add((stage,), histogram.total_ns / 1e9, "_sum")
+            stage_latency.add((stage,), histogram.count, "_count")
+
+        return [live, read_errors] + list(families.values()) + [stage_latency]
+
+    def export_metrics(self):
+        lines = []
+        for family in self.collect():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+def reset_metrics_dir(directory=METRICS_DIR):
+    """Remove worker regions left by a previous run."""
+
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(".mmap"):
+            os.remove(os.path.join(directory, name))
+
+
+# ---------------- ENTRY ----------------
+
+if __name__ == "__main__":
+    from .metrics_server import start_metrics_server
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default=METRICS_DIR)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--reset", action="store_true")
+    parser.add_argument("--run-id", default=RUN_ID)
+    args = parser.parse_args()
+
+    if args.reset:
+        reset_metrics_dir(args.dir)
+
+    start_metrics_server(SharedMetricsExporter(args.dir, args.run_id), port=args.port)
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nMetrics exporter stopped.")
@@ -0,0 +1,519 @@
+import itertools
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+import requests
+
+from . import wire_format
+from .metric_types import MetricFamily
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SPOOL_DIR = os.environ.get(
+    "IDS_SPOOL_DIR",
+    os.path.join(PROJECT_ROOT, "data", "spool")
+)
+
+SEGMENT_BYTES = 4 * 1024 * 1024     # rotate segments at this size
+MAX_BYTES = 256 * 1024 * 1024       # oldest segments dropped beyond this
+FSYNC_INTERVAL = 0.2                # seconds between batched fsyncs
+
+DRAIN_BATCH = 512       # records read per drainer pass
+DRAIN_IDLE = 0.5        # seconds to wait for new records when caught up
+MAX_BACKOFF = 10.0      # seconds between retries while the backend is down
+
+KINDS = ("event", "governance", "top_talkers")
+KIND_CODES = {kind: i for i, kind in enumerate(KINDS)}
+
+# length of payload, crc32 of kind + payload, kind code
+FRAME = struct.Struct("<IIB")
+
+PROGRESS_FILE = "progress.json"
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+
+# Statuses worth retrying; any other 4xx means the batch itself is bad
+RETRY_STATUSES = (429,)
+
+
+class BatchRejected(Exception):
+    """The backend refused a batch in a way that retrying won't fix."""
+
+    def __init__(self, status, body):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.body = body
+
+
+def segment_name(seq):
+    return f"{seq:010d}.seg"
+
+
+# =========================================================
+# WRITE-AHEAD SPOOL
+# =========================================================
+
+class Spool:
+    """
+    Append-only, segmented on-disk queue between detection and the
+    backend.
+
+    append() is a buffered write plus flush to the OS page cache;
+    a background thread fsyncs the open segment every FSYNC_INTERVAL,
+    so many records share one fsync. The replay position is kept in
+    progress.json and only moves when the drainer commits a record
+    the backend has accepted. Disk use is capped at MAX_BYTES by
+    dropping the oldest segments, replayed or not.
+    """
+
+    def __init__(self, directory=SPOOL_DIR, segment_bytes=SEGMENT_BYTES,
+                 max_bytes=MAX_BYTES, fsync_interval=FSYNC_INTERVAL):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+
+        self.lock = threading.Lock()
+        self.has_data = threading.Event()
+        self.opened = False
+
+        self.segments = {}          # seq -> size in bytes
+        self.total_bytes = 0
+        self.committed = (0, 0)     # (segment seq, offset) replay position
+        self.file = None
+        self.write_seq = 0
+        self.dirty = False
+
+        self.syncer = None
+        self.stop_event = threading.Event()
+
+        self.appended = 0
+        self.replayed = 0
+        self.dropped_segments = 0
+        self.dropped_bytes = 0
+        self.corrupt_segments = 0
+
+    # ---------------- LIFECYCLE ----------------
+
+    def open(self):
+        with self.lock:
+            if self.opened:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+
+            for name in os.listdir(self.directory):
+                if name.endswith(".seg"):
+                    path = os.path.join(self.directory, name)
+                    self.segments[int(name[:-4])] = os.path.getsize(path)
+
+            self.total_bytes = sum(self.segments.values())
+            self.committed = self._load_progress()
+
+            # Never append after a possibly torn tail; start a new segment
+            self.write_seq = max(self.segments, default=self.committed[0] - 1) + 1
+            self._open_segment()
+
+            if self.committed[0] not in self.segments:
+                self.committed = (min(self.segments), 0)
+
+            self.opened = True
+            self.syncer = threading.Thread(target=self._sync_loop, daemon=True)
+            self.syncer.start()
+
+        if self.pending_bytes():
+            self.has_data.set()
+
+    def close(self):
+        if not self.opened:
+            return
+        self.stop_event.set()
+        self.syncer.join()
+
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.opened = False
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, segment_name(self.write_seq))
+        self.file = open(path, "ab")
+        self.segments[self.write_seq] = 0
+
+    def _rotate(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.write_seq += 1
+        self._open_segment()
+
+    # ---------------- WRITE SIDE ----------------
+
+    def append(self, kind, payload):
+        if not self.opened:
+            self.open()
+
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        code = KIND_CODES[kind]
+        crc = zlib.crc32(body, zlib.crc32(bytes((code,))))
+        frame = FRAME.pack(len(body), crc, code) + body
+
+        with self.lock:
+            if self.segments[self.write_seq] + len(frame) > self.segment_bytes:
+                self._rotate()
+
+            self.file.write(frame)
+            self.file.flush()
+            self.segments[self.write_seq] += len(frame)
+            self.total_bytes += len(frame)
+            self.dirty = True
+            self.appended += 1
+
+            if self.total_bytes > self.max_bytes:
+                self._enforce_cap()
+
+        self.has_data.set()
+
+    def _enforce_cap(self):
+        # Oldest first; the segment being written is never dropped
+        while self.total_bytes > self.max_bytes and len(self.segments) > 1:
+            seq = min(self.segments)
+            size = self.segments.pop(seq)
+            self.total_bytes -= size
+            self._remove(seq)
+
+            self.dropped_segments += 1
+            if seq >= self.committed[0]:
+                self.dropped_bytes += size - (
+                    self.committed[1] if seq == self.committed[0] else 0
+                )
+
+        if self.committed[0] < min(self.segments):
+            self.committed = (min(self.segments), 0)
+
+    def _sync_loop(self):
+        while not self.stop_event.wait(self.fsync_interval):
+            with self.lock:
+                if not self.dirty:
+                    continue
+                self.dirty = False
+                # fsync a duplicate fd so appends continue meanwhile
+                fd = os.dup(self.file.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # ---------------- READ SIDE ----------------
+
+    def read(self, max_records=DRAIN_BATCH):
+        """
+        Up to max_records unreplayed records from the committed
+        position, as (kind, payload, position after the record).
+        Nothing moves until commit() is called with one of those
+        positions.
+        """
+
+        if not self.opened:
+            self.open()
+
+        with self.lock:
+            seq, offset = self.committed
+            sizes = dict(self.segments)
+            write_seq = self.write_seq
+
+        records = []
+        while len(records) < max_records:
+            if seq not in sizes:
+                later = [s for s in sizes if s > seq]
+                if not later:
+                    break
+                seq, offset = min(later), 0
+
+            path = os.path.join(self.directory, segment_name(seq))
+            end = sizes[seq]
+            pos = offset
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                # Dropped by the disk cap under us
+                sizes.pop(seq)
+                continue
+
+            # Frame by frame from the committed offset, not the whole
+            # rest of the segment on every pass
+            with f:
+                f.seek(offset)
+                while len(records) < max_records and pos + FRAME.size <= end:
+                    length, crc, code = FRAME.unpack(f.read(FRAME.size))
+                    if pos + FRAME.size + length > end:
+                        break
+                    body = f.read(length)
+                    if (len(body) < length or code >= len(KINDS)
+                            or zlib.crc32(body, zlib.crc32(bytes((code,)))) != crc):
+                        break
+                    pos += FRAME.size + length
+                    records.append((KINDS[code], json.loads(body), (seq, pos)))
+
+            if len(records) >= max_records or seq == write_seq:
+                break
+
+            corrupt = pos < end
+
+            if corrupt:
+                # Torn tail from a crash; the rest of this segment is lost
+                self.corrupt_segments += 1
+                if not records:
+                    self.commit((seq + 1, 0), 0)
+                elif records[-1][2][0] == seq:
+                    records[-1] = records[-1][:2] + ((seq + 1, 0),)
+
+            seq, offset = seq + 1, 0
+
+        return records
+
+    def commit(self, position, count):
+        with self.lock:
+            # The cap may have dropped past this position meanwhile
+            if position <= self.committed:
+                return
+            self.committed = position
+            self.replayed += count
+
+            for seq in [s for s in self.segments if s < position[0]]:
+                self.total_bytes -= self.segments.pop(seq)
+                self._remove(seq)
+
+        self._save_progress(position)
+
+    def _remove(self, seq):
+        try:
+            os.remove(os.path.join(self.directory, segment_name(seq)))
+        except FileNotFoundError:
+            pass
+
+    def _load_progress(self):
+        try:
+            with open(os.path.join(self.directory, PROGRESS_FILE)) as f:
+                progress = json.load(f)
+            return (progress["segment"], progress["offset"])
+        except (OSError, ValueError, KeyError):
+            return (min(self.segments, default=0), 0)
+
+    def _save_progress(self, position):
+        path = os.path.join(self.directory, PROGRESS_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"segment": position[0], "offset": position[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # ---------------- STATS ----------------
+
+    def pending_bytes(self):
+        with self.lock:
+            seq, offset = self.committed
+            return sum(
+                size - (offset if s == seq else 0)
+                for s, size in self.segments.items()
+                if s >= seq
+            )
+
+    def collect_metrics(self):
+        with self.lock:
+            disk = self.total_bytes
+            segments = len(self.segments)
+
+        return [
+            MetricFamily(name, kind, help_text).add((), value)
+            for name, kind, help_text, value in (
+                ("ids_spool_appended_total", "counter",
+                 "Records written to the spool", self.appended),
+                ("ids_spool_replayed_total", "counter",
+                 "Spooled records accepted by the backend", self.replayed),
+                ("ids_spool_pending_bytes", "gauge",
+                 "Spooled bytes not yet replayed", self.pending_bytes()),
+                ("ids_spool_disk_bytes", "gauge",
+                 "Bytes on disk across spool segments", disk),
+                ("ids_spool_segments", "gauge",
+                 "Spool segment files on disk", segments),
+                ("ids_spool_dropped_bytes_total", "counter",
+                 "Unreplayed bytes dropped by the disk cap",
+                 self.dropped_bytes),
+                ("ids_spool_corrupt_segments_total", "counter",
+                 "Segments cut short by a torn or corrupt record",
+                 self.corrupt_segments),
+            )
+        ]
+
+
+# =========================================================
+# DRAINER
+# =========================================================
+
+class Drainer:
+    """
+    Replays the spool to the backend from a background thread.
+
+    Consecutive events go as one /ingest_batch request, governance
+    updates as one /ingest_governance_batch, and a run of top-talker
+    snapshots collapses to the latest. The spool position is
+    committed after each accepted request, so an outage only delays
+    delivery; a crash between a request and its commit can resend
+    that one request (at-least-once). Connection errors, 5xx and 429
+    are retried; a batch refused with any other 4xx is appended to
+    dead_letter.jsonl and skipped.
+    """
+
+    def __init__(self, spool, backend_url="http://localhost:9000", wire="json"):
+        self.spool = spool
+        self.backend_url = backend_url
+        self.wire = wire
+
+        self.session = requests.Session()
+        self.worker = None
+        self.stop_event = threading.Event()
+
+        self.requests_sent = 0
+        self.failures = 0
+        self.rejected_batches = 0
+        self.rejected_records = 0
+        self.backend_up = True
+
+    def configure(self, backend_url, wire="json"):
+        self.backend_url = backend_url.rstrip("/")
+        self.wire = wire
+
+    def start(self):
+        if self.worker is None:
+            self.stop_event.clear()
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+
+    def stop(self, timeout=2):
+        """Give the drainer up to `timeout` seconds to catch up, then stop."""
+
+        if self.worker is None:
+            return
+        deadline = time.time() + timeout
+        while self.backend_up and self.spool.pending_bytes() and time.time() < deadline:
+            time.sleep(0.05)
+
+        self.stop_event.set()
+        self.spool.has_data.set()
+        self.worker.join()
+        self.worker = None
+
+    def _run(self):
+        backoff = 0.5
+
+        while not self.stop_event.is_set():
+            self.spool.has_data.clear()
+            records = self.spool.read(DRAIN_BATCH)
+
+            if not records:
+                self.spool.has_data.wait(DRAIN_IDLE)
+                continue
+
+            if self.drain(records):
+                self.backend_up = True
+                backoff = 0.5
+            else:
+                self.backend_up = False
+                self.failures += 1
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def drain(self, records):
+        """Ship records in order; False at the first rejected request."""
+
+        runs = itertools.groupby(
+            records, key=lambda r: (r[0], r[1].get("sensor_id"))
+        )
+        for (kind, sensor_id), run in runs:
+            run = list(run)
+            payloads = [payload for _, payload, _ in run]
+
+            try:
+                if kind == "event":
+                    self._post_events(payloads, sensor_id)
+                elif kind == "governance":
+                    self._post("/ingest_governance_batch", json=payloads)
+                else:
+                    self._post("/ingest_top_talkers", json=payloads[-1])
+            except BatchRejected as e:
+                # One bad batch must not hold up everything behind it
+                self.dead_letter(kind, payloads, e)
+            except requests.RequestException:
+                return False
+
+            self.spool.commit(run[-1][2], len(run))
+
+        return True
+
+    def _post_events(self, events, sensor_id):
+        if self.wire == "binary":
+            # Batches the fixed layout can't carry go as a JSON list
+            try:
+                body = wire_format.encode_batch(events, sensor_id or "default")
+            except ValueError:
+                body = None
+            if body is not None:
+                return self._post(
+                    "/ingest_batch", data=body,
+                    headers={"Content-Type": wire_format.CONTENT_TYPE},
+                )
+        self._post("/ingest_batch", json=events)
+
+    def _post(self, path, **kwargs):
+        response = self.session.post(f"{self.backend_url}{path}", timeout=5, **kwargs)
+        self.requests_sent += 1
+
+        status = response.status_code
+        if 400 <= status < 500 and status not in RETRY_STATUSES:
+            raise BatchRejected(status, response.text[:500])
+        # 5xx (503: ingest queue full) and 429 are retried later
+        response.raise_for_status()
+
+    def dead_letter(self, kind, payloads, error):
+        self.rejected_batches += 1
+        self.rejected_records += len(payloads)
+        print(f"[SPOOL] Backend rejected {len(payloads)} {kind} records "
+              f"({error}); moved to {DEAD_LETTER_FILE}")
+
+        path = os.path.join(self.spool.directory, DEAD_LETTER_FILE)
+        with open(path, "a") as f:
+            f.write(json.dumps({
+                "time": time.time(),
+                "kind": kind,
+                "status": error.status,
+                "response": error.body,
+                "records": payloads,
+            }) + "\n")
+
+    def collect_metrics(self):
+        return [
+            MetricFamily(name, kind, help_text).add((), value)
+            for name, kind, help_text, value in (
+                ("ids_spool_requests_total", "counter",
+                 "Bulk requests sent by the spool drainer", self.requests_sent),
+                ("ids_spool_failures_total", "counter",
+                 "Drainer passes that stopped on a backend error", self.failures),
+                ("ids_spool_rejected_batches_total", "counter",
+                 "Batches refused with a non-retryable 4xx, moved to the dead-letter file",
+                 self.rejected_batches),
+                ("ids_spool_rejected_records_total", "counter",
+                 "Records in dead-lettered batches", self.rejected_records),
+                ("ids_backend_up", "gauge",
+                 "1 while the backend accepts spooled records",
+                 int(self.backend_up)),
+            )
+        ]
+
+
+# Shared instances used by realtime_main
+spool = Spool()
+drainer = Drainer(spool)
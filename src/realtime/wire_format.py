@@ -0,0 +1,355 @@
+"""
+Compact binary encoding for sensor -> backend event batches.
+
+Layout (little endian):
+
+    header   magic "IDSB", version u8, reserved u8,
+             string count u16, event count u32
+    strings  count x (length u16, utf-8 bytes); entry 0 is the sensor_id
+    events   count x RECORD (44 bytes, fixed layout)
+
+IPs are interned into the per-batch string table and level / mode /
+action are enumerated, so a record carries only numbers. Version 2
+added count, risk_min/risk_max and first_seen/last_seen so the
+aggregator's summaries (FLAG_SUMMARY) fit the layout; version 1
+batches from older sensors are still decoded. The backend
+views the record block as a NumPy structured array without parsing.
+JSON stays the default; encode_batch raises ValueError for anything
+the fixed layout cannot represent, and callers fall back to JSON.
+"""
+
+import json
+import struct
+import time
+from datetime import datetime
+
+MAGIC = b"IDSB"
+VERSION = 2
+VERSIONS = (1, 2)
+
+CONTENT_TYPE = "application/x-ids-batch"
+
+HEADER = struct.Struct("<4sBBHI")
+STRING_LEN = struct.Struct("<H")
+
+# ts, src, dst, risk, drift, sample_rate, level, mode, action, flags,
+# count, risk_min, risk_max, first_seen, last_seen
+RECORD = struct.Struct("<dHHfffBBBBIffHH")
+RECORD_V1 = struct.Struct("<dHHfffBBBB")
+
+LEVELS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+MODES = ("STABLE", "ALERT", "DEFENSIVE")
+ACTIONS = ("MONITOR", "BLOCKED")
+
+LEVEL_CODES = {name: i for i, name in enumerate(LEVELS)}
+MODE_CODES = {name: i for i, name in enumerate(MODES)}
+ACTION_CODES = {name: i for i, name in enumerate(ACTIONS)}
+
+FLAG_ALERT = 1
+FLAG_BLOCKLIST = 2      # reason: "blocklist"
+FLAG_SUMMARY = 4        # count / risk_min / risk_max / first_seen / last_seen set
+
+# Keys the fixed layout carries; anything else forces the JSON path
+FIELDS = frozenset((
+    "timestamp", "ts", "src_ip", "dst_ip", "risk", "level", "mode",
+    "drift", "action", "alert", "reason", "sample_rate", "sensor_id",
+    "count", "risk_min", "risk_max", "first_seen", "last_seen",
+))
+
+MAX_STRINGS = 0xFFFF
+MAX_STRING_BYTES = 0xFFFF   # length prefix is a u16
+NO_STRING = 0xFFFF      # string index for a missing first_seen / last_seen
+
+
+def record_dtype(version=VERSION):
+    import numpy as np
+
+    fields = [
+        ("ts", "<f8"),
+        ("src", "<u2"),
+        ("dst", "<u2"),
+        ("risk", "<f4"),
+        ("drift", "<f4"),
+        ("sample_rate", "<f4"),
+        ("level", "u1"),
+        ("mode", "u1"),
+        ("action", "u1"),
+        ("flags", "u1"),
+    ]
+    if version == 1:
+        dtype = np.dtype(fields)
+        assert dtype.itemsize == RECORD_V1.size
+        return dtype
+
+    dtype = np.dtype(fields + [
+        ("count", "<u4"),
+        ("risk_min", "<f4"),
+        ("risk_max", "<f4"),
+        ("first_seen", "<u2"),
+        ("last_seen", "<u2"),
+    ])
+    assert dtype.itemsize == RECORD.size
+    return dtype
+
+
+# ---------------- ENCODE ----------------
+
+def encode_batch(events, sensor_id="default"):
+    strings = []
+    index = {}
+
+    def intern(value):
+        if value is None:
+            return NO_STRING
+        i = index.get(value)
+        if i is None:
+            if not isinstance(value, str):
+                raise ValueError(f"string field is {type(value).__name__}, not str")
+            raw = value.encode()
+            if len(raw) > MAX_STRING_BYTES:
+                raise ValueError(f"string field of {len(raw)} bytes exceeds the u16 length")
+            if len(strings) >= MAX_STRINGS:
+                raise ValueError("too many distinct strings in batch")
+            i = index[value] = len(strings)
+            strings.append(raw)
+        return i
+
+    intern(sensor_id)
+
+    body = bytearray(RECORD.size * len(events))
+    pack_into = RECORD.pack_into
+    now = time.time()
+
+    for n, event in enumerate(events):
+        if not FIELDS.issuperset(event):
+            raise ValueError(f"unsupported fields: {set(event) - FIELDS}")
+
+        flags = FLAG_ALERT if event.get("alert") else 0
+        reason = event.get("reason")
+        if reason == "blocklist":
+            flags |= FLAG_BLOCKLIST
+        elif reason is not None:
+            raise ValueError(f"unsupported reason: {reason}")
+
+        risk = event.get("risk", 0.0)
+        count = event.get("count", 1)
+        if "count" in event:
+            flags |= FLAG_SUMMARY
+
+        try:
+            pack_into(
+                body, n * RECORD.size,
+                event.get("ts", now),
+                intern(event.get("src_ip") or ""),
+                intern(event.get("dst_ip") or ""),
+                risk,
+                event.get("drift", 0.0),
+                event.get("sample_rate", 1.0),
+                LEVEL_CODES[event.get("level", "LOW")],
+                MODE_CODES[event.get("mode", "STABLE")],
+                ACTION_CODES[event.get("action", "MONITOR")],
+                flags,
+                count,
+                event.get("risk_min", risk),
+                event.get("risk_max", risk),
+                intern(event.get("first_seen")),
+                intern(event.get("last_seen")),
+            )
+        except (KeyError, TypeError, struct.error) as e:
+            raise ValueError(f"event not representable in binary batch: {e}")
+
+    table = bytearray()
+    for raw in strings:
+        table += STRING_LEN.pack(len(raw)) + raw
+
+    return HEADER.pack(MAGIC, VERSION, 0, len(strings), len(events)) + table + body
+
+
+# ---------------- DECODE ----------------
+
+def decode_records(data):
+    """
+    bytes -> (strings, structured array of records).
+
+    Every malformed input (truncation, bad UTF-8, string indexes or
+    enum codes out of range) raises ValueError.
+    """
+
+    import numpy as np
+
+    if len(data) < HEADER.size:
+        raise ValueError("truncated batch header")
+
+    magic, version, _, n_strings, n_events = HEADER.unpack_from(data)
+    if magic != MAGIC or version not in VERSIONS:
+        raise ValueError("not an IDS event batch")
+
+    offset = HEADER.size
+    strings = []
+    for _ in range(n_strings):
+        if offset + STRING_LEN.size > len(data):
+            raise ValueError("truncated string table")
+        (length,) = STRING_LEN.unpack_from(data, offset)
+        offset += STRING_LEN.size
+        if offset + length > len(data):
+            raise ValueError("truncated string table")
+        strings.append(bytes(data[offset:offset + length]).decode())
+        offset += length
+
+    dtype = record_dtype(version)
+    if len(data) - offset != n_events * dtype.itemsize:
+        raise ValueError("batch length does not match event count")
+
+    records = np.frombuffer(data, dtype=dtype, count=n_events, offset=offset)
+    if n_events:
+        check_records(records, len(strings))
+    return strings, records
+
+
+def check_records(records, n_strings):
+    if records["src"].max() >= n_strings or records["dst"].max() >= n_strings:
+        raise ValueError("string index out of range")
+
+    for field, names in (("level", LEVELS), ("mode", MODES), ("action", ACTIONS)):
+        if records[field].max() >= len(names):
+            raise ValueError(f"unknown {field} code")
+
+    if "count" in records.dtype.names:
+        summary = (records["flags"] & FLAG_SUMMARY) != 0
+        if not summary.any():
+            return
+        for field in ("first_seen", "last_seen"):
+            index = records[field][summary]
+            if ((index >= n_strings) & (index != NO_STRING)).any():
+                raise ValueError("string index out of range")
+
+
+def decode_batch(data):
+    """bytes -> list of event dicts, as the JSON path would have sent."""
+
+    strings, records = decode_records(data)
+    sensor_id = strings[0] if strings else "default"
+
+    # Column-wise conversion; one tolist() per field instead of per-row access
+    ts = records["ts"].tolist()
+    src = records["src"].tolist()
+    dst = records["dst"].tolist()
+    # float32 on the wire; widen before rounding back to the sent precision
+    risk = records["risk"].astype("f8").round(2).tolist()
+    drift = records["drift"].astype("f8").round(4).tolist()
+    sample_rate = records["sample_rate"].astype("f8").round(4).tolist()
+    level = records["level"].tolist()
+    mode = records["mode"].tolist()
+    action = records["action"].tolist()
+    flags = records["flags"].tolist()
+
+    summaries = "count" in records.dtype.names and bool(
+        (records["flags"] & FLAG_SUMMARY).any()
+    )
+    if summaries:
+        count = records["count"].tolist()
+        risk_min = records["risk_min"].astype("f8").round(2).tolist()
+        risk_max = records["risk_max"].astype("f8").round(2).tolist()
+        first_seen = records["first_seen"].tolist()
+        last_seen = records["last_seen"].tolist()
+
+    events = []
+    stamps = {}
+    for i in range(len(ts)):
+        second = int(ts[i])
+        stamp = stamps.get(second)
+        if stamp is None:
+            stamp = stamps[second] = datetime.fromtimestamp(second).strftime("%H:%M:%S")
+
+        event = {
+            "timestamp": stamp,
+            "ts": ts[i],
+            "src_ip": strings[src[i]],
+            "dst_ip": strings[dst[i]],
+            "risk": risk[i],
+            "level": LEVELS[level[i]],
+            "mode": MODES[mode[i]],
+            "drift": drift[i],
+            "action": ACTIONS[action[i]],
+            "alert": bool(flags[i] & FLAG_ALERT),
+            "sample_rate": sample_rate[i],
+            "sensor_id": sensor_id,
+        }
+        if flags[i] & FLAG_BLOCKLIST:
+            event["reason"] = "blocklist"
+        if flags[i] & FLAG_SUMMARY:
+            event["count"] = count[i]
+            event["risk_min"] = risk_min[i]
+            event["risk_max"] = risk_max[i]
+            event["first_seen"] = None if first_seen[i] == NO_STRING else strings[first_seen[i]]
+            event["last_seen"] = None if last_seen[i] == NO_STRING else strings[last_seen[i]]
+        events.append(event)
+
+    return events
+
+
+# ---------------- BENCHMARK ----------------
+
+def benchmark(n_events=10000, n_sources=500, repeat=5):
+    import random
+
+    rng = random.Random(7)
+    now = time.time()
+    events = []
+    for i in range(n_events):
+        blocked = rng.random() < 0.1
+        events.append({
+            "timestamp": datetime.fromtimestamp(now + i / 1000).strftime("%H:%M:%S"),
+            "ts": now + i / 1000,
+            "src_ip": f"10.{rng.randrange(4)}.{rng.randrange(n_sources // 4 + 1)}.7",
+            "dst_ip": "192.168.1.10",
+            "risk": round(rng.uniform(5, 220), 2),
+            "level": "HIGH" if blocked else "LOW",
+            "mode": rng.choice(MODES),
+            "drift": round(rng.uniform(0, 0.3), 4),
+            "action": "BLOCKED" if blocked else "MONITOR",
+            "alert": blocked,
+            "sample_rate": 1.0,
+        })
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    json_blob = json.dumps(events).encode()
+    binary_blob = encode_batch(events, "bench")
+
+    def per_event_us(seconds):
+        return round(seconds / n_events * 1e6, 3)
+
+    return {
+        "events": n_events,
+        "json": {
+            "bytes_per_event": round(len(json_blob) / n_events, 1),
+            "encode_us": per_event_us(best(lambda: json.dumps(events).encode())),
+            "decode_us": per_event_us(best(lambda: json.loads(json_blob))),
+        },
+        "binary": {
+            "bytes_per_event": round(len(binary_blob) / n_events, 1),
+            "encode_us": per_event_us(best(lambda: encode_batch(events, "bench"))),
+            "decode_records_us": per_event_us(best(lambda: decode_records(binary_blob))),
+            "decode_us": per_event_us(best(lambda: decode_batch(binary_blob))),
+        },
+    }
+
+
+# ---------------- ENTRY ----------------
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--sources", type=int, default=500)
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark(args.events, args.sources), indent=2))
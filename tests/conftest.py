@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Tests import the project as "src.<package>", like `python -m src...`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Modules read these paths at import: keep spool, checkpoint, event
+# store and metric regions out of the working tree
+_scratch = tempfile.mkdtemp(prefix="ids_tests_")
+for _name, _path in (
+    ("IDS_SPOOL_DIR", "spool"),
+    ("IDS_CHECKPOINT", "ids_state.ckpt"),
+    ("IDS_EVENT_DB", "events.db"),
+    ("IDS_METRICS_DIR", "metrics"),
+):
+    os.environ.setdefault(_name, os.path.join(_scratch, _path))
+os.environ.setdefault("IDS_BACKEND_URL", "http://127.0.0.1:9")
@@ -0,0 +1,129 @@
+
+from src.realtime import realtime_main
+from src.realtime.aggregator import EventAggregator
+
+
+def event(src="10.0.0.5", action="MONITOR", risk=50.0, timestamp="12:00:00"):
+    return {"src_ip": src, "dst_ip": "10.0.0.1", "action": action,
+            "level": "HIGH" if action == "BLOCKED" else "LOW",
+            "risk": risk, "timestamp": timestamp}
+
+
+def test_repeats_collapse_into_one_summary():
+    agg = EventAggregator(window=1.0)
+
+    for i, risk in enumerate((10.0, 30.0, 20.0)):
+        assert agg.add(event(risk=risk, timestamp=f"12:00:0{i}"), now=100 + i * 0.1) == []
+    shipped = agg.add(event(src="10.0.0.6"), now=101.5)
+
+    assert len(shipped) == 1
+    summary = shipped[0]
+    assert (summary["count"], summary["risk"]) == (3, 20.0)
+    assert (summary["risk_min"], summary["risk_max"]) == (10.0, 30.0)
+    assert (summary["first_seen"], summary["last_seen"]) == ("12:00:00", "12:00:02")
+    # A group of one ships unchanged
+    assert agg.flush() == [event(src="10.0.0.6")]
+
+
+def test_first_block_ships_at_once_behind_held_events():
+    agg = EventAggregator(window=10)
+    agg.add(event(), now=100)
+
+    shipped = agg.add(event(action="BLOCKED"), now=101)
+
+    assert [e["action"] for e in shipped] == ["MONITOR", "BLOCKED"]
+    assert agg.add(event(action="BLOCKED"), now=102) == []
+    assert agg.transitions == 1
+
+
+def test_non_blocked_event_is_not_an_unblock():
+    # Monitor events can interleave with a live block (e.g. another
+    # dst); only the enforcer knows when the block actually ends
+    agg = EventAggregator(window=10)
+    agg.add(event(action="BLOCKED"), now=100)
+
+    assert agg.add(event(), now=101) == []
+    assert agg.add(event(action="BLOCKED"), now=102) == []
+    assert agg.transitions == 1
+    assert "10.0.0.5" in agg.blocked_sources
+
+
+def test_unblocked_ships_held_events_and_rearms():
+    agg = EventAggregator(window=10)
+    agg.add(event(action="BLOCKED"), now=100)
+    agg.add(event(action="BLOCKED"), now=101)
+    agg.add(event(src="10.0.0.6"), now=101)
+
+    shipped = agg.unblocked("10.0.0.5")
+
+    assert [(e["src_ip"], e["action"]) for e in shipped] == [("10.0.0.5", "BLOCKED")]
+    assert agg.transitions == 2
+    assert "10.0.0.5" not in agg.blocked_sources
+    # Blocked again later: a new transition
+    assert len(agg.add(event(action="BLOCKED"), now=200)) == 2
+
+
+def test_unblocked_unknown_source_is_not_a_transition():
+    agg = EventAggregator(window=10)
+    agg.add(event(), now=100)
+
+    assert agg.unblocked("10.0.0.5") == []
+    assert agg.transitions == 0
+    assert len(agg.flush()) == 1
+
+
+def test_blocked_sources_expire_and_are_capped():
+    agg = EventAggregator(window=10, blocked_ttl=60, max_blocked=2)
+    for i, src in enumerate(("a", "b", "c")):
+        agg.add(event(src=src, action="BLOCKED"), now=100 + i)
+
+    assert list(agg.blocked_sources) == ["b", "c"]
+    agg.expire(now=161.5)
+    assert list(agg.blocked_sources) == ["c"]
+    assert agg.blocked_expired == 2
+
+
+def test_timer_expiry_closes_the_window():
+    agg = EventAggregator(window=1.0)
+    agg.add(event(), now=100)
+
+    assert agg.expire(now=100.5) == []
+    assert len(agg.expire(now=101)) == 1
+    assert agg.timed_flushes == 1
+
+
+def test_zero_window_ships_everything():
+    agg = EventAggregator(window=0)
+
+    assert agg.add(event(), now=1) == [event()]
+    assert agg.add(event(), now=1) == [event()]
+
+
+class ExpiringEnforcer:
+    def __init__(self, expired):
+        self.expired = expired
+
+    def unblock_expired(self, now=None):
+        expired, self.expired = self.expired, []
+        return expired
+
+
+def test_sensor_unblocks_from_enforcer_expiry(monkeypatch):
+    shipped = []
+    agg = EventAggregator(window=10)
+    monkeypatch.setattr(realtime_main, "aggregator", agg)
+    monkeypatch.setattr(realtime_main, "enforcer", ExpiringEnforcer(["10.0.0.5"]))
+    monkeypatch.setattr(realtime_main, "ship", lambda kind, payload: shipped.append(payload))
+
+    agg.add(event(action="BLOCKED"), now=100)
+    agg.add(event(action="BLOCKED", risk=80.0), now=101)
+    agg.add(event(action="BLOCKED", risk=90.0), now=102)
+
+    realtime_main.unblock_expired()
+
+    assert [e["count"] for e in shipped] == [2]
+    assert "10.0.0.5" not in agg.blocked_sources
+
+    shipped.clear()
+    realtime_main.unblock_expired()
+    assert shipped == []
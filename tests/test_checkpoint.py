@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from src.realtime.checkpoint import HEADER, SECTION, Checkpointer
+
+
+class Component:
+    def __init__(self, **state):
+        self.state = state
+
+    def get_state(self):
+        return dict(self.state)
+
+    def load_state(self, state):
+        self.state = dict(state)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "state.ckpt")
+
+
+def write(path, **components):
+    c = Checkpointer(path)
+    for name, component in components.items():
+        c.register(name, component.get_state, component.load_state)
+    assert c.snapshot(wait=True)
+    return c
+
+
+def test_round_trip(path):
+    write(path, trust=Component(scores={"10.0.0.1": 0.4}), mode=Component(mode="ALERT"))
+
+    trust, mode = Component(), Component()
+    c = Checkpointer(path)
+    c.register("trust", trust.get_state, trust.load_state)
+    c.register("mode", mode.get_state, mode.load_state)
+
+    assert c.restore() is True
+    assert trust.state == {"scores": {"10.0.0.1": 0.4}}
+    assert mode.state == {"mode": "ALERT"}
+    assert c.errors == 0
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_sections_registered_after_restore_are_applied(path):
+    write(path, late=Component(value=3))
+
+    late = Component()
+    c = Checkpointer(path)
+    assert c.restore() is True
+    assert late.state == {}
+
+    c.register("late", late.get_state, late.load_state)
+    assert late.state == {"value": 3}
+
+
+def test_crc_mismatch_is_a_cold_start(path):
+    write(path, trust=Component(value=1))
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes((last[0] ^ 0xFF,)))
+
+    trust = Component(value="untouched")
+    c = Checkpointer(path)
+    c.register("trust", trust.get_state, trust.load_state)
+
+    with pytest.raises(ValueError, match="corrupt checkpoint section 'trust'"):
+        c.read()
+    assert c.restore() is False
+    assert c.errors == 1
+    assert trust.state == {"value": "untouched"}
+
+
+@pytest.mark.parametrize("data", [
+    b"IDS",
+    b"NOPE" + bytes(HEADER.size - 4),
+    HEADER.pack(b"IDSC", 99, 0, 0.0),
+])
+def test_unreadable_files_are_a_cold_start(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+    c = Checkpointer(path)
+    assert c.restore() is False
+    assert c.errors == 1
+
+
+def test_truncated_section_is_rejected(path):
+    write(path, trust=Component(value=list(range(100))))
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:HEADER.size + SECTION.size + 10])
+
+    assert Checkpointer(path).restore() is False
+
+
+def test_failing_load_is_counted_and_others_still_restore(path):
+    write(path, bad=Component(value=1), good=Component(value=2))
+
+    good = Component()
+    c = Checkpointer(path)
+    c.register("bad", lambda: {}, lambda state: state["missing"])
+    c.register("good", good.get_state, good.load_state)
+
+    assert c.restore() is True
+    assert c.errors == 1
+    assert good.state == {"value": 2}
+
+
+def test_missing_file_is_a_cold_start(path):
+    assert Checkpointer(path).restore() is False
+
+
+def test_maybe_snapshot_waits_for_interval(path):
+    c = Checkpointer(path, interval=60)
+    c.register("x", lambda: {"v": 1}, lambda state: None)
+
+    assert c.maybe_snapshot(now=1000) is False
+    assert c.maybe_snapshot(now=1030) is False
+    assert c.maybe_snapshot(now=1061) is True
+    c.queue.join()
+    assert c.snapshots == 1
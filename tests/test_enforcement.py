@@ -0,0 +1,188 @@
+import subprocess
+
+from src.realtime import enforcement
+from src.realtime.enforcement import Enforcer, IpsetBackend, NetshBackend, NftBackend
+
+
+class FlakyNft(NftBackend):
+    """Dry-run nft whose commands fail while `fails(argv, stdin)` says so."""
+
+    def __init__(self, fails):
+        super().__init__(dry_run=True)
+        self.fails = fails
+
+    def run(self, argv, stdin=None):
+        super().run(argv, stdin)
+        if self.fails(argv, stdin or ""):
+            raise subprocess.CalledProcessError(1, argv)
+
+
+def nft_scripts(backend, op):
+    return [stdin for argv, stdin in backend.commands
+            if argv == ["nft", "-f", "-"] and stdin.startswith(op)]
+
+
+def make(backend=None, **kwargs):
+    return Enforcer(backend or NftBackend(dry_run=True), background=False, **kwargs)
+
+
+def test_batch_is_collapsed_per_ip():
+    enforcer = make()
+    for ip in ("10.0.0.1", "10.0.0.2", "fd00::1"):
+        assert enforcer.block(ip, now=0)
+    # Repeat blocks are no-ops; block + unblock in one batch cancels out
+    assert not enforcer.block("10.0.0.1", now=0)
+    enforcer.unblock("10.0.0.2")
+
+    enforcer.flush()
+
+    assert nft_scripts(enforcer.backend, "add element") == [
+        "add element inet ids blocked_v4 { 10.0.0.1 }\n"
+        "add element inet ids blocked_v6 { fd00::1 }\n"
+    ]
+    assert nft_scripts(enforcer.backend, "delete") == []
+    assert enforcer.applied == 2
+
+
+def test_invalid_and_allowed_ips_are_refused():
+    class Policy:
+        def is_allowed(self, ip):
+            return ip.startswith("192.168.")
+
+    enforcer = make(policy=Policy())
+
+    assert not enforcer.block("192.168.1.4")
+    assert not enforcer.block("not-an-ip")
+    assert enforcer.blocked == {}
+
+
+def test_expiry_follows_the_clock():
+    enforcer = make(block_duration=300)
+    enforcer.block("10.0.0.1", now=0)
+    enforcer.block("10.0.0.2", now=100)
+
+    assert enforcer.unblock_expired(now=299) == []
+    assert enforcer.unblock_expired(now=300) == ["10.0.0.1"]
+
+    # A manual unblock and re-block leaves a stale heap entry behind
+    enforcer.unblock("10.0.0.2")
+    enforcer.block("10.0.0.2", now=350)
+    assert enforcer.unblock_expired(now=400) == []
+    assert enforcer.unblock_expired(now=650) == ["10.0.0.2"]
+    assert enforcer.blocked == {}
+
+
+def test_load_state_restores_unexpired_blocks():
+    enforcer = make()
+
+    restored = enforcer.load_state({"10.0.0.1": 50, "10.0.0.2": 500}, now=100)
+
+    assert restored == 1
+    assert enforcer.blocked == {"10.0.0.2": 500}
+
+
+def test_worker_batches_changes():
+    enforcer = Enforcer(NftBackend(dry_run=True))
+    ips = [f"10.0.{i // 256}.{i % 256}" for i in range(600)]
+    for ip in ips:
+        enforcer.block(ip)
+    enforcer.stop()
+
+    scripts = nft_scripts(enforcer.backend, "add element")
+    assert len(scripts) < len(ips) / 10
+    assert sum(script.count(",") + 1 for script in scripts) == len(ips)
+    assert enforcer.applied == len(ips)
+
+
+def test_dry_run_setup_is_idempotent():
+    backend = IpsetBackend(dry_run=True)
+    backend.setup()
+    backend.setup()
+
+    inserts = [argv for argv, _ in backend.commands if argv[1] == "-I"]
+    assert len(inserts) == 2        # one per address family, not per setup
+
+
+def test_missing_element_does_not_cost_the_adds():
+    # The delete transaction fails because 10.0.0.9 is no longer in the set
+    backend = FlakyNft(lambda argv, stdin: stdin.startswith("delete")
+                       or argv[:2] == ["nft", "delete"] and "10.0.0.9" in argv[-1])
+    enforcer = make(backend)
+    for ip in ("10.0.0.8", "10.0.0.9"):
+        enforcer.block(ip, now=0)
+    enforcer.flush()
+    enforcer.unblock("10.0.0.8")
+    enforcer.unblock("10.0.0.9")
+    enforcer.block("10.0.0.10", now=0)
+
+    enforcer.flush()
+
+    assert "10.0.0.10" in nft_scripts(backend, "add element")[-1]
+    assert enforcer.errors == 0 and enforcer.retry == {}
+    assert enforcer.applied == 5
+
+
+def test_failed_batch_is_retried():
+    failures = [2]
+
+    def fails(argv, stdin):
+        if stdin.startswith("add element") and failures[0]:
+            failures[0] -= 1
+            return True
+        return False
+
+    enforcer = make(FlakyNft(fails))
+    enforcer.block("10.0.0.1", now=0)
+
+    enforcer.flush()
+    assert enforcer.retry == {"10.0.0.1": ("add", 1)}
+    enforcer.flush()
+    assert enforcer.retry == {"10.0.0.1": ("add", 2)}
+    enforcer.flush()
+
+    assert enforcer.retry == {}
+    assert enforcer.errors == 2 and enforcer.applied == 1
+    assert enforcer.blocked == {"10.0.0.1": enforcement.BLOCK_DURATION}
+
+
+def test_retried_add_cancelled_by_unblock():
+    enforcer = make(FlakyNft(lambda argv, stdin: stdin.startswith("add element")))
+    enforcer.block("10.0.0.1", now=0)
+    enforcer.flush()
+    enforcer.unblock("10.0.0.1")
+
+    enforcer.flush()
+
+    assert enforcer.retry == {}
+    assert nft_scripts(enforcer.backend, "delete") == []
+
+
+def test_add_that_never_lands_is_rolled_back():
+    enforcer = make(FlakyNft(lambda argv, stdin: stdin.startswith("add element")))
+    enforcer.block("10.0.0.1", now=0)
+
+    for _ in range(enforcement.MAX_ADD_ATTEMPTS):
+        enforcer.flush()
+
+    assert enforcer.blocked == {}
+    assert enforcer.retry == {}
+    assert enforcer.rolled_back == 1
+
+
+def test_netsh_failure_does_not_stop_the_batch():
+    class FlakyNetsh(NetshBackend):
+        def run(self, argv, stdin=None):
+            super().run(argv, stdin)
+            if argv[-1] == "remoteip=10.0.0.1":
+                raise subprocess.CalledProcessError(1, argv)
+
+    enforcer = make(FlakyNetsh(dry_run=True))
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        enforcer.block(ip, now=0)
+
+    enforcer.flush()
+
+    added = [argv[-1] for argv, _ in enforcer.backend.commands if argv[3] == "add"]
+    assert added == ["remoteip=10.0.0.1", "remoteip=10.0.0.2", "remoteip=10.0.0.3"]
+    assert enforcer.applied == 2
+    assert enforcer.retry == {"10.0.0.1": ("add", 1)}
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from src.realtime import evaluate
+from src.realtime.features import MODEL_COLUMNS
+
+
+class ColumnDetector:
+    """Stands in for detect: the risk score is the first model input."""
+
+    @staticmethod
+    def predict_batch(features, drift_score):
+        return features[:, 0].astype(np.float64)
+
+
+def pairwise_auc(attack, benign):
+    wins = sum((a > b) + 0.5 * (a == b) for a in attack for b in benign)
+    return wins / (len(attack) * len(benign))
+
+
+def histogram(scores):
+    bins = np.rint(np.asarray(scores) * 100).astype(np.int64)
+    return np.bincount(bins, minlength=evaluate.SCORE_BINS)
+
+
+def test_roc_auc_matches_pairwise_definition():
+    rng = np.random.default_rng(3)
+    attack = np.round(rng.uniform(20, 100, 300), 2)
+    benign = np.round(rng.uniform(0, 60, 500), 2)
+    # Shared values exercise the half-credit for ties
+    attack[:20] = benign[:20]
+
+    auc = evaluate.roc_auc(histogram(attack), histogram(benign))
+
+    assert auc == round(pairwise_auc(attack, benign), 6)
+
+
+def test_roc_auc_needs_both_classes():
+    assert evaluate.roc_auc(histogram([50.0]), histogram([])) is None
+
+
+def test_confusion_counts_at_threshold():
+    result = evaluate.confusion(histogram([80, 70, 10]), histogram([75, 20, 5, 1]), 70.0)
+
+    assert (result["tp"], result["fn"], result["fp"], result["tn"]) == (2, 1, 1, 3)
+    assert result["false_positive_rate"] == 0.25
+
+
+def test_model_columns_reports_missing():
+    names, reason = evaluate.model_columns(list(MODEL_COLUMNS))
+    assert names == list(MODEL_COLUMNS) and reason is None
+
+    names, reason = evaluate.model_columns(list(MODEL_COLUMNS[1:]))
+    assert names is None and "1 of 77" in reason
+
+
+def test_evaluate_file_selects_columns_by_name(tmp_path, monkeypatch):
+    monkeypatch.setattr(evaluate, "_detect", ColumnDetector)
+
+    # Extra leading columns and CICIDS-style padded headers must not
+    # shift the inputs; the score comes from the first model column
+    rows = {" Destination Port": [80, 443, 22, 53], "Timestamp": ["t"] * 4}
+    for i, name in enumerate(MODEL_COLUMNS):
+        rows[f" {name}"] = [90.0, 10.0, 60.0, 5.0] if i == 0 else [i] * 4
+    rows[" Label"] = ["DDoS", "BENIGN", "PortScan", "BENIGN"]
+    path = tmp_path / "flows.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+    result = evaluate.evaluate_file(str(path))
+
+    assert result["rows"] == 4
+    report = evaluate.report(result, (50.0,))
+    assert report["roc_auc"] == 1.0
+    assert report["confusion"][0]["tp"] == 2 and report["confusion"][0]["fp"] == 0
+
+
+def test_evaluate_file_skips_unknown_schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(evaluate, "_detect", ColumnDetector)
+    path = tmp_path / "other.csv"
+    pd.DataFrame({"a": [1], "b": [2], "Label": ["BENIGN"]}).to_csv(path, index=False)
+
+    result = evaluate.evaluate_file(str(path))
+
+    assert "model columns missing" in result["skipped"]
@@ -0,0 +1,40 @@
+import os
+
+from src.realtime import feature_parity, features
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "data", "sample.pcap")
+
+
+def test_read_pcap_parses_like_the_ring():
+    frames = list(feature_parity.read_pcap(SAMPLE))
+
+    # 37 frames; the ARP one is not IP and is skipped
+    assert len(frames) == 36
+    protos = {frame[4] for frame in frames}
+    assert protos == {1, 6, 17}
+    assert any(":" in frame[0] for frame in frames)
+
+    syn = frames[0]
+    assert syn[:5] == ("10.0.0.5", "10.0.0.1", 40000, 80, 6)
+    assert syn[6:10] == (28, 0, 0x02, 64240)     # header_len, payload, flags, window
+
+
+def test_sample_pcap_features_match_reference():
+    features.flows.clear()
+    check, frames = feature_parity.check_pcap(SAMPLE)
+
+    assert frames == 36
+    # TCP (split at FLOW_TIMEOUT), its FIN tail, UDP, IPv6 TCP, ICMP
+    assert check.flows == 5
+    assert check.mismatches == {}
+    assert not features.flows
+
+
+def test_mismatch_is_reported():
+    check = feature_parity.ParityCheck()
+    reference = dict.fromkeys(features.FEATURE_NAMES, 1.0)
+    incremental = dict(reference, **{features.FEATURE_NAMES[0]: 2.0})
+
+    check.compare(incremental, reference)
+
+    assert list(check.mismatches) == [features.FEATURE_NAMES[0]]
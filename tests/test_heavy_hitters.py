@@ -0,0 +1,133 @@
+import random
+from collections import Counter
+
+import pytest
+
+from src.realtime import features
+from src.realtime.bench_suite import SyntheticPacket
+from src.realtime.heavy_hitters import SpaceSaving, TopTalkers
+
+
+def zipf_stream(n, keys, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return rng.choices(range(keys), weights, k=n)
+
+
+def check_bounds(sketch, truth):
+    for key, (count, error) in sketch.counters.items():
+        assert count - error <= truth[key] <= count
+    # Anything heavier than total / capacity must be tracked
+    for key, weight in truth.items():
+        if weight > sketch.total / sketch.capacity:
+            assert key in sketch.counters
+
+
+def test_error_bound_holds_on_skewed_stream():
+    sketch = SpaceSaving(capacity=50)
+    stream = zipf_stream(20_000, 2_000, seed=1)
+    for key in stream:
+        sketch.update(key)
+
+    assert len(sketch.counters) == 50
+    assert sketch.total == len(stream)
+    check_bounds(sketch, Counter(stream))
+
+
+def test_weighted_updates_keep_bounds():
+    sketch = SpaceSaving(capacity=20)
+    rng = random.Random(2)
+    truth = Counter()
+    for key in zipf_stream(5_000, 500, seed=2):
+        weight = rng.randint(40, 1500)
+        sketch.update(key, weight)
+        truth[key] += weight
+
+    check_bounds(sketch, truth)
+
+
+def test_new_key_replaces_the_minimum():
+    sketch = SpaceSaving(capacity=3)
+    for key, times in (("a", 5), ("b", 3), ("c", 1)):
+        for _ in range(times):
+            sketch.update(key)
+
+    sketch.update("d")
+
+    assert sketch.counters == {"a": [5, 0], "b": [3, 0], "d": [2, 1]}
+
+
+def test_stale_heap_entry_is_refreshed_before_eviction():
+    sketch = SpaceSaving(capacity=2)
+    sketch.update("a")
+    sketch.update("b", 2)
+    # "a" grows in place; its heap entry still says 1
+    sketch.update("a", 5)
+
+    sketch.update("c")
+
+    # The real minimum (b) goes, not a on its stale heap count
+    assert sketch.counters == {"a": [6, 0], "c": [3, 2]}
+    assert sorted((count, key) for count, _, key in sketch.heap) == [(3, "c"), (6, "a")]
+
+
+def test_merge_keeps_bounds_over_both_streams():
+    left, right = SpaceSaving(capacity=40), SpaceSaving(capacity=40)
+    first = zipf_stream(10_000, 1_000, seed=3)
+    second = zipf_stream(10_000, 1_000, seed=4)
+    for key in first:
+        left.update(key)
+    for key in second:
+        right.update(key)
+
+    left.merge(right)
+
+    assert len(left.counters) == 40
+    assert left.total == 20_000
+    check_bounds(left, Counter(first) + Counter(second))
+    # Later updates still evict correctly from the rebuilt heap
+    left.update("new")
+    assert "new" in left.counters and len(left.counters) == 40
+
+
+def test_merge_into_partial_sketch_is_exact():
+    left, right = SpaceSaving(capacity=10), SpaceSaving(capacity=10)
+    left.update("a", 3)
+    right.update("a", 2)
+    right.update("b")
+
+    left.merge(right)
+
+    assert left.counters == {"a": [5, 0], "b": [1, 0]}
+
+
+def test_top_talkers_snapshot_formats_keys():
+    talkers = TopTalkers(capacity=8)
+    talkers.observe(("10.0.0.5", "10.0.0.1", 40000, 80, 6), 1500)
+    talkers.observe(("10.0.0.5", "10.0.0.1", 40000, 80, 6), 500)
+
+    snapshot = talkers.snapshot(k=1)
+
+    assert snapshot["src_ip"]["bytes"] == [{"key": "10.0.0.5", "count": 2000, "error": 0}]
+    assert snapshot["dst_port"]["packets"][0]["key"] == "80"
+    assert snapshot["flow"]["packets"][0]["key"] == "10.0.0.5:40000->10.0.0.1:80/6"
+
+
+def test_flow_id_of_plain_packet():
+    packet = SyntheticPacket()
+    packet.src, packet.dst, packet.sport, packet.dport, packet.proto = (
+        "10.0.0.5", "10.0.0.1", 40000, 80, 6
+    )
+
+    assert features.get_flow_id(packet) == ("10.0.0.5", "10.0.0.1", 40000, 80, 6)
+
+
+def test_flow_id_reads_ip_layer_not_mac():
+    scapy = pytest.importorskip("scapy.all")
+
+    frame = scapy.Ether(src="02:00:00:00:00:01") / scapy.IP(src="10.0.0.5", dst="10.0.0.1") \
+        / scapy.TCP(sport=40000, dport=80)
+    assert features.get_flow_id(frame) == ("10.0.0.5", "10.0.0.1", 40000, 80, 6)
+
+    frame6 = scapy.Ether() / scapy.IPv6(src="fd00::1", dst="fd00::2") / scapy.UDP(sport=5353, dport=53)
+    assert features.get_flow_id(frame6) == ("fd00::1", "fd00::2", 5353, 53, 17)
@@ -0,0 +1,128 @@
+import os
+import time
+
+from src.realtime import ip_lists
+from src.realtime.ip_lists import ALLOW, BLOCK, IpPolicy, PrefixTrie
+
+
+def test_longest_prefix_wins_across_overlaps():
+    trie = PrefixTrie()
+    trie.insert("10.0.0.0/8", "a")
+    trie.insert("10.1.0.0/16", "b")
+    trie.insert("10.1.2.0/24", "c")
+    trie.insert("10.1.2.3", "d")
+    trie.insert("2001:db8::/32", "v6-wide")
+    trie.insert("2001:db8:1::/48", "v6-narrow")
+
+    assert trie.lookup("10.9.9.9") == "a"
+    assert trie.lookup("10.1.9.9") == "b"
+    assert trie.lookup("10.1.2.9") == "c"
+    assert trie.lookup("10.1.2.3") == "d"
+    assert trie.lookup("11.0.0.1") is None
+    assert trie.lookup("2001:db8:1::5") == "v6-narrow"
+    assert trie.lookup("2001:db8:2::5") == "v6-wide"
+    assert trie.lookup("2001:db9::1") is None
+    assert len(trie) == 6
+
+
+def test_families_do_not_mix():
+    trie = PrefixTrie()
+    trie.insert("0.0.0.0/0", "v4")
+
+    assert trie.lookup("1.2.3.4") == "v4"
+    # ::ffff:1.2.3.4 is an IPv6 address; a v4 default does not cover it
+    assert trie.lookup("::ffff:1.2.3.4") is None
+    assert trie.lookup("garbage") is None
+
+
+def test_invalid_cidrs_raise():
+    trie = PrefixTrie()
+    for cidr in ("10.0.0.0/33", "fd00::/129", "10.0.0/8", "host.example/24"):
+        try:
+            trie.insert(cidr, BLOCK)
+        except ValueError:
+            continue
+        raise AssertionError(f"{cidr} accepted")
+
+
+def write(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+
+
+def make_policy(tmp_path, allow, block):
+    allow_path, block_path = tmp_path / "allow.txt", tmp_path / "block.txt"
+    write(allow_path, allow)
+    write(block_path, block)
+    policy = IpPolicy(str(allow_path), str(block_path))
+    policy.load()
+    return policy
+
+
+def test_allow_overrides_block(tmp_path):
+    policy = make_policy(
+        tmp_path,
+        allow=["203.0.113.0/24  # same range as the block",
+               "198.51.100.7/32", "10.0.0.0/8", "fd00::5"],
+        block=["203.0.113.0/24", "198.51.100.0/24", "10.20.0.0/16",
+               "fd00::/64", "not-a-cidr"],
+    )
+
+    # Same CIDR in both lists: allow
+    assert policy.is_allowed("203.0.113.9")
+    # Narrower allow inside a block
+    assert policy.is_allowed("198.51.100.7")
+    assert policy.is_blocked("198.51.100.8")
+    # Narrower block inside an allow
+    assert policy.is_blocked("10.20.1.1")
+    assert policy.is_allowed("10.21.1.1")
+    assert policy.is_allowed("fd00::5")
+    assert policy.is_blocked("fd00::6")
+    # Built-in ranges stay allowed
+    assert policy.is_allowed("127.0.0.1") and policy.is_allowed("::1")
+    assert policy.lookup("192.0.2.1") is None
+
+
+def test_defaults_apply_before_load():
+    policy = IpPolicy(allow_path=None, block_path=None)
+
+    assert policy.is_allowed("127.0.0.1")
+    assert policy.lookup("10.0.0.1") is None
+
+
+def test_reload_swaps_in_new_trie(tmp_path):
+    policy = make_policy(tmp_path, allow=[], block=["192.0.2.0/24"])
+    old = policy.trie
+    assert policy.is_blocked("192.0.2.1")
+
+    # Unchanged files: no reload
+    assert not policy.reload_if_changed(now=1e9)
+
+    block_path = tmp_path / "block.txt"
+    write(block_path, ["198.51.100.0/24"])
+    mtime = os.path.getmtime(block_path) + 5
+    os.utime(block_path, (mtime, mtime))
+
+    # Checks are rate-limited
+    assert not policy.reload_if_changed(now=1e9 + 1)
+    assert policy.reload_if_changed(now=1e9 + ip_lists.RELOAD_CHECK_INTERVAL)
+
+    deadline = time.monotonic() + 5
+    while policy.reloading and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert not policy.reloading
+    assert policy.trie is not old
+    assert not policy.is_blocked("192.0.2.1")
+    assert policy.is_blocked("198.51.100.1")
+    # The replaced trie was never modified in place
+    assert old.lookup("192.0.2.1") == BLOCK
+
+
+def test_deleted_list_is_dropped(tmp_path):
+    policy = make_policy(tmp_path, allow=["192.0.2.0/24"], block=[])
+    os.remove(tmp_path / "allow.txt")
+
+    policy.load()
+
+    assert policy.lookup("192.0.2.1") is None
+    assert policy.lookup("127.0.0.1") == ALLOW
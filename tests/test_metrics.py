@@ -0,0 +1,49 @@
+from src.realtime.metrics import MetricsRegistry
+
+
+def samples(exposition):
+    """'name{labels} value' lines -> {'name{labels}': float}."""
+
+    result = {}
+    for line in exposition.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            result[name] = float(value)
+    return result
+
+
+def test_recorded_flows_and_blocks_are_scraped():
+    metrics = MetricsRegistry()
+    metrics.record_flow(50)
+    metrics.record_flow(180)
+    metrics.record_block()
+    metrics.record_attack_type("risk")
+    metrics.record_attack_type("NONE")
+    metrics.update_drift(0.2)
+
+    scraped = samples(metrics.export_metrics())
+
+    assert scraped["ids_total_flows"] == 2
+    assert scraped["ids_total_blocks"] == 1
+    assert scraped['ids_attack_type_total{type="risk"}'] == 1
+    assert 'ids_attack_type_total{type="NONE"}' not in scraped
+    assert scraped["ids_risk_score_sum_total"] == 230
+    assert scraped["ids_average_risk"] == 115
+    assert scraped["ids_current_drift_score"] == 0.2
+    assert scraped['ids_risk_score_bucket{le="50.0"}'] == 1
+    assert scraped['ids_risk_score_bucket{le="200.0"}'] == 2
+    assert scraped["ids_risk_score_count"] == 2
+
+
+def test_counts_from_other_threads_are_summed():
+    import threading
+
+    metrics = MetricsRegistry()
+    threads = [threading.Thread(target=lambda: [metrics.record_flow(10) for _ in range(500)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert samples(metrics.export_metrics())["ids_total_flows"] == 2000
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from src.realtime.prefilter import Prefilter, PrefilterConfigError, PrefilterRule
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({}, "no match fields"),
+    ({"name": "only-a-name"}, "no match fields"),
+    ({"name": "typo", "dprot": 22}, "unknown fields"),
+    ({"proto": "sctp"}, "unknown proto"),
+    ({"dport": 70000}, "bad port"),
+    ({"port": "22"}, "bad port"),
+    ({"portrange": [2000, 1000]}, "empty portrange"),
+    ({"portrange": [1000]}, "portrange must be"),
+    ({"src": "10.0.0.0/33"}, "Invalid prefix length"),
+    ("tcp", "must be an object"),
+])
+def test_invalid_rules_are_rejected(spec, message):
+    with pytest.raises(PrefilterConfigError, match=message):
+        PrefilterRule(spec)
+
+
+def test_rule_compiles_to_bpf_and_matches_in_python():
+    rule = PrefilterRule({
+        "name": "dns-from-lan", "src": ["10.0.0.0/8", "fd00::/8"],
+        "proto": "udp", "dport": 53,
+    })
+
+    assert rule.bpf == "(src net 10.0.0.0/8 or src net fd00::/8) and udp and dst port 53"
+    assert rule.matches("10.1.2.3", "8.8.8.8", 5353, 53, 17)
+    assert rule.matches("fd00::1", "fd00::2", 5353, 53, 17)
+    assert not rule.matches("192.0.2.1", "8.8.8.8", 5353, 53, 17)
+    assert not rule.matches("10.1.2.3", "8.8.8.8", 5353, 53, 6)
+    assert not rule.matches("10.1.2.3", "8.8.8.8", 53, 5353, 17)
+
+
+def test_portrange_matches_either_direction():
+    rule = PrefilterRule({"portrange": [6000, 6010], "bpf": False})
+
+    assert rule.bpf is None
+    assert rule.matches("a", "b", 6005, 80, 6)
+    assert rule.matches("a", "b", 80, 6010, 6)
+    assert not rule.matches("a", "b", 80, 6011, 6)
+
+
+def write_config(tmp_path, rules, bpf=True):
+    path = tmp_path / "prefilter.json"
+    path.write_text(json.dumps({"bpf": bpf, "rules": rules}))
+    return str(path)
+
+
+def test_bad_rules_are_left_out_and_logged(tmp_path, capsys):
+    path = write_config(tmp_path, [
+        {"name": "empty"},
+        {"name": "bad-proto", "proto": "gre"},
+        {"name": "ntp", "proto": "udp", "port": 123},
+    ])
+
+    prefilter = Prefilter(path)
+
+    assert [rule.name for rule in prefilter.rules] == ["ntp"]
+    assert len(prefilter.rejected) == 2
+    assert "Rejected rule" in capsys.readouterr().out
+    # The empty rule must not drop everything
+    assert not prefilter.drop_fields(("10.0.0.1", "10.0.0.2", 40000, 80, 6))
+
+
+def test_unreadable_config_does_not_raise(tmp_path):
+    path = tmp_path / "prefilter.json"
+    path.write_text("{ not json")
+
+    prefilter = Prefilter(str(path))
+
+    assert prefilter.rules == []
+    assert prefilter.bpf_filter() is None
+
+
+def test_python_rules_drop_and_count(tmp_path):
+    blocked = tmp_path / "scanners.txt"
+    blocked.write_text("198.51.100.0/24  # scanners\n")
+    path = write_config(tmp_path, [
+        {"name": "scanners", "src_file": str(blocked)},
+        {"name": "ssh", "proto": "tcp", "dport": 22},
+    ])
+    prefilter = Prefilter(path)
+
+    assert prefilter.bpf_filter() == "not ((tcp and dst port 22))"
+
+    prefilter.disable_bpf()
+    assert prefilter.drop_fields(("198.51.100.9", "10.0.0.1", 1234, 80, 6))
+    assert prefilter.drop_fields(("192.0.2.1", "10.0.0.1", 1234, 22, 6))
+    assert not prefilter.drop_fields(("192.0.2.1", "10.0.0.1", 1234, 80, 6))
+    assert [rule.dropped for rule in prefilter.rules] == [1, 1]
+    assert prefilter.passed == 1
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from src.realtime import realtime_main
+from src.realtime.ip_lists import ALLOW, BLOCK
+from src.realtime.metrics import MetricsRegistry
+from src.realtime.shared_metrics import SharedMetricsExporter, SharedMetricsWriter
+
+from test_metrics import samples
+
+
+class StaticPolicy:
+    def __init__(self, verdicts):
+        self.verdicts = verdicts
+
+    def reload_if_changed(self):
+        return False
+
+    def lookup(self, ip):
+        return self.verdicts.get(ip)
+
+
+@pytest.fixture
+def sensor(monkeypatch):
+    shipped = []
+    monkeypatch.setattr(realtime_main, "ship", lambda kind, payload: shipped.append(kind))
+    monkeypatch.setattr(realtime_main, "ip_policy", StaticPolicy({
+        "10.0.0.1": ALLOW, "203.0.113.9": BLOCK,
+    }))
+    monkeypatch.setattr(realtime_main.checkpointer, "maybe_snapshot", lambda: False)
+    monkeypatch.setattr(realtime_main, "calculate_drift", lambda: 0.05)
+    return shipped
+
+
+def run_events(metrics):
+    realtime_main.process_event("10.0.0.1", "10.0.0.2", 30, metrics=metrics)      # allow-listed
+    realtime_main.process_event("203.0.113.9", "10.0.0.2", 40, metrics=metrics)   # blocklisted
+    realtime_main.process_event("192.0.2.5", "10.0.0.2", 20, metrics=metrics)     # scored, passes
+    realtime_main.process_event("192.0.2.6", "10.0.0.2", 250, metrics=metrics)    # scored, blocked
+
+
+def test_every_path_is_counted(sensor):
+    metrics = MetricsRegistry()
+    run_events(metrics)
+
+    scraped = samples(metrics.export_metrics())
+
+    assert scraped["ids_total_flows"] == 4
+    assert scraped["ids_total_blocks"] == 2
+    assert scraped['ids_attack_type_total{type="blocklist"}'] == 1
+    assert scraped['ids_attack_type_total{type="risk"}'] == 1
+    assert scraped["ids_risk_score_sum_total"] == 340
+    assert scraped["ids_current_drift_score"] == 0.05
+
+
+def test_worker_totals_merge_in_exporter(sensor, tmp_path):
+    writers = []
+    for _ in range(2):
+        metrics = MetricsRegistry()
+        run_events(metrics)
+        writers.append(SharedMetricsWriter(metrics.registry, str(tmp_path), run_id="t"))
+        # Region names carry the start time in ms
+        time.sleep(0.002)
+    for writer in writers:
+        writer.flush()
+
+    scraped = samples(SharedMetricsExporter(str(tmp_path), run_id="t").export_metrics())
+
+    assert scraped["ids_total_flows"] == 8
+    assert scraped["ids_total_blocks"] == 4
+    assert scraped['ids_attack_type_total{type="blocklist"}'] == 2
+    assert scraped['ids_risk_score_bucket{le="+Inf"}'] == 8
+    assert scraped['ids_workers{state="live"}'] == 2
@@ -0,0 +1,198 @@
+import json
+import os
+
+import pytest
+import requests
+
+from src.realtime import spool as spool_module
+from src.realtime.spool import DEAD_LETTER_FILE, FRAME, Drainer, Spool, segment_name
+
+
+def record(i):
+    return {"i": i, "pad": "x" * 40}
+
+
+@pytest.fixture
+def spool(tmp_path):
+    # One record per segment; the fsync thread stays out of the way
+    s = Spool(str(tmp_path), segment_bytes=100, fsync_interval=60)
+    yield s
+    s.close()
+
+
+def replay(s, n=100):
+    return [payload["i"] for _, payload, _ in s.read(n)]
+
+
+def test_segments_roll_over(spool):
+    for i in range(4):
+        spool.append("event", record(i))
+
+    assert sorted(spool.segments) == [0, 1, 2, 3]
+    assert replay(spool) == [0, 1, 2, 3]
+
+
+def test_commit_removes_replayed_segments(spool):
+    for i in range(4):
+        spool.append("event", record(i))
+
+    records = spool.read(2)
+    spool.commit(records[-1][2], len(records))
+
+    assert replay(spool) == [2, 3]
+    assert min(spool.segments) == 1
+    assert not os.path.exists(os.path.join(spool.directory, segment_name(0)))
+    assert spool.replayed == 2
+
+
+def test_reopen_resumes_from_committed_position(tmp_path, spool):
+    for i in range(3):
+        spool.append("event", record(i))
+    records = spool.read(1)
+    spool.commit(records[-1][2], 1)
+    spool.close()
+
+    reopened = Spool(str(tmp_path), segment_bytes=100, fsync_interval=60)
+    try:
+        assert replay(reopened) == [1, 2]
+        # Appends go to a fresh segment after the old tail
+        reopened.append("event", record(3))
+        assert replay(reopened) == [1, 2, 3]
+    finally:
+        reopened.close()
+
+
+def test_corrupt_record_skips_rest_of_segment(tmp_path):
+    s = Spool(str(tmp_path), segment_bytes=1000, fsync_interval=60)
+    try:
+        for i in range(3):
+            s.append("event", record(i))
+        s._rotate()
+        s.append("event", record(3))
+
+        # Flip a body byte in the second record of segment 0
+        path = os.path.join(s.directory, segment_name(0))
+        frame = FRAME.size + len(json.dumps(record(0), separators=(",", ":")))
+        with open(path, "r+b") as f:
+            f.seek(frame + FRAME.size + 2)
+            f.write(b"#")
+
+        records = s.read(100)
+
+        assert [payload["i"] for _, payload, _ in records] == [0, 3]
+        assert s.corrupt_segments == 1
+        # The last record of the cut segment commits past it
+        assert records[0][2] == (1, 0)
+    finally:
+        s.close()
+
+
+def test_disk_cap_drops_oldest_segments(tmp_path):
+    s = Spool(str(tmp_path), segment_bytes=100, max_bytes=250, fsync_interval=60)
+    try:
+        for i in range(6):
+            s.append("event", record(i))
+
+        assert s.total_bytes <= 250
+        assert s.dropped_segments == 3
+        assert s.dropped_bytes > 0
+        assert replay(s) == [3, 4, 5]
+    finally:
+        s.close()
+
+
+# ---------------- DRAINER ----------------
+
+class Response:
+    def __init__(self, status):
+        self.status_code = status
+        self.text = f"status {status}"
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.text)
+
+
+class Session:
+    """
+    Answers each post with the next queued status (200 once empty);
+    a queued exception is raised instead.
+    """
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.posts = []
+
+    def post(self, url, timeout=None, **kwargs):
+        self.posts.append((url, kwargs))
+        status = self.statuses.pop(0) if self.statuses else 200
+        if isinstance(status, Exception):
+            raise status
+        return Response(status)
+
+
+def drainer_for(s, *statuses, wire="json"):
+    d = Drainer(s, backend_url="http://backend", wire=wire)
+    d.session = Session(*statuses)
+    return d
+
+
+@pytest.mark.parametrize("status", [503, 429])
+def test_retryable_failure_keeps_records(spool, status):
+    for i in range(2):
+        spool.append("event", record(i))
+    d = drainer_for(spool, status)
+
+    assert d.drain(spool.read()) is False
+    assert replay(spool) == [0, 1]
+
+    assert d.drain(spool.read()) is True
+    assert replay(spool) == []
+    assert d.rejected_batches == 0
+
+
+def test_connection_error_keeps_records(spool):
+    spool.append("event", record(0))
+    d = drainer_for(spool, requests.ConnectionError("refused"))
+
+    assert d.drain(spool.read()) is False
+    assert replay(spool) == [0]
+
+
+def test_rejected_batch_is_dead_lettered(spool):
+    spool.append("event", record(0))
+    spool.append("governance", {"mode": "ALERT"})
+    d = drainer_for(spool, 400)
+
+    assert d.drain(spool.read()) is True
+
+    assert replay(spool) == []
+    assert (d.rejected_batches, d.rejected_records) == (1, 1)
+    with open(os.path.join(spool.directory, DEAD_LETTER_FILE)) as f:
+        letter = json.loads(f.readline())
+    assert letter["kind"] == "event" and letter["status"] == 400
+    assert letter["records"] == [record(0)]
+    # The governance run behind it was still delivered
+    assert d.session.posts[-1][0] == "http://backend/ingest_governance_batch"
+
+
+def test_binary_wire_falls_back_to_json(spool):
+    event = {
+        "timestamp": "12:00:00", "src_ip": "x" * 70_000, "dst_ip": "10.0.0.1",
+        "risk": 1.0, "level": "LOW", "mode": "NORMAL", "drift": 0.0,
+        "action": "MONITOR", "alert": False, "sample_rate": 1.0,
+    }
+    spool.segment_bytes = 1 << 20
+    spool.append("event", event)
+    d = drainer_for(spool, wire="binary")
+
+    assert d.drain(spool.read()) is True
+
+    url, kwargs = d.session.posts[0]
+    assert url == "http://backend/ingest_batch"
+    assert kwargs["json"] == [event]
+    assert replay(spool) == []
+
+
+def test_shared_instances_use_configured_directory():
+    assert spool_module.spool.directory == os.environ["IDS_SPOOL_DIR"]
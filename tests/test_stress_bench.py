@@ -0,0 +1,14 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+
+def test_in_process_run_counts_every_refusal():
+    # conftest keeps the event store out of data/
+    from src.dashboard_backend import stress_bench
+
+    result = stress_bench.run_in_process(4, 300, 2, max_pending=16)
+
+    assert result["checks"] == {name: True for name in result["checks"]}
+    assert result["events"] == 1200
+    assert result["queue_full_refusals"] > 0
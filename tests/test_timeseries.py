@@ -0,0 +1,76 @@
+import pytest
+
+from src.dashboard_backend.timeseries import RollupSeries, TimeSeriesStore
+
+T0 = 1_700_000_000.0
+
+
+def buckets(series, res):
+    return [(start - T0, low, high, total, count)
+            for start, low, high, total, count in series.tiers[res]]
+
+
+def test_points_bucket_by_their_own_time():
+    series = RollupSeries({1: 100, 60: 10})
+    series.add(5.0, T0)
+    series.add(7.0, T0 + 0.5)
+    series.add(1.0, T0 + 61)
+
+    assert buckets(series, 1) == [(0, 5.0, 7.0, 12.0, 2), (61, 1.0, 1.0, 1.0, 1)]
+    # T0 is 20 s into its minute
+    assert buckets(series, 60) == [(-20, 5.0, 7.0, 12.0, 2), (40, 1.0, 1.0, 1.0, 1)]
+
+
+def test_late_points_land_in_their_bucket():
+    series = RollupSeries({1: 100})
+    for offset in (0, 10, 20):
+        series.add(1.0, T0 + offset)
+
+    series.add(3.0, T0 + 10.2)      # existing bucket
+    series.add(2.0, T0 + 5)         # gap between buckets
+    series.add(4.0, T0 - 3)         # before the oldest, room left
+
+    assert buckets(series, 1) == [
+        (-3, 4.0, 4.0, 4.0, 1),
+        (0, 1.0, 1.0, 1.0, 1),
+        (5, 2.0, 2.0, 2.0, 1),
+        (10, 1.0, 3.0, 4.0, 2),
+        (20, 1.0, 1.0, 1.0, 1),
+    ]
+
+
+def test_late_points_in_a_full_tier():
+    series = RollupSeries({1: 3})
+    for offset in (0, 10, 20):
+        series.add(1.0, T0 + offset)
+
+    series.add(9.0, T0 - 5)         # older than anything kept: dropped
+    series.add(2.0, T0 + 15)        # evicts the oldest bucket
+
+    assert buckets(series, 1) == [
+        (10, 1.0, 1.0, 1.0, 1), (15, 2.0, 2.0, 2.0, 1), (20, 1.0, 1.0, 1.0, 1),
+    ]
+
+
+def test_query_returns_replayed_points():
+    store = TimeSeriesStore(("risk",))
+    for offset, value in ((0, 10.0), (120, 30.0), (60, 20.0)):
+        store.add("risk", value, T0 + offset)
+
+    res, points = store.series["risk"].query(300, resolution=60, now=T0 + 150)
+
+    assert res == 60
+    assert [p["mean"] for p in points] == [10.0, 20.0, 30.0]
+
+
+def test_backend_trends_use_event_time():
+    pytest.importorskip("fastapi")
+    from src.dashboard_backend import backend_state
+
+    replayed = T0 + 7
+    backend_state.apply_event({"risk": 42.0, "ts": replayed, "sensor_id": "late"})
+    backend_state.apply_governance({"ssi": 0.3, "ts": replayed, "sensor_id": "late"})
+
+    for name in ("risk", "ssi"):
+        starts = [bucket[0] for bucket in backend_state.trends.series[name].tiers[1]]
+        assert replayed in starts
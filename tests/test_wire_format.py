@@ -0,0 +1,140 @@
+import struct
+
+import pytest
+
+from src.realtime import wire_format
+
+TS = 1_700_000_000.25
+
+
+def event(**extra):
+    base = {
+        "timestamp": "12:00:00", "ts": TS, "src_ip": "10.0.0.5",
+        "dst_ip": "192.168.1.10", "risk": 182.4, "level": "HIGH",
+        "mode": "ALERT", "drift": 0.1234, "action": "BLOCKED",
+        "alert": True, "sample_rate": 0.5,
+    }
+    base.update(extra)
+    return base
+
+
+def test_round_trip():
+    events = [
+        event(),
+        event(src_ip="fd00::1", level="LOW", action="MONITOR", alert=False,
+              reason="blocklist"),
+        event(count=12, risk_min=20.5, risk_max=199.75,
+              first_seen="12:00:00", last_seen=None),
+    ]
+
+    decoded = wire_format.decode_batch(wire_format.encode_batch(events, "sensor-a"))
+
+    assert len(decoded) == 3
+    first, second, summary = decoded
+    assert first["sensor_id"] == "sensor-a"
+    assert first["src_ip"] == "10.0.0.5" and first["dst_ip"] == "192.168.1.10"
+    assert (first["risk"], first["drift"], first["sample_rate"]) == (182.4, 0.1234, 0.5)
+    assert (first["level"], first["mode"], first["action"], first["alert"]) == (
+        "HIGH", "ALERT", "BLOCKED", True)
+    assert first["ts"] == TS and "count" not in first and "reason" not in first
+    assert second["reason"] == "blocklist" and second["src_ip"] == "fd00::1"
+    assert (summary["count"], summary["risk_min"], summary["risk_max"]) == (12, 20.5, 199.75)
+    assert (summary["first_seen"], summary["last_seen"]) == ("12:00:00", None)
+
+
+def test_empty_batch():
+    strings, records = wire_format.decode_records(wire_format.encode_batch([], "s"))
+
+    assert strings == ["s"] and len(records) == 0
+
+
+def encode_v1(events, sensor_id):
+    strings = [sensor_id]
+    body = b""
+    for e in events:
+        for ip in (e["src_ip"], e["dst_ip"]):
+            if ip not in strings:
+                strings.append(ip)
+        body += wire_format.RECORD_V1.pack(
+            e["ts"], strings.index(e["src_ip"]), strings.index(e["dst_ip"]),
+            e["risk"], e["drift"], e["sample_rate"],
+            wire_format.LEVEL_CODES[e["level"]], wire_format.MODE_CODES[e["mode"]],
+            wire_format.ACTION_CODES[e["action"]], wire_format.FLAG_ALERT,
+        )
+    table = b"".join(wire_format.STRING_LEN.pack(len(s)) + s.encode() for s in strings)
+    return wire_format.HEADER.pack(wire_format.MAGIC, 1, 0, len(strings), len(events)) \
+        + table + body
+
+
+def test_version_1_batches_still_decode():
+    decoded = wire_format.decode_batch(encode_v1([event(), event(src_ip="10.0.0.6")], "old"))
+
+    assert [e["src_ip"] for e in decoded] == ["10.0.0.5", "10.0.0.6"]
+    assert decoded[0]["sensor_id"] == "old" and decoded[0]["risk"] == 182.4
+    assert "count" not in decoded[0]
+
+
+@pytest.mark.parametrize("cut", [3, wire_format.HEADER.size + 1, -1])
+def test_truncated_batches_raise(cut):
+    blob = wire_format.encode_batch([event()], "s")
+
+    with pytest.raises(ValueError):
+        wire_format.decode_records(blob[:cut])
+
+
+def corrupt(blob, field, value):
+    """Overwrite one field of the first record."""
+
+    strings, _ = wire_format.decode_records(blob)
+    offset = wire_format.HEADER.size + sum(2 + len(s.encode()) for s in strings)
+    names = ["ts", "src", "dst", "risk", "drift", "sample_rate", "level", "mode",
+             "action", "flags", "count", "risk_min", "risk_max", "first_seen", "last_seen"]
+    fields = list(wire_format.RECORD.unpack_from(blob, offset))
+    fields[names.index(field)] = value
+    data = bytearray(blob)
+    wire_format.RECORD.pack_into(data, offset, *fields)
+    return bytes(data)
+
+
+@pytest.mark.parametrize("field, value, message", [
+    ("src", 99, "string index"),
+    ("level", 9, "unknown level"),
+    ("action", 2, "unknown action"),
+    ("first_seen", 50, "string index"),
+])
+def test_out_of_range_records_raise(field, value, message):
+    blob = wire_format.encode_batch([event(count=2, first_seen="a", last_seen="b")], "s")
+
+    with pytest.raises(ValueError, match=message):
+        wire_format.decode_records(corrupt(blob, field, value))
+
+
+def test_bad_magic_raises():
+    blob = wire_format.encode_batch([event()], "s")
+
+    with pytest.raises(ValueError, match="not an IDS event batch"):
+        wire_format.decode_records(b"JUNK" + blob[4:])
+
+
+@pytest.mark.parametrize("bad", [
+    {"src_ip": "x" * 70_000},
+    {"src_ip": 167772165},
+    {"level": "SEVERE"},
+    {"extra": 1},
+    {"reason": "manual"},
+    {"risk": "high"},
+])
+def test_unrepresentable_events_raise_value_error(bad):
+    with pytest.raises(ValueError):
+        wire_format.encode_batch([event(**bad)], "s")
+
+
+def test_long_sensor_id_raises_value_error():
+    with pytest.raises(ValueError):
+        wire_format.encode_batch([event()], "s" * 70_000)
+
+
+def test_record_layout_matches_dtype():
+    assert wire_format.record_dtype().itemsize == wire_format.RECORD.size == 44
+    assert wire_format.record_dtype(1).itemsize == wire_format.RECORD_V1.size
+    assert struct.calcsize("<" + "H") == wire_format.STRING_LEN.size